@@ -0,0 +1,93 @@
+import gzip
+import hashlib
+import io
+import json
+import numpy as np
+
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+SCALAR_METRICS = ['total_value', 'portfolio_volatility', 'portfolio_var_95', 'max_drawdown', 'sharpe_ratio']
+# Bodies smaller than this are sent uncompressed; gzip would barely shrink them
+MIN_GZIP_BYTES = 1024
+
+
+def _plain(value):
+    # numpy scalars and arrays as JSON types, non-finite floats as null
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(v) for v in value]
+    if isinstance(value, (np.integer, np.bool_)):
+        return value.item()
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value
+
+
+def to_json_bytes(obj):
+    return json.dumps(_plain(obj), separators=(',', ':')).encode()
+
+
+def frame_to_json_bytes(df, double_precision=10):
+    """A frame as columnar JSON, {"columns": [...], "data": {column: [values]}}, with NaN as null.
+
+    Each column is encoded by pandas' C serializer and the pieces are joined,
+    so no per-row Python objects are built.
+    """
+    columns = [str(c) for c in df.columns]
+    data = ','.join(f'{json.dumps(name)}:{df[c].to_json(orient="values", double_precision=double_precision)}'
+                    for name, c in zip(columns, df.columns))
+    return f'{{"columns":{json.dumps(columns)},"rows":{len(df)},"data":{{{data}}}}}'.encode()
+
+
+def frame_to_arrow_bytes(df):
+    """A frame as an Arrow IPC stream; needs pyarrow"""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def metrics_payload(metrics, alerts=()):
+    """The headline risk numbers with their basis, the per-model VaR/CVaR report and the active alerts"""
+    payload = {name: metrics[name] for name in SCALAR_METRICS}
+    payload['holdings_count'] = len(metrics['portfolio_df'])
+    payload['positions_count'] = len(metrics['positions_df'])
+    payload['var_cvar'] = metrics.get('var_cvar', {})
+    payload['basis'] = metrics.get('basis')
+    payload['alerts'] = list(alerts)
+    return payload
+
+
+def correlation_frame(matrix):
+    """The correlation matrix with its row labels as a leading 'symbol' column"""
+    frame = matrix.astype(float).copy()
+    frame.insert(0, 'symbol', [str(s) for s in matrix.index])
+    return frame.reset_index(drop=True)
+
+
+class EncodedPayload:
+    """A serialized response body with a content ETag and a gzip copy made on first use.
+
+    The ETag is a hash of the body, so a recomputed snapshot with the same
+    numbers keeps the same ETag and pollers keep getting 304s.
+    """
+
+    def __init__(self, body, mimetype='application/json'):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            # Level 4 is within a few percent of 6 at a third of the time; mtime=0 keeps the bytes reproducible
+            self._gzipped = gzip.compress(self.body, compresslevel=4, mtime=0)
+        return self._gzipped
+
+    def encoded(self, accept_gzip):
+        """(body, content_encoding, etag) for a client that does or does not accept gzip"""
+        if accept_gzip and len(self.body) >= MIN_GZIP_BYTES:
+            return self.gzipped(), 'gzip', self.etag + '-gz'
+        return self.body, None, self.etag
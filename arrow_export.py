@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import time
+import uuid
+import api_payloads
+
+EXPORT_FORMATS = ('parquet', 'arrow')
+MANIFEST = 'manifest.json'
+LATEST = 'LATEST'
+
+
+def metric_tables(metrics):
+    """The frames behind a metrics dict as flat tables, {name: DataFrame}"""
+    tables = {'portfolio': metrics['portfolio_df'], 'positions': metrics['positions_df']}
+    if not metrics['price_data'].empty:
+        tables['prices'] = metrics['price_data'].rename_axis('date').reset_index()
+    if not metrics['correlation_matrix'].empty:
+        tables['correlation'] = api_payloads.correlation_frame(metrics['correlation_matrix'])
+    return tables
+
+
+def _write_table(table, path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if fmt == 'parquet':
+        pq.write_table(table, path, compression='zstd')
+    else:
+        # Uncompressed IPC file format, so readers can memory-map the columns without copying
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def write_export(metrics, directory, alerts=(), formats=EXPORT_FORMATS, keep=5):
+    """Write the metrics tables to a new export directory; returns its manifest.
+
+    Each export lives in directory/<export id>/ with one file per table and
+    format plus manifest.json (headline metrics, row counts, file sizes).
+    It is built under a temporary name and renamed into place, then
+    directory/LATEST is pointed at it, so readers never see a partial
+    export. Only the newest keep exports stay on disk. Needs pyarrow.
+    """
+    import pyarrow as pa
+    unknown = set(formats) - set(EXPORT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unknown export format: {sorted(unknown)} (expected some of {EXPORT_FORMATS})")
+    # UTC time to the microsecond, so ids sort in creation order
+    now = time.time()
+    export_id = (f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now % 1 * 1e6):06d}Z"
+                 f"-{uuid.uuid4().hex[:6]}")
+    tmp = os.path.join(directory, f'.{export_id}.tmp')
+    os.makedirs(tmp)
+    manifest = {
+        'id': export_id,
+        'created_at': now,
+        'metrics': json.loads(api_payloads.to_json_bytes(api_payloads.metrics_payload(metrics, alerts))),
+        'tables': {}
+    }
+    try:
+        for name, df in metric_tables(metrics).items():
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            files = {}
+            for fmt in formats:
+                filename = f'{name}.{fmt}'
+                _write_table(table, os.path.join(tmp, filename), fmt)
+                files[fmt] = {'file': filename, 'bytes': os.path.getsize(os.path.join(tmp, filename))}
+            manifest['tables'][name] = {'rows': table.num_rows, 'columns': table.column_names, 'files': files}
+        with open(os.path.join(tmp, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, os.path.join(directory, export_id))
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    pointer = os.path.join(directory, f'.{LATEST}.tmp')
+    with open(pointer, 'w') as f:
+        f.write(export_id)
+    os.replace(pointer, os.path.join(directory, LATEST))
+    prune_exports(directory, keep)
+    return manifest
+
+
+def list_exports(directory):
+    """Export ids in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory)
+                  if not name.startswith('.') and os.path.isfile(os.path.join(directory, name, MANIFEST)))
+
+
+def prune_exports(directory, keep=5):
+    """Delete all but the newest keep exports, never the one LATEST points at"""
+    latest = latest_export_id(directory)
+    for export_id in list_exports(directory)[:-keep] if keep else []:
+        if export_id != latest:
+            shutil.rmtree(os.path.join(directory, export_id), ignore_errors=True)
+
+
+def latest_export_id(directory):
+    try:
+        with open(os.path.join(directory, LATEST)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_manifest(directory, export_id=None):
+    """Manifest of an export (the latest by default), or None"""
+    export_id = export_id or latest_export_id(directory)
+    if export_id is None:
+        return None
+    try:
+        with open(os.path.join(directory, export_id, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def read_table(directory, name, export_id=None):
+    """Memory-map one exported Arrow table (the latest export by default) without copying it"""
+    import pyarrow as pa
+    export_id = export_id or latest_export_id(directory)
+    if export_id is None:
+        raise FileNotFoundError(f"No exports in {directory}")
+    with pa.memory_map(os.path.join(directory, export_id, f'{name}.arrow')) as source:
+        return pa.ipc.open_file(source).read_all()
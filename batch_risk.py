@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+from streaming_risk import TRADING_DAYS
+
+RISK_COLUMNS = ['portfolio_volatility', 'portfolio_var_95', 'max_drawdown', 'sharpe_ratio']
+
+
+def weight_matrix(values):
+    """Row-normalise a P x N frame of position values into portfolio weights"""
+    totals = values.sum(axis=1)
+    return values.div(totals.where(totals > 0), axis=0).fillna(0)
+
+
+def batch_risk_metrics(weights, prices, risk_free_rate=0.02, confidence=0.95, held=None):
+    """Risk metrics for P portfolios over the same N assets in one pass.
+
+    weights is a P x N frame (portfolios by symbol) and prices a T x N frame
+    of closes with the same columns. Portfolio returns come from a single
+    GEMM (returns @ W.T) and every statistic is then reduced along the time
+    axis, so the cost is one matrix product rather than P separate analyses.
+    Returns a frame indexed like weights with the same figures
+    calculate_portfolio_metrics reports for one portfolio.
+
+    prices may have gaps (NaN). As in calculate_portfolio_metrics, each
+    portfolio only uses the dates on which every symbol it holds has a close;
+    held is a P x N boolean frame of those symbols and defaults to the
+    non-zero weights. Portfolios whose holdings cover the same dates share
+    one GEMM, with the closes of symbols they do not hold zero-filled.
+    """
+    prices = prices[weights.columns]
+    w = weights.to_numpy(dtype=float)
+    closes = prices.to_numpy(dtype=float)
+    held = w != 0 if held is None else held.reindex(index=weights.index, columns=weights.columns,
+                                                       fill_value=False).to_numpy(dtype=bool)
+    missing = np.isnan(closes)
+    result = pd.DataFrame(0.0, index=weights.index, columns=RISK_COLUMNS)
+    if not missing.any():
+        if len(closes) >= 2:
+            result[:] = np.column_stack(_risk_metrics(closes, w, risk_free_rate, confidence))
+        return result
+
+    # (T x P) dates each portfolio can use, then one group per distinct set of dates
+    usable = (missing.astype(np.float32) @ held.T.astype(np.float32)) == 0
+    patterns, group = np.unique(usable.T, axis=0, return_inverse=True)
+    closes = np.where(missing, 0.0, closes)
+    out = np.zeros((len(w), len(RISK_COLUMNS)))
+    for g, rows in enumerate(patterns):
+        if rows.sum() < 2:
+            continue
+        members = np.flatnonzero(group.ravel() == g)
+        out[members] = np.column_stack(_risk_metrics(closes[rows], w[members], risk_free_rate, confidence))
+    result[:] = out
+    return result
+
+
+def _risk_metrics(closes, w, risk_free_rate, confidence):
+    # Closes of symbols a portfolio does not hold may be zero; their returns are zeroed to match
+    with np.errstate(divide='ignore', invalid='ignore'):
+        asset_returns = np.nan_to_num(closes[1:] / closes[:-1] - 1, nan=0.0, posinf=0.0, neginf=0.0)
+    portfolio_returns = asset_returns @ w.T
+    mean = portfolio_returns.mean(axis=0)
+    volatility = portfolio_returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    var = np.percentile(portfolio_returns, (1 - confidence) * 100, axis=0)
+    excess = mean * TRADING_DAYS - risk_free_rate
+    sharpe = np.divide(excess, volatility, out=np.zeros_like(excess), where=volatility > 0)
+
+    # Drawdown on the weighted price index, as calculate_max_drawdown does
+    values = closes @ w.T
+    running_max = np.maximum.accumulate(values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(running_max > 0, values / running_max - 1, 0.0)
+    return volatility, var, drawdown.min(axis=0), sharpe
@@ -0,0 +1,699 @@
+"""Offline benchmarks for the portfolio analyzer.
+
+Run a single benchmark with ``python benchmarks.py <name>`` or all of them
+with ``python benchmarks.py``. Every benchmark uses SyntheticProvider data so
+results are repeatable and need no network access.
+"""
+import os
+import sys
+import time
+import sqlite3
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from market_data import SyntheticProvider
+from portfolio_analyzer import WebPortfolioRiskAnalyzer
+
+BENCHMARKS = {}
+
+
+def benchmark(func):
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def best_of(func, repeat=3):
+    """Best wall time in seconds over repeat calls"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def synthetic_lots(n_lots, n_symbols, seed=0):
+    """Random holdings frame with n_lots lots spread over n_symbols symbols"""
+    rng = np.random.default_rng(seed)
+    symbols = SyntheticProvider.symbols(n_symbols)
+    return pd.DataFrame({
+        'id': np.arange(1, n_lots + 1),
+        'symbol': rng.choice(symbols, n_lots),
+        'quantity': rng.integers(1, 500, n_lots).astype(float),
+        'purchase_price': rng.uniform(10, 500, n_lots).round(2),
+        'purchase_date': '2024-01-15',
+        'asset_class': rng.choice(['Equity', 'ETF', 'Bond ETF'], n_lots)
+    })
+
+
+def synthetic_market_data(symbols, provider=None):
+    provider = provider or SyntheticProvider()
+    prices = provider.get_prices(symbols)
+    return {s: {'current_price': prices[s].iloc[-1], 'price_history': prices[s],
+                'sector': provider.get_profile(s)['sector'], 'industry': 'Synthetic', 'market_cap': 0}
+            for s in symbols}
+
+
+def legacy_value_holdings(holdings, market_data):
+    """The original iterrows valuation loop, kept as the benchmark baseline"""
+    portfolio_data = []
+    total_value = 0
+    for _, holding in holdings.iterrows():
+        symbol = holding['symbol']
+        current_price = market_data[symbol]['current_price']
+        current_value = holding['quantity'] * current_price
+        cost_basis = holding['quantity'] * holding['purchase_price']
+        pnl = current_value - cost_basis
+        pnl_pct = (pnl / cost_basis) * 100 if cost_basis > 0 else 0
+        portfolio_data.append({
+            'symbol': symbol, 'quantity': holding['quantity'], 'purchase_price': holding['purchase_price'],
+            'current_price': current_price, 'cost_basis': cost_basis, 'current_value': current_value,
+            'pnl': pnl, 'pnl_pct': pnl_pct, 'asset_class': holding['asset_class'],
+            'sector': market_data[symbol]['sector'], 'weight': 0
+        })
+        total_value += current_value
+    for item in portfolio_data:
+        item['weight'] = (item['current_value'] / total_value) * 100 if total_value > 0 else 0
+    return pd.DataFrame(portfolio_data), total_value
+
+
+@benchmark
+def valuation():
+    """Lot valuation: iterrows loop vs whole-column operations, 10 to 100k lots"""
+    analyzer = WebPortfolioRiskAnalyzer.__new__(WebPortfolioRiskAnalyzer)
+    market_data = synthetic_market_data(SyntheticProvider.symbols(500))
+    print(f"{'lots':>8} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>8}")
+    for n_lots in [10, 100, 1_000, 10_000, 100_000]:
+        holdings = synthetic_lots(n_lots, 500)
+        expected, expected_total = legacy_value_holdings(holdings, market_data)
+        actual, actual_total = analyzer.value_holdings(holdings, market_data)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+        assert np.isclose(actual_total, expected_total, rtol=1e-12)
+        loop = best_of(lambda: legacy_value_holdings(holdings, market_data), repeat=1 if n_lots >= 10_000 else 3)
+        vector = best_of(lambda: analyzer.value_holdings(holdings, market_data))
+        print(f"{n_lots:>8} {loop:>10.4f} {vector:>11.4f} {loop / vector:>7.1f}x")
+
+
+def legacy_add_holding(db_name, row):
+    """The original connect-per-call insert"""
+    conn = sqlite3.connect(db_name)
+    conn.execute('INSERT INTO holdings (symbol, quantity, purchase_price, purchase_date, asset_class) '
+                 'VALUES (?, ?, ?, ?, ?)', row)
+    conn.commit()
+    conn.close()
+
+
+def legacy_get_current_portfolio(db_name):
+    """The original connect-per-call read"""
+    conn = sqlite3.connect(db_name)
+    df = pd.read_sql_query('SELECT * FROM holdings', conn)
+    conn.close()
+    return df
+
+
+def run_threads(n_threads, n_ops, operation):
+    """Run operation(i) n_ops times on each of n_threads threads; returns (seconds, errors)"""
+    errors = []
+
+    def worker():
+        for i in range(n_ops):
+            try:
+                operation(i)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, len(errors)
+
+
+@benchmark
+def connections():
+    """Concurrent reads/writes: connect-per-call vs pooled WAL connections"""
+    row = ('AAPL', 10, 150.0, '2024-01-15', 'Equity')
+    n_ops = 200
+    print(f"{'threads':>8} {'legacy (s)':>11} {'errors':>7} {'pooled (s)':>11} {'errors':>7}")
+    for n_threads in [1, 4, 16]:
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_db = os.path.join(tmp, 'legacy.db')
+            conn = sqlite3.connect(legacy_db)
+            conn.execute('CREATE TABLE holdings (id INTEGER PRIMARY KEY, symbol TEXT NOT NULL, quantity REAL NOT NULL, '
+                         'purchase_price REAL NOT NULL, purchase_date TEXT NOT NULL, asset_class TEXT NOT NULL)')
+            conn.close()
+
+            def legacy(i):
+                if i % 4 == 0:
+                    legacy_add_holding(legacy_db, row)
+                else:
+                    legacy_get_current_portfolio(legacy_db)
+
+            analyzer = WebPortfolioRiskAnalyzer(os.path.join(tmp, 'pooled.db'))
+
+            def pooled(i):
+                if i % 4 == 0:
+                    analyzer.add_holding(*row)
+                else:
+                    analyzer.get_current_portfolio()
+
+            legacy_time, legacy_errors = run_threads(n_threads, n_ops, legacy)
+            pooled_time, pooled_errors = run_threads(n_threads, n_ops, pooled)
+            analyzer.db.close_all()
+            analyzer.price_store.db.close_all()
+        print(f"{n_threads:>8} {legacy_time:>11.3f} {legacy_errors:>7} {pooled_time:>11.3f} {pooled_errors:>7}")
+
+
+@benchmark
+def bulk_import():
+    """Holding import: add_holding per row vs chunked add_holdings_bulk"""
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = WebPortfolioRiskAnalyzer(os.path.join(tmp, 'portfolio.db'))
+        sample = synthetic_lots(2_000, 500)
+        rows = list(sample[['symbol', 'quantity', 'purchase_price', 'purchase_date', 'asset_class']]
+                    .itertuples(index=False, name=None))
+        start = time.perf_counter()
+        for row in rows:
+            analyzer.add_holding(*row)
+        per_row = len(rows) / (time.perf_counter() - start)
+        print(f"add_holding loop:     {per_row:>10,.0f} rows/s ({len(rows):,} rows)")
+
+        export = os.path.join(tmp, 'export.csv')
+        synthetic_lots(200_000, 2_000).to_csv(export, index=False)
+        stats = analyzer.import_holdings(export, replace=True)
+        print(f"import_holdings csv:  {stats['rows_per_second']:>10,.0f} rows/s "
+              f"({stats['inserted']:,} rows in {stats['seconds']:.2f}s)")
+        analyzer.db.close_all()
+        analyzer.price_store.db.close_all()
+
+
+@benchmark
+def schema_queries():
+    """Per-symbol and date-range lookups: legacy TEXT/unindexed schema vs migrated schema"""
+    from schema import migrate, _create_base_tables
+    lots = synthetic_lots(200_000, 2_000)
+    dates = pd.bdate_range(end='2024-12-31', periods=252 * 10)
+    history = pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'total_value': 1e6, 'daily_return': 0.0})
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for layout in ['legacy', 'migrated']:
+            conn = sqlite3.connect(os.path.join(tmp, f'{layout}.db'))
+            _create_base_tables(conn)
+            conn.executemany('INSERT INTO holdings (symbol, quantity, purchase_price, purchase_date, asset_class) '
+                             'VALUES (?, ?, ?, ?, ?)',
+                             lots[['symbol', 'quantity', 'purchase_price', 'purchase_date', 'asset_class']]
+                             .itertuples(index=False, name=None))
+            conn.executemany('INSERT INTO performance_history (date, total_value, daily_return) VALUES (?, ?, ?)',
+                             history.itertuples(index=False, name=None))
+            conn.commit()
+            if layout == 'migrated':
+                migrate(conn)
+                low, high = 20230101, 20230331
+            else:
+                low, high = '2023-01-01', '2023-03-31'
+            n = 200
+            symbol_time = best_of(lambda: [conn.execute('SELECT * FROM holdings WHERE symbol = ?', ('SYM00042',))
+                                           .fetchall() for _ in range(n)]) / n
+            range_time = best_of(lambda: [conn.execute('SELECT date, total_value FROM performance_history '
+                                                       'WHERE date BETWEEN ? AND ?', (low, high)).fetchall()
+                                          for _ in range(n)]) / n
+            timings[layout] = (symbol_time, range_time)
+            conn.close()
+    print(f"{'schema':>9} {'by symbol (ms)':>15} {'date range (ms)':>16}")
+    for layout, (symbol_time, range_time) in timings.items():
+        print(f"{layout:>9} {symbol_time * 1000:>15.3f} {range_time * 1000:>16.3f}")
+
+
+@benchmark
+def var():
+    """95% VaR: np.percentile vs np.partition (exact) vs P2 sketch (streaming)"""
+    from var_engine import historical_var, StreamingVaR
+    rng = np.random.default_rng(0)
+    print(f"{'returns':>9} {'percentile (ms)':>16} {'exact (ms)':>11} {'stream (ms)':>12} "
+          f"{'stream/tick (us)':>17} {'stream err (bp)':>16}")
+    for n in [252, 2_520, 100_000, 1_000_000]:
+        # Fat-tailed daily returns
+        returns = rng.standard_t(4, n) * 0.01
+        reference = np.percentile(returns, 5)
+        assert np.isclose(historical_var(returns), reference)
+        percentile_time = best_of(lambda: np.percentile(returns, 5))
+        exact_time = best_of(lambda: historical_var(returns))
+        engine = StreamingVaR()
+        stream_time = best_of(lambda: StreamingVaR().update_many(returns), repeat=1)
+        engine.update_many(returns)
+        error_bp = abs(engine.value - reference) * 1e4
+        print(f"{n:>9,} {percentile_time * 1000:>16.3f} {exact_time * 1000:>11.3f} {stream_time * 1000:>12.1f} "
+              f"{stream_time / n * 1e6:>17.2f} {error_bp:>16.2f}")
+
+
+@benchmark
+def monte_carlo():
+    """Parametric vs Monte Carlo VaR/CVaR, 500 assets, chunked and process-pool fan-out"""
+    from var_engine import parametric_var_cvar, monte_carlo_var_cvar
+    provider = SyntheticProvider(n_days=504)
+    returns = provider.get_prices(SyntheticProvider.symbols(500)).pct_change().dropna().values
+    weights = np.full(500, 1 / 500)
+    cov, mean = np.cov(returns, rowvar=False), returns.mean(axis=0)
+    parametric = parametric_var_cvar(weights, cov, mean)
+    print(f"parametric: VaR95 {parametric[0.95]['var']:.5f} CVaR95 {parametric[0.95]['cvar']:.5f} "
+          f"VaR99 {parametric[0.99]['var']:.5f}")
+    cores = os.cpu_count() or 1
+    for n_scenarios, n_jobs in [(100_000, 1), (1_000_000, 1), (1_000_000, min(4, cores))]:
+        start = time.perf_counter()
+        result = monte_carlo_var_cvar(weights, cov, mean, n_scenarios=n_scenarios, memory_budget_mb=128,
+                                      n_jobs=n_jobs)
+        seconds = time.perf_counter() - start
+        print(f"monte carlo {n_scenarios:>9,} scenarios, {n_jobs} job(s): {seconds:6.2f}s  "
+              f"VaR95 {result[0.95]['var']:.5f} CVaR95 {result[0.95]['cvar']:.5f} VaR99 {result[0.99]['var']:.5f}")
+
+
+def legacy_portfolio_risk(prices, weights):
+    """Per-portfolio risk the way calculate_portfolio_metrics computes it"""
+    returns = prices.pct_change().dropna()
+    portfolio_returns = (returns * weights).sum(axis=1)
+    volatility = portfolio_returns.std() * np.sqrt(252)
+    values = (prices * weights).sum(axis=1)
+    running_max = values.expanding().max()
+    sharpe = (portfolio_returns.mean() * 252 - 0.02) / volatility if volatility > 0 else 0
+    return [volatility, np.percentile(portfolio_returns, 5), ((values - running_max) / running_max).min(), sharpe]
+
+
+@benchmark
+def batch_risk():
+    """P portfolios x 500 symbols: one GEMM pass vs a per-portfolio pandas loop"""
+    from batch_risk import batch_risk_metrics
+    rng = np.random.default_rng(0)
+    symbols = SyntheticProvider.symbols(500)
+    prices = SyntheticProvider().get_prices(symbols)
+    print(f"{'portfolios':>10} {'loop (s)':>9} {'batch (ms)':>11} {'speedup':>8}")
+    for n_portfolios in [10, 100, 500]:
+        # Each account holds 30 random names
+        raw = np.zeros((n_portfolios, len(symbols)))
+        for row in raw:
+            row[rng.choice(len(symbols), 30, replace=False)] = rng.uniform(1, 10, 30)
+        weights = pd.DataFrame(raw / raw.sum(axis=1, keepdims=True), columns=symbols)
+        batch = batch_risk_metrics(weights, prices)
+        assert np.allclose(batch.values[:3], [legacy_portfolio_risk(prices, w) for w in weights.values[:3]])
+        # The loop is linear in P; time at most 50 portfolios and scale up
+        loop_rows = weights.values[:50]
+        loop_time = best_of(lambda: [legacy_portfolio_risk(prices, w) for w in loop_rows], repeat=1)
+        loop_time *= n_portfolios / len(loop_rows)
+        batch_time = best_of(lambda: batch_risk_metrics(weights, prices))
+        print(f"{n_portfolios:>10} {loop_time:>9.2f} {batch_time * 1000:>11.1f} {loop_time / batch_time:>7.0f}x")
+
+    # Through the analyzer: one account holds a name listed 100 days ago, which must
+    # not shorten the history the other accounts are measured over
+    class RecentListing(SyntheticProvider):
+        def get_prices(self, symbols, start=None, period=None):
+            prices = super().get_prices(symbols, start, period)
+            if 'NEWCO' in prices:
+                prices.loc[prices.index < self.dates[-100], 'NEWCO'] = np.nan
+            return prices
+
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = WebPortfolioRiskAnalyzer(os.path.join(tmp, 'portfolio.db'), provider=RecentListing())
+        lots = synthetic_lots(60, 20).drop(columns='id')
+        lots['portfolio_id'] = np.repeat(['A', 'B', 'C'], 20)
+        lots.loc[lots.index[25], 'symbol'] = 'NEWCO'
+        analyzer.import_holdings(lots, replace=True)
+        batch = analyzer.calculate_batch_metrics()
+        for portfolio_id, row in batch.iterrows():
+            single = analyzer.calculate_portfolio_metrics(portfolio_id=portfolio_id)
+            expected = [single[name] for name in row.index]
+            assert np.allclose(row.values, expected), (portfolio_id, row.values, expected)
+        print(f"batch rows match calculate_portfolio_metrics for {len(batch)} portfolios "
+              f"(B holds a 100-day listing)")
+        analyzer.db.close_all()
+        analyzer.price_store.db.close_all()
+
+
+@benchmark
+def covariance():
+    """Correlation on a dashboard load: returns.corr() vs the cached estimate plus one new day"""
+    from covariance import CovarianceEstimate
+    print(f"{'symbols':>8} {'corr() (s)':>11} {'build (s)':>10} {'+1 day (ms)':>12} {'float64 MB':>11} "
+          f"{'float32 MB':>11} {'max err':>8}")
+    for n_symbols in [100, 500, 2_000]:
+        returns = SyntheticProvider(n_days=253).get_prices(SyntheticProvider.symbols(n_symbols)).pct_change().dropna()
+        history, today = returns.iloc[:-1], returns.iloc[-1:]
+        corr_time = best_of(lambda: returns.corr(), repeat=1)
+        build_time = best_of(lambda: CovarianceEstimate(list(returns.columns)).update(history), repeat=1)
+        estimate = CovarianceEstimate(list(returns.columns)).update(history)
+        start = time.perf_counter()
+        estimate.update(today)
+        correlation = estimate.correlation()
+        update_time = time.perf_counter() - start
+        error = np.nanmax(np.abs(correlation.values - returns.corr().values))
+        print(f"{n_symbols:>8} {corr_time:>11.3f} {build_time:>10.3f} {update_time * 1000:>12.1f} "
+              f"{n_symbols ** 2 * 8 / 2**20:>11.1f} {estimate.cov.nbytes / 2**20:>11.1f} {error:>8.1e}")
+
+    # Sliding the one-year window: each day is one update plus one downdate
+    returns = SyntheticProvider(n_days=453).get_prices(SyntheticProvider.symbols(500)).pct_change().dropna()
+    estimate = CovarianceEstimate(list(returns.columns)).update(returns.iloc[:252])
+    start = time.perf_counter()
+    for day in range(1, 201):
+        estimate.downdate(returns.iloc[day - 1:day])
+        estimate.update(returns.iloc[251 + day:252 + day])
+    slide_time = (time.perf_counter() - start) / 200
+    error = np.nanmax(np.abs(estimate.correlation().values - returns.iloc[200:452].corr().values))
+    print(f"500 symbols, window slid 200 days: {slide_time * 1000:.1f} ms/day, max err vs corr() {error:.1e}")
+
+    # Dropping a short-history symbol widens the shared dates, so the cached estimate must not be reused
+    prices = SyntheticProvider(n_days=250).get_prices(['AAA', 'BBB', 'CCC'])
+    prices.iloc[:150, 2] = np.nan
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = WebPortfolioRiskAnalyzer(os.path.join(tmp, 'portfolio.db'), provider=SyntheticProvider())
+        analyzer.covariance_estimate(prices.pct_change().dropna())
+        returns = prices[['AAA', 'BBB']].pct_change().dropna()
+        error = np.nanmax(np.abs(analyzer.covariance_estimate(returns).correlation().values - returns.corr().values))
+        assert error < 1e-6, f"cached estimate reused for a different window (err {error:.1e})"
+    print(f"symbol set shrunk to a longer window: max err vs corr() {error:.1e}")
+
+
+@benchmark
+def charts():
+    """Dashboard chart rendering: serial vs the shared process pool vs a warm chart cache"""
+    from charts import render_charts
+    from chart_cache import ChartCache
+    with tempfile.TemporaryDirectory() as tmp:
+        analyzer = WebPortfolioRiskAnalyzer(os.path.join(tmp, 'portfolio.db'), provider=SyntheticProvider())
+        analyzer.import_holdings(synthetic_lots(20, 10), replace=True)
+        metrics = analyzer.calculate_portfolio_metrics()
+        tasks = analyzer.chart_tasks(metrics)
+        serial = best_of(lambda: render_charts(tasks, in_process=True), repeat=1)
+        workers = min(len(tasks), os.cpu_count() or 1)
+        # The pool is shared and outlives the call, so only the first render pays for starting it
+        cold = best_of(lambda: render_charts(tasks), repeat=1)
+        pooled = best_of(lambda: render_charts(tasks), repeat=1)
+        print(f"{len(tasks)} charts: serial {serial:.2f}s, pool ({workers} CPUs) first call {cold:.2f}s, "
+              f"warm {pooled:.2f}s, {serial / pooled:.1f}x")
+        cache = ChartCache(os.path.join(tmp, 'charts'))
+        render_charts(tasks, cache=cache)
+        memory = best_of(lambda: render_charts(tasks, cache=cache))
+        disk = best_of(lambda: render_charts(tasks, cache=ChartCache(cache.directory)))
+        print(f"cached: memory {memory * 1000:.2f} ms, disk {disk * 1000:.2f} ms, {cache.stats()}")
+
+
+@benchmark
+def downsampling():
+    """Performance chart: every point vs min/max buckets vs LTTB, render time and JSON size"""
+    import json
+    from charts import line_chart
+    from downsample import downsample
+    rng = np.random.default_rng(0)
+    print(f"{'points':>9} {'method':>7} {'kept':>6} {'select (ms)':>12} {'render (s)':>11} {'json KB':>8} "
+          f"{'peak/trough kept':>17}")
+    for n_points in [2_520, 100_000, 1_000_000]:
+        # Ten years of daily bars up to minute bars
+        series = pd.Series(np.cumsum(rng.standard_normal(n_points)) * 0.1,
+                           index=pd.date_range('2015-01-01', periods=n_points, freq='min'))
+        for method in [None, 'minmax', 'lttb']:
+            start = time.perf_counter()
+            points = downsample(series, 2000, method) if method else series
+            select = time.perf_counter() - start
+            render = best_of(lambda: line_chart(points.index.to_numpy(), points.to_numpy(), 'Performance',
+                                                'Return (%)', dpi=150), repeat=1)
+            payload = len(json.dumps({'dates': points.index.strftime('%Y-%m-%d %H:%M').tolist(),
+                                      'values': np.round(points.to_numpy(), 3).tolist()}))
+            extremes = points.max() == series.max() and points.min() == series.min()
+            print(f"{n_points:>9,} {method or 'all':>7} {len(points):>6} {select * 1000:>12.1f} {render:>11.2f} "
+                  f"{payload / 1024:>8.0f} {str(extremes):>17}")
+
+
+def legacy_pdf_report(output, portfolio_df):
+    """The original holdings table: one f-string row per iterrows() and a single Table in the story"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import SimpleDocTemplate, Table
+    from pdf_report import TABLE_STYLE
+    table_data = [['Symbol', 'Quantity', 'Current Price', 'Value', 'Weight', 'P&L', 'P&L %']]
+    for _, row in portfolio_df.iterrows():
+        table_data.append([row['symbol'], f"{row['quantity']:.0f}", f"${row['current_price']:.2f}",
+                           f"${row['current_value']:,.2f}", f"{row['weight']:.1f}%", f"${row['pnl']:,.2f}",
+                           f"{row['pnl_pct']:+.1f}%"])
+    table = Table(table_data)
+    table.setStyle(TABLE_STYLE)
+    doc = SimpleDocTemplate(output, pagesize=letter)
+    doc.build([table])
+    return doc.page
+
+
+@benchmark
+def pdf_report():
+    """Holdings report: single story Table vs paginated canvas writer, pages/s and peak memory"""
+    import io
+    import tracemalloc
+    from pdf_report import write_pdf_report
+    analyzer = WebPortfolioRiskAnalyzer.__new__(WebPortfolioRiskAnalyzer)
+    metrics = {'total_value': 0, 'portfolio_volatility': 0.1, 'portfolio_var_95': -0.02, 'sharpe_ratio': 1.0,
+               'max_drawdown': -0.1}
+    print(f"{'lots':>7} {'builder':>9} {'pages':>6} {'seconds':>8} {'pages/s':>8} {'peak MB':>8}")
+    for n_lots in [5_000, 50_000]:
+        lots = synthetic_lots(n_lots, 2_000)
+        portfolio_df, total_value = analyzer.value_holdings(lots, synthetic_market_data(sorted(lots['symbol'].unique())))
+        builders = [('stream', lambda out: write_pdf_report(out, dict(metrics, portfolio_df=portfolio_df,
+                                                                      total_value=total_value), []))]
+        # The single-Table story grows super-linearly; 50k lots takes many minutes
+        if n_lots <= 5_000:
+            builders.insert(0, ('legacy', lambda out: legacy_pdf_report(out, portfolio_df)))
+        for name, build in builders:
+            start = time.perf_counter()
+            pages = build(io.BytesIO())
+            seconds = time.perf_counter() - start
+            # Memory is traced in a second run so tracing overhead does not skew the timing
+            tracemalloc.start()
+            build(io.BytesIO())
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{n_lots:>7,} {name:>9} {pages:>6} {seconds:>8.2f} {pages / seconds:>8.1f} {peak / 2**20:>8.1f}")
+
+
+
+@benchmark
+def dashboard():
+    """/dashboard latency: full analysis per request vs serving the latest snapshot"""
+    import webapp_for_existing as webapp
+    from snapshot import SnapshotScheduler
+    with tempfile.TemporaryDirectory() as tmp:
+        webapp.analyzer = webapp.WebAnalyzer(os.path.join(tmp, 'portfolio.db'), provider=SyntheticProvider())
+        webapp.analyzer.import_holdings(synthetic_lots(200, 50), replace=True)
+        webapp.analyzer.set_risk_limits()
+        webapp.report_queue.directory = os.path.join(tmp, 'reports')
+        client = webapp.app.test_client()
+        for mode in ['png', 'json']:
+            # interval=0 makes every snapshot stale, so each request waits for a fresh analysis like before
+            webapp.snapshots = SnapshotScheduler(webapp.build_snapshot, interval=0)
+            inline = best_of(lambda: (webapp.snapshots.run_once(), client.get(f'/dashboard?charts={mode}')), repeat=3)
+            # The route started this scheduler's thread; left running it would keep recomputing
+            webapp.snapshots.stop()
+            webapp.snapshots = SnapshotScheduler(webapp.build_snapshot, interval=3600).start()
+            webapp.snapshots.wait()
+            served = best_of(lambda: client.get(f'/dashboard?charts={mode}'), repeat=10)
+            webapp.snapshots.stop()
+            print(f"{mode:>4}: inline {inline * 1000:8.1f} ms, snapshot {served * 1000:6.1f} ms, "
+                  f"{inline / served:6.1f}x")
+        webapp.report_queue.executor.shutdown(wait=True)
+
+
+
+@benchmark
+def api():
+    """/api/holdings polling: first request, cached body, 304 revalidation; JSON vs gzip vs Arrow size"""
+    import webapp_for_existing as webapp
+    from snapshot import SnapshotScheduler
+    with tempfile.TemporaryDirectory() as tmp:
+        webapp.analyzer = webapp.WebAnalyzer(os.path.join(tmp, 'portfolio.db'), provider=SyntheticProvider())
+        webapp.analyzer.import_holdings(synthetic_lots(50_000, 500), replace=True)
+        webapp.report_queue.directory = os.path.join(tmp, 'reports')
+        webapp.snapshots = SnapshotScheduler(webapp.build_snapshot, interval=3600).start()
+        webapp.snapshots.wait()
+        client = webapp.app.test_client()
+        print(f"{'request':>22} {'ms':>8} {'bytes':>10}")
+        for label, url, headers in [('json', '/api/holdings', {}),
+                                    ('json + gzip', '/api/holdings', {'Accept-Encoding': 'gzip'}),
+                                    ('arrow', '/api/holdings?format=arrow', {}),
+                                    ('arrow + gzip', '/api/holdings?format=arrow', {'Accept-Encoding': 'gzip'})]:
+            start = time.perf_counter()
+            response = client.get(url, headers=headers)
+            first = time.perf_counter() - start
+            cached = best_of(lambda: client.get(url, headers=headers), repeat=10)
+            etag = {**headers, 'If-None-Match': response.headers['ETag']}
+            revalidate = best_of(lambda: client.get(url, headers=etag), repeat=10)
+            print(f"{label + ' (first)':>22} {first * 1000:>8.1f} {len(response.data):>10,}")
+            print(f"{label + ' (cached)':>22} {cached * 1000:>8.1f} {len(response.data):>10,}")
+            print(f"{label + ' (304)':>22} {revalidate * 1000:>8.2f} {0:>10}")
+        webapp.snapshots.stop()
+        webapp.report_queue.executor.shutdown(wait=True)
+
+
+
+@benchmark
+def export():
+    """Price panel hand-off: CSV and pickle vs Parquet vs a memory-mapped Arrow file"""
+    import pickle
+    import arrow_export
+    symbols = SyntheticProvider.symbols(2_000)
+    prices = SyntheticProvider(n_days=1260).get_prices(symbols)
+    metrics = {'portfolio_df': synthetic_lots(50_000, 2_000), 'positions_df': synthetic_lots(2_000, 2_000),
+               'price_data': prices, 'correlation_matrix': pd.DataFrame(), 'total_value': 0.0,
+               'portfolio_volatility': 0.0, 'portfolio_var_95': 0.0, 'max_drawdown': 0.0, 'sharpe_ratio': 0.0}
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        manifest = arrow_export.write_export(metrics, tmp)
+        print(f"write_export: {time.perf_counter() - start:.2f}s for {prices.shape[0]} x {prices.shape[1]} prices "
+              f"and {len(metrics['portfolio_df']):,} lots")
+        directory = os.path.join(tmp, manifest['id'])
+        panel = prices.rename_axis('date').reset_index()
+        panel.to_csv(os.path.join(tmp, 'prices.csv'), index=False)
+        with open(os.path.join(tmp, 'prices.pkl'), 'wb') as f:
+            pickle.dump(panel, f)
+
+        def from_pickle():
+            with open(os.path.join(tmp, 'prices.pkl'), 'rb') as f:
+                return pickle.load(f)
+
+        readers = [
+            ('csv', os.path.join(tmp, 'prices.csv'), lambda: pd.read_csv(os.path.join(tmp, 'prices.csv'))),
+            ('pickle', os.path.join(tmp, 'prices.pkl'), from_pickle),
+            ('parquet', os.path.join(directory, 'prices.parquet'),
+             lambda: pd.read_parquet(os.path.join(directory, 'prices.parquet'))),
+            ('arrow mmap', os.path.join(directory, 'prices.arrow'), lambda: arrow_export.read_table(tmp, 'prices')),
+            ('arrow mmap + pandas', os.path.join(directory, 'prices.arrow'),
+             lambda: arrow_export.read_table(tmp, 'prices').to_pandas())
+        ]
+        print(f"{'reader':>20} {'MB':>7} {'load (ms)':>10}")
+        for name, path, read in readers:
+            print(f"{name:>20} {os.path.getsize(path) / 2**20:>7.1f} {best_of(read) * 1000:>10.1f}")
+
+
+
+@benchmark
+def price_matrix():
+    """Price panel per request: SQL pivot + dict of Series vs the memory-mapped price matrix"""
+    from price_store import PriceStore
+    from price_matrix import PriceMatrix
+    n_symbols, n_days = 3_000, 2_520
+    symbols = SyntheticProvider.symbols(n_symbols)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = PriceStore(os.path.join(tmp, 'prices.db'))
+        history = SyntheticProvider(n_days=n_days + 5).get_prices(symbols)
+        start = time.perf_counter()
+        store.save(history.iloc[:n_days])
+        print(f"store: {n_days} days x {n_symbols} symbols saved in {time.perf_counter() - start:.1f}s")
+        portfolio = list(np.random.default_rng(0).choice(symbols, 500, replace=False))
+
+        def legacy():
+            prices = store.load(portfolio)
+            return pd.DataFrame({s: prices[s] for s in portfolio}).dropna()
+
+        for dtype in [np.float64, np.float32]:
+            start = time.perf_counter()
+            matrix = store.matrix(dtype)
+            build = time.perf_counter() - start
+            path = matrix.values.filename
+            reopen = best_of(lambda: PriceMatrix.open(path))
+            print(f"{np.dtype(dtype).name}: build {build:.2f}s, {os.path.getsize(path) / 2**20:.0f} MB, "
+                  f"open in another worker {reopen * 1000:.2f} ms")
+        expected = legacy()
+        assert np.allclose(store.matrix().frame(portfolio).to_numpy(), expected.to_numpy())
+        print(f"{'500-symbol panel':>28} {'ms':>8}")
+        print(f"{'legacy SQL + dict of Series':>28} {best_of(legacy, repeat=1) * 1000:>8.1f}")
+        for dtype in [np.float64, np.float32]:
+            matrix = store.matrix(dtype)
+            gather = best_of(lambda: matrix.frame(portfolio))
+            view = best_of(lambda: matrix.frame(symbols[:500]))
+            print(f"{np.dtype(dtype).name + ' matrix, scattered':>28} {gather * 1000:>8.1f}")
+            print(f"{np.dtype(dtype).name + ' matrix, adjacent (view)':>28} {view * 1000:>8.2f}")
+
+        # Hourly tail refresh: five new days, refetched from two days back like sync_prices does
+        store.save(history.iloc[n_days - 2:])
+        start = time.perf_counter()
+        extended = store.matrix()
+        tail = time.perf_counter() - start
+        with store.db.connection() as conn:
+            start = time.perf_counter()
+            rebuilt = PriceMatrix.build(conn, os.path.join(tmp, 'rebuilt.npy'))
+            full = time.perf_counter() - start
+        assert extended.symbols == rebuilt.symbols and extended.dates.equals(rebuilt.dates)
+        assert np.array_equal(extended.values, rebuilt.values, equal_nan=True)
+        version = store.version()
+        store.save(history.iloc[n_days:])
+        assert store.version() == version, "refetching unchanged bars must not bump the version"
+        print(f"tail refresh (5 days): extend {tail * 1000:.0f} ms vs full rebuild {full:.2f}s")
+        store.db.close_all()
+
+
+
+def legacy_check_risk_compliance(limits_df, metrics):
+    """The original per-limit iterrows check: VaR and the single largest weight only"""
+    alerts = []
+    for _, limit in limits_df.iterrows():
+        metric_name = limit['metric']
+        limit_value = limit['limit_value']
+        alert_threshold = limit['alert_threshold']
+        if metric_name == 'portfolio_var_95':
+            current_value = abs(metrics['portfolio_var_95'])
+            if current_value > limit_value:
+                alerts.append({'type': 'danger', 'message': f"Portfolio VaR ({current_value:.2%}) exceeds limit"})
+            elif current_value > alert_threshold:
+                alerts.append({'type': 'warning', 'message': f"Portfolio VaR ({current_value:.2%}) approaching limit"})
+        elif metric_name == 'individual_weight':
+            positions_df = metrics['positions_df']
+            max_weight = positions_df['weight'].max() / 100
+            symbol = positions_df.loc[positions_df['weight'].idxmax(), 'symbol']
+            if max_weight > limit_value:
+                alerts.append({'type': 'danger', 'message': f"{symbol} weight ({max_weight:.2%}) exceeds limit"})
+            elif max_weight > alert_threshold:
+                alerts.append({'type': 'warning', 'message': f"{symbol} weight ({max_weight:.2%}) approaching limit"})
+    return alerts
+
+
+@benchmark
+def compliance():
+    """Compliance checks: legacy per-portfolio iterrows vs one vectorized pass over every account"""
+    from compliance import ComplianceRules, breach_alerts
+    limits_df = pd.DataFrame([('portfolio_var_95', 0.02, 0.016), ('individual_weight', 0.15, 0.135),
+                              ('sector_concentration', 0.30, 0.27), ('asset_class_concentration', 0.60, 0.54),
+                              ('individual_weight:SYM00001', 0.05, 0.045)],
+                             columns=['metric', 'limit_value', 'alert_threshold'])
+    rng = np.random.default_rng(0)
+    sectors = np.array(SyntheticProvider.SECTORS)
+    print(f"{'accounts':>9} {'positions':>10} {'legacy (s)':>11} {'breaches':>9} {'engine (s)':>11} {'breaches':>9} "
+          f"{'speedup':>8}")
+    for n_accounts in [10, 100, 1_000, 5_000]:
+        n_positions = 40
+        exposures = pd.DataFrame({
+            'portfolio_id': np.repeat([f'acct{i:05d}' for i in range(n_accounts)], n_positions),
+            'symbol': rng.choice(SyntheticProvider.symbols(2_000), n_accounts * n_positions),
+            'asset_class': rng.choice(['Equity', 'ETF', 'Bond ETF'], n_accounts * n_positions),
+            'sector': rng.choice(sectors, n_accounts * n_positions),
+            'weight': rng.dirichlet(np.full(n_positions, 0.5), n_accounts).ravel()
+        })
+        portfolio_values = pd.DataFrame({'portfolio_var_95': -rng.uniform(0.005, 0.03, n_accounts)},
+                                        index=exposures['portfolio_id'].unique())
+
+        def legacy():
+            alerts = []
+            for portfolio_id, positions in exposures.groupby('portfolio_id', sort=False):
+                metrics = {'positions_df': positions.assign(weight=positions['weight'] * 100),
+                           'portfolio_var_95': portfolio_values.loc[portfolio_id, 'portfolio_var_95']}
+                alerts += legacy_check_risk_compliance(limits_df, metrics)
+            return alerts
+
+        def engine():
+            return breach_alerts(ComplianceRules(limits_df).evaluate(exposures, portfolio_values))
+
+        legacy_time = best_of(legacy, repeat=1)
+        engine_time = best_of(engine)
+        print(f"{n_accounts:>9,} {len(exposures):>10,} {legacy_time:>11.3f} {len(legacy()):>9,} {engine_time:>11.3f} "
+              f"{len(engine()):>9,} {legacy_time / engine_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+        print()
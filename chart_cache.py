@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def chart_key(renderer, kwargs):
+    """Content hash of a chart task: the renderer plus every input array and option"""
+    digest = hashlib.sha256(f'{renderer.__module__}.{renderer.__name__}'.encode())
+    for name in sorted(kwargs):
+        value = kwargs[name]
+        digest.update(name.encode())
+        if isinstance(value, np.ndarray):
+            value = np.ascontiguousarray(value)
+            digest.update(f'{value.dtype}{value.shape}'.encode())
+            digest.update(value.view(np.uint8) if value.dtype != object else repr(value.tolist()).encode())
+        else:
+            digest.update(repr(value).encode())
+    return digest.hexdigest()
+
+
+class ChartCache:
+    """Rendered PNGs keyed by chart_key, with LRU eviction in memory and on disk.
+
+    The memory tier holds up to max_memory_bytes of PNG bytes; the disk tier
+    keeps <key>.png files in directory up to max_disk_bytes, using file
+    modification time as recency. Either limit can be 0 to disable that tier.
+    """
+
+    def __init__(self, directory='chart_cache', max_memory_bytes=64 * 2**20, max_disk_bytes=512 * 2**20):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = self.misses = self.disk_hits = self.evictions = 0
+        self.lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.directory, f'{key}.png')
+
+    def get(self, key, record=True):
+        """PNG bytes for key, or None; record=False leaves the hit/miss counters alone"""
+        with self.lock:
+            png = self.memory.get(key)
+            if png is not None:
+                self.memory.move_to_end(key)
+                if record:
+                    self.hits += 1
+                return png
+        png = None
+        if self.max_disk_bytes:
+            try:
+                with open(self.path(key), 'rb') as f:
+                    png = f.read()
+                os.utime(self.path(key))
+            except OSError:
+                png = None
+        with self.lock:
+            if png is None:
+                if record:
+                    self.misses += 1
+                return None
+            if record:
+                self.hits += 1
+                self.disk_hits += 1
+            self._remember(key, png)
+        return png
+
+    def put(self, key, png):
+        with self.lock:
+            self._remember(key, png)
+        if self.max_disk_bytes:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write then rename so a concurrent reader never sees a partial file
+            tmp = f'{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(png)
+            os.replace(tmp, self.path(key))
+            self._evict_disk()
+
+    def _remember(self, key, png):
+        if len(png) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = png
+        self.memory_bytes += len(png)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.png'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self.lock:
+                self.evictions += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory_bytes
+            }
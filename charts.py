@@ -0,0 +1,140 @@
+import base64
+import io
+import os
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # Use non-interactive backend
+import matplotlib.pyplot as plt
+import seaborn as sns
+from chart_cache import chart_key
+from worker_pool import pool_map
+
+# Renderers take plain arrays and strings so a chart task can be pickled to a worker
+# process; each returns the PNG bytes of one figure.
+
+
+def _to_png(fig, dpi):
+    fig.tight_layout()
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def _style(style):
+    return plt.style.context(style if style in plt.style.available else 'default')
+
+
+def pie_chart(labels, values, title, figsize=(10, 8), cmap='Set3', explode=None, title_size=16, dpi=300,
+              style='default'):
+    with _style(style):
+        fig, ax = plt.subplots(figsize=figsize)
+        colors = plt.get_cmap(cmap)(np.linspace(0, 1, len(values)))
+        _, _, autotexts = ax.pie(values, labels=labels, autopct='%1.1f%%', colors=colors,
+                                 explode=[explode] * len(values) if explode else None)
+        ax.set_title(title, fontsize=title_size, fontweight='bold', pad=20)
+        # Make text more readable
+        for autotext in autotexts:
+            autotext.set_color('white')
+            autotext.set_fontweight('bold')
+        return _to_png(fig, dpi)
+
+
+def line_chart(dates, values, title, ylabel, figsize=(12, 6), linewidth=3, alpha=0.8, title_size=16, dpi=300,
+               style='default'):
+    with _style(style):
+        fig, ax = plt.subplots(figsize=figsize)
+        ax.plot(dates, values, linewidth=linewidth, color='#2E86C1', alpha=alpha)
+        ax.fill_between(dates, values, alpha=0.3, color='#2E86C1')
+        ax.set_title(title, fontsize=title_size, fontweight='bold')
+        ax.set_ylabel(ylabel, fontsize=12)
+        ax.grid(True, alpha=0.3)
+        ax.tick_params(axis='x', labelrotation=45)
+        return _to_png(fig, dpi)
+
+
+def bar_chart(labels, values, title, ylabel=None, figsize=(10, 6), colors=None, title_size=16, dpi=300,
+              style='default'):
+    with _style(style):
+        fig, ax = plt.subplots(figsize=figsize)
+        bars = ax.bar(labels, values, color=colors)
+        ax.set_title(title, fontsize=title_size, fontweight='bold')
+        if ylabel:
+            ax.set_ylabel(ylabel, fontsize=12)
+        # Add value labels on bars
+        for bar in bars:
+            height = bar.get_height()
+            ax.annotate(f'{height:.2f}', xy=(bar.get_x() + bar.get_width() / 2, height), xytext=(0, 3),
+                        textcoords='offset points', ha='center', va='bottom', fontweight='bold')
+        ax.tick_params(axis='x', labelrotation=45)
+        return _to_png(fig, dpi)
+
+
+def heatmap_chart(matrix, labels, title, figsize=(10, 8), cbar_shrink=0.8, title_size=16, dpi=300,
+                  style='default'):
+    with _style(style):
+        fig, ax = plt.subplots(figsize=figsize)
+        sns.heatmap(np.asarray(matrix, dtype=float), xticklabels=labels, yticklabels=labels, annot=True,
+                    cmap='RdYlBu_r', center=0, square=True, fmt='.2f', cbar_kws={'shrink': cbar_shrink}, ax=ax)
+        ax.set_title(title, fontsize=title_size, fontweight='bold', pad=20)
+        return _to_png(fig, dpi)
+
+
+def quantize_correlation(matrix, scale=127):
+    """Correlations as base64 row-major int8 (value * scale, NaN as 0) for the JSON chart mode"""
+    values = np.nan_to_num(np.asarray(matrix, dtype=np.float32))
+    quantized = np.clip(np.rint(values * scale), -scale, scale).astype(np.int8)
+    return {'scale': scale, 'int8': base64.b64encode(quantized.tobytes()).decode()}
+
+
+def _render(task):
+    name, renderer, kwargs = task
+    return name, renderer(**kwargs)
+
+
+def _render_tasks(tasks, in_process=False, cache=None):
+    # Returns ({name: cache key}, {name: PNG bytes}), rendering only what the cache lacks
+    keys = {name: chart_key(renderer, kwargs) for name, renderer, kwargs in tasks} if cache is not None else {}
+    rendered = {name: cache.get(key) for name, key in keys.items()}
+    pending = [task for task in tasks if rendered.get(task[0]) is None]
+    if pending:
+        if in_process or min(len(pending), os.cpu_count() or 1) <= 1:
+            fresh = dict(_render(task) for task in pending)
+        else:
+            fresh = dict(pool_map(_render, pending))
+        for name, png in fresh.items():
+            if cache is not None:
+                cache.put(keys[name], png)
+            rendered[name] = png
+    return keys, rendered
+
+
+def render_charts(tasks, in_process=False, cache=None):
+    """Render (name, renderer, kwargs) tasks; returns {name: PNG bytes} in task order.
+
+    Tasks are independent, so they are fanned out over a process pool shared
+    by every call, with up to one worker per CPU; the workers start on first
+    use and stay up. With in_process=True (or a single chart to draw, or a
+    single CPU) they render in this process instead. With a ChartCache,
+    charts whose inputs hash to a cached key are not rendered again.
+    """
+    _, rendered = _render_tasks(tasks, in_process, cache)
+    return {name: rendered[name] for name, _, _ in tasks}
+
+
+def cache_charts(tasks, cache, in_process=False):
+    """Make sure every task's chart is in cache; returns {name: cache key} for serving by URL"""
+    keys, _ = _render_tasks(tasks, in_process, cache)
+    return {name: keys[name] for name, _, _ in tasks}
+
+
+def render_chart(task, cache=None):
+    """Render one (name, renderer, kwargs) task in the shared pool; returns its PNG bytes.
+
+    pyplot never runs on the calling thread, so request threads can call
+    this concurrently. With a ChartCache the PNG is stored under its key.
+    """
+    (_, png), = pool_map(_render, [task])
+    if cache is not None:
+        cache.put(chart_key(task[1], task[2]), png)
+    return png
@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+
+# Limit metric -> what it caps: a portfolio-level number or the summed weight per symbol, sector or asset class
+RULE_SCOPES = {
+    'portfolio_var_95': 'portfolio',
+    'individual_weight': 'symbol',
+    'sector_concentration': 'sector',
+    'asset_class_concentration': 'asset_class'
+}
+
+BREACH_COLUMNS = ['portfolio_id', 'rule', 'scope', 'key', 'value', 'limit', 'threshold', 'severity']
+
+MESSAGES = {
+    'portfolio': "Portfolio VaR ({value:.2%}) {verb} limit ({limit:.2%})",
+    'symbol': "{key} weight ({value:.2%}) {verb} limit ({limit:.2%})",
+    'sector': "{key} sector concentration ({value:.2%}) {verb} limit ({limit:.2%})",
+    'asset_class': "{key} asset class concentration ({value:.2%}) {verb} limit ({limit:.2%})"
+}
+
+
+class ComplianceRules:
+    """Risk limits compiled into per-rule lookup tables and evaluated column-wise.
+
+    Each risk_limits row is a metric from RULE_SCOPES with a limit and an
+    alert threshold. A metric of the form 'rule:key' overrides the rule for
+    one symbol, sector, asset class or (for portfolio_var_95) portfolio,
+    e.g. 'individual_weight:TSLA' or 'sector_concentration:Technology';
+    the plain 'rule' row applies to every other key. Values above the limit
+    are 'danger' breaches, values above the threshold 'warning' ones.
+    """
+
+    def __init__(self, limits_df):
+        self.rules = {}
+        rows = limits_df[['metric', 'limit_value', 'alert_threshold']].itertuples(index=False, name=None)
+        for metric, limit_value, alert_threshold in rows:
+            rule, _, key = metric.partition(':')
+            if rule not in RULE_SCOPES:
+                print(f"Ignoring unknown risk limit: {metric}")
+                continue
+            entry = self.rules.setdefault(rule, {'default': (np.nan, np.nan), 'keys': [], 'limits': []})
+            if key:
+                entry['keys'].append(key)
+                entry['limits'].append((limit_value, alert_threshold))
+            else:
+                entry['default'] = (limit_value, alert_threshold)
+        for entry in self.rules.values():
+            entry['overrides'] = pd.DataFrame(entry.pop('limits'), index=pd.Index(entry.pop('keys'), dtype=object),
+                                              columns=['limit', 'threshold'], dtype=float)
+
+    def limits_for(self, rule, keys):
+        """(limit, threshold) arrays aligned with keys; NaN where the rule does not apply"""
+        entry = self.rules[rule]
+        default_limit, default_threshold = entry['default']
+        if entry['overrides'].empty:
+            return np.full(len(keys), default_limit), np.full(len(keys), default_threshold)
+        overrides = entry['overrides'].reindex(keys)
+        return (overrides['limit'].fillna(default_limit).to_numpy(),
+                overrides['threshold'].fillna(default_threshold).to_numpy())
+
+    def evaluate(self, exposures, portfolio_values=None):
+        """Every breach across all portfolios as a DataFrame with BREACH_COLUMNS.
+
+        exposures has one row per position or lot with portfolio_id, symbol,
+        sector, asset_class and weight (a fraction of its portfolio); rows
+        are summed per portfolio and key before comparing. portfolio_values
+        is indexed by portfolio_id with a column per portfolio-level rule,
+        e.g. portfolio_var_95. Rows come out by rule, worst first.
+        """
+        frames = []
+        for rule, scope in RULE_SCOPES.items():
+            if rule not in self.rules:
+                continue
+            if scope == 'portfolio':
+                if portfolio_values is None or rule not in portfolio_values:
+                    continue
+                values = portfolio_values[rule].abs()
+                index = pd.MultiIndex.from_arrays([values.index, values.index])
+            else:
+                values = exposures.groupby(['portfolio_id', scope], sort=False, dropna=False)['weight'].sum()
+                index = values.index
+            values = values.to_numpy(dtype=float)
+            # Limits are looked up once per distinct key and spread by the index codes; the
+            # appended default covers code -1, which marks a missing (NaN) key
+            key_codes = index.codes[1]
+            limit, threshold = self.limits_for(rule, index.levels[1])
+            limit = np.append(limit, self.rules[rule]['default'][0])[key_codes]
+            threshold = np.append(threshold, self.rules[rule]['default'][1])[key_codes]
+            danger = values > limit
+            flagged = np.flatnonzero(danger | (values > threshold))
+            if not len(flagged):
+                continue
+            flagged = flagged[np.argsort(-values[flagged], kind='stable')]
+            frames.append(pd.DataFrame({
+                'portfolio_id': index.get_level_values(0)[flagged],
+                'rule': rule,
+                'scope': scope,
+                'key': index.get_level_values(1)[flagged],
+                'value': values[flagged],
+                'limit': limit[flagged],
+                'threshold': threshold[flagged],
+                'severity': np.where(danger[flagged], 'danger', 'warning')
+            }))
+        if not frames:
+            return pd.DataFrame(columns=BREACH_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+def breach_alerts(breaches):
+    """Breaches as the dashboard's alert dicts: type, message and the breach's fields"""
+    alerts = []
+    for breach in breaches.to_dict('records'):
+        verb = 'exceeds' if breach['severity'] == 'danger' else 'approaching'
+        message = MESSAGES[breach['scope']].format(verb=verb, **breach)
+        alerts.append({'type': breach['severity'], 'message': message, **breach})
+    return alerts
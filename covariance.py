@@ -0,0 +1,148 @@
+import json
+import numpy as np
+import pandas as pd
+from schema import date_to_int
+
+COV_METHODS = ('sample', 'ewma')
+
+
+class CovarianceEstimate:
+    """Asset covariance maintained by merging new return rows into a stored estimate.
+
+    Each update folds k new days into the previous (mean, covariance) as one
+    weighted merge: the old estimate keeps weight count/(count+k) for the
+    equal-weighted sample estimate, or decay**k with halflife set (EWMA), and
+    the new rows enter through a single (k x N)' (k x N) product. A single
+    new day is therefore a rank-1 update. downdate() reverses the merge for
+    the oldest days, so the sample estimate can slide along a fixed window.
+    The matrix is kept as float32; the arithmetic runs in float64.
+    """
+
+    def __init__(self, symbols, halflife=None, mean=None, cov=None, count=0, weight_sq=0.0, fourth=0.0,
+                 first_date=None, last_date=None):
+        n = len(symbols)
+        self.symbols = list(symbols)
+        self.halflife = halflife
+        self.mean = np.zeros(n) if mean is None else np.asarray(mean, dtype=float)
+        self.cov = np.zeros((n, n), dtype=np.float32) if cov is None else np.asarray(cov, dtype=np.float32)
+        self.count = count
+        # Sum of squared observation weights (1/effective sample size) and the weighted
+        # mean of ||x - mean||^4, which Ledoit-Wolf needs
+        self.weight_sq = weight_sq
+        self.fourth = fourth
+        self.first_date = first_date
+        self.last_date = last_date
+
+    @property
+    def decay(self):
+        return 0.5 ** (1 / self.halflife) if self.halflife else None
+
+    def update(self, returns):
+        """Fold a date x symbol frame of new daily returns (in date order) into the estimate"""
+        returns = returns[self.symbols]
+        x = returns.to_numpy(dtype=float)
+        k = len(x)
+        if k == 0:
+            return self
+        if self.decay is None:
+            old_weight = self.count / (self.count + k)
+            weights = np.full(k, 1 / (self.count + k))
+        else:
+            ages = self.decay ** np.arange(k - 1, -1, -1)
+            old_weight = self.decay ** k if self.count else 0.0
+            weights = (1 - self.decay) * ages if self.count else ages / ages.sum()
+
+        mean = old_weight * self.mean + weights @ x
+        centred = x - mean
+        shift = self.mean - mean
+        cov = old_weight * (self.cov + np.outer(shift, shift)) + (centred.T * weights) @ centred
+        self.fourth = old_weight * self.fourth + weights @ np.square(np.square(centred).sum(axis=1))
+        self.weight_sq = old_weight ** 2 * self.weight_sq + weights @ weights
+        self.mean = mean
+        self.cov = cov.astype(np.float32)
+        self.count += k
+        if self.first_date is None:
+            self.first_date = date_to_int(returns.index[0])
+        self.last_date = date_to_int(returns.index[-1])
+        return self
+
+    def downdate(self, returns, first_date=None):
+        """Remove the oldest days, a date x symbol frame already folded in, from the sample estimate.
+
+        The exact inverse of update() for equal weights; first_date is the
+        first day left in the estimate. EWMA estimates cannot drop days, their
+        weights fade them instead.
+        """
+        if self.decay is not None:
+            raise ValueError("Only the equal-weighted sample estimate can drop days")
+        x = returns[self.symbols].to_numpy(dtype=float)
+        k = len(x)
+        if k == 0:
+            return self
+        if k >= self.count:
+            self.__init__(self.symbols)
+            return self
+        n = self.count
+        mean = (n * self.mean - x.sum(axis=0)) / (n - k)
+        centred = x - self.mean
+        shift = mean - self.mean
+        cov = (n * self.cov.astype(float) - centred.T @ centred) / (n - k) - np.outer(shift, shift)
+        self.fourth = max((n * self.fourth - np.square(np.square(centred).sum(axis=1)).sum()) / (n - k), 0.0)
+        self.weight_sq = 1 / (n - k)
+        self.mean = mean
+        self.cov = cov.astype(np.float32)
+        self.count = n - k
+        self.first_date = first_date
+        return self
+
+    def shrinkage_intensity(self):
+        """Ledoit-Wolf (2004) weight on the scaled-identity target"""
+        if self.count < 2:
+            return 0.0
+        cov = self.cov.astype(float)
+        n_assets = len(cov)
+        target = np.trace(cov) / n_assets
+        delta = (np.square(cov).sum() - 2 * target * np.trace(cov) + target ** 2 * n_assets) / n_assets
+        if delta <= 0:
+            return 0.0
+        beta = max(self.fourth - np.square(cov).sum(), 0.0) * self.weight_sq / n_assets
+        return min(beta, delta) / delta
+
+    def covariance(self, shrink=False):
+        """Covariance as a float64 array, scaled to the unbiased estimate like np.cov"""
+        cov = self.cov.astype(float)
+        if shrink:
+            intensity = self.shrinkage_intensity()
+            cov = (1 - intensity) * cov + intensity * np.trace(cov) / len(cov) * np.eye(len(cov))
+        if self.weight_sq < 1:
+            cov /= 1 - self.weight_sq
+        return cov
+
+    def correlation(self, shrink=False):
+        """Correlation frame (float32); zero-variance symbols give NaN like DataFrame.corr"""
+        cov = self.covariance(shrink)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        np.fill_diagonal(corr, np.where(std > 0, 1.0, np.nan))
+        return pd.DataFrame(corr.astype(np.float32), index=self.symbols, columns=self.symbols)
+
+    def subset(self, symbols):
+        """Estimate restricted to symbols, in that order"""
+        idx = [self.symbols.index(s) for s in symbols]
+        return CovarianceEstimate(symbols, self.halflife, self.mean[idx], self.cov[np.ix_(idx, idx)], self.count,
+                                  self.weight_sq, self.fourth, self.first_date, self.last_date)
+
+    @classmethod
+    def from_row(cls, row):
+        symbols, halflife, first_date, last_date, count, weight_sq, fourth, mean, cov = row
+        symbols = json.loads(symbols)
+        n = len(symbols)
+        return cls(symbols, halflife, np.frombuffer(mean, dtype=np.float64),
+                   np.frombuffer(cov, dtype=np.float32).reshape(n, n), count, weight_sq, fourth,
+                   first_date, last_date)
+
+    def to_row(self):
+        """Values in covariance table column order"""
+        return (json.dumps(self.symbols), self.halflife, self.first_date, self.last_date, self.count,
+                self.weight_sq, self.fourth, self.mean.astype(np.float64).tobytes(), self.cov.tobytes())
@@ -0,0 +1,83 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class ConnectionManager:
+    """Small pool of reusable SQLite connections shared by all threads.
+
+    Connections are opened lazily, switched to WAL journaling so readers do
+    not block the writer, and tuned with the pragmas below. connection() is a
+    context manager that checks a connection out of the pool, commits on
+    success, rolls back on error and returns it afterwards. Nested uses on the
+    same thread share one connection and one transaction, and idle
+    connections outlive the (often short-lived) request threads that used them.
+    """
+
+    PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'temp_store': 'MEMORY',
+        'cache_size': -16000,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000
+    }
+
+    def __init__(self, db_name, pool_size=8, **pragmas):
+        self.db_name = db_name
+        self.pragmas = {**self.PRAGMAS, **pragmas}
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+        self._pid = os.getpid()
+
+    def _connect(self):
+        # Pooled connections move between threads, but only one thread uses each at a time
+        conn = sqlite3.connect(self.db_name, timeout=self.pragmas['busy_timeout'] / 1000, check_same_thread=False)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name}={value}')
+        return conn
+
+    def _checkout(self):
+        # A forked worker must not reuse its parent's connections
+        if os.getpid() != self._pid:
+            self._idle = queue.LifoQueue(maxsize=self._idle.maxsize)
+            self._pid = os.getpid()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _checkin(self, conn):
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self):
+        """Yield a pooled connection inside a transaction"""
+        local = self._local
+        if getattr(local, 'conn', None) is not None:
+            yield local.conn
+            return
+        conn = local.conn = self._checkout()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            local.conn = None
+            self._checkin(conn)
+
+    def close_all(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
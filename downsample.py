@@ -0,0 +1,69 @@
+import numpy as np
+
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+
+
+def minmax_indices(values, n_out):
+    """Positions of the minimum and maximum in each of about (n_out - 2) / 2 equal buckets.
+
+    Every local extreme at bucket resolution survives, so peaks and the
+    bottom of each drawdown are drawn exactly; the first and last points
+    are always kept.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n <= n_out:
+        return np.arange(n)
+    # Equal buckets of `size` points as rows of a padded matrix, so argmin/argmax run in one pass
+    size = -(-n // max(1, (n_out - 2) // 2))
+    n_buckets = -(-n // size)
+    low = np.full(n_buckets * size, np.inf)
+    high = np.full(n_buckets * size, -np.inf)
+    low[:n] = high[:n] = values
+    offsets = np.arange(n_buckets) * size
+    picks = np.concatenate([[0, n - 1], offsets + low.reshape(n_buckets, size).argmin(axis=1),
+                            offsets + high.reshape(n_buckets, size).argmax(axis=1)])
+    return np.unique(picks)
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets (Steinarsson, 2013) point selection.
+
+    Keeps the first and last points and, from each of n_out - 2 buckets,
+    the point forming the largest triangle with the previously kept point
+    and the mean of the next bucket.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    # Bucket i spans edges[i]:edges[i + 1]; the last edge is the final point
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    picks = np.empty(n_out, dtype=int)
+    picks[0], picks[-1] = 0, n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = x[end:next_end].mean()
+        next_y = y[end:next_end].mean()
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                      (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        picks[i + 1] = previous
+    return picks
+
+
+def downsample(series, max_points=2000, method='minmax'):
+    """At most about max_points points of a Series, chosen to keep its visual shape"""
+    if len(series) <= max_points:
+        return series
+    if method == 'minmax':
+        idx = minmax_indices(series.to_numpy(), max_points)
+    elif method == 'lttb':
+        x = series.index.asi8 if hasattr(series.index, 'asi8') else np.arange(len(series))
+        idx = lttb_indices(x, series.to_numpy(), max_points)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method} (expected one of {DOWNSAMPLE_METHODS})")
+    return series.iloc[idx]
@@ -0,0 +1,113 @@
+import os
+import pandas as pd
+from schema import dates_to_ints
+
+HOLDING_COLUMNS = ['symbol', 'quantity', 'purchase_price', 'purchase_date', 'asset_class']
+OPTIONAL_COLUMNS = ['portfolio_id']
+DEFAULT_PORTFOLIO = 'default'
+
+
+def iter_holding_chunks(source, chunk_size=10000):
+    """Yield DataFrames of at most chunk_size holdings from a file path or an iterable.
+
+    Paths ending in .parquet/.pq are read batch by batch with pyarrow, other
+    paths as CSV. An iterable may yield tuples in HOLDING_COLUMNS order
+    (optionally followed by a portfolio_id) or dicts keyed by column name.
+    Files and frames missing a required column, and tuples with the wrong
+    number of fields, raise ValueError before anything is yielded for them.
+    """
+    wanted = HOLDING_COLUMNS + OPTIONAL_COLUMNS
+    if isinstance(source, (str, os.PathLike)):
+        ext = os.path.splitext(str(source))[1].lower()
+        if ext in ('.parquet', '.pq'):
+            import pyarrow.parquet as pq
+            parquet = pq.ParquetFile(source)
+            check_columns(parquet.schema_arrow.names)
+            columns = [c for c in parquet.schema_arrow.names if c in wanted]
+            for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns):
+                yield batch.to_pandas()
+        else:
+            check_columns(pd.read_csv(source, nrows=0).columns)
+            yield from pd.read_csv(source, usecols=lambda c: c in wanted, chunksize=chunk_size)
+        return
+    if isinstance(source, pd.DataFrame):
+        check_columns(source.columns)
+        for start in range(0, len(source), chunk_size):
+            yield source.iloc[start:start + chunk_size]
+        return
+
+    batch = []
+    first_row = 1
+    for row in source:
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            yield _rows_to_frame(batch, first_row)
+            first_row += len(batch)
+            batch = []
+    if batch:
+        yield _rows_to_frame(batch, first_row)
+
+
+def check_columns(columns):
+    """Raise ValueError if any of HOLDING_COLUMNS is missing from columns"""
+    present = set(columns)
+    missing = [c for c in HOLDING_COLUMNS if c not in present]
+    if missing:
+        raise ValueError(f"Holdings are missing required column(s): {', '.join(missing)} "
+                         f"(expected {', '.join(HOLDING_COLUMNS)})")
+
+
+def _rows_to_frame(rows, first_row=1):
+    # first_row is the input row number of rows[0]; dicts may lack keys, which then fail validation
+    columns = HOLDING_COLUMNS + OPTIONAL_COLUMNS
+    widths = (len(HOLDING_COLUMNS), len(columns))
+    records = []
+    for number, row in enumerate(rows, first_row):
+        if isinstance(row, dict):
+            records.append(tuple(row.get(c) for c in columns))
+        elif len(row) in widths:
+            records.append(tuple(row) + (None,) * (len(columns) - len(row)))
+        else:
+            raise ValueError(f"Invalid holding at row {number}: expected {widths[0]} or {widths[1]} fields "
+                             f"({', '.join(columns)}), got {len(row)}")
+    return pd.DataFrame.from_records(records, columns=columns)
+
+
+def validate_holdings(chunk, portfolio_id=DEFAULT_PORTFOLIO):
+    """Normalise a chunk of holdings; returns (valid rows, invalid rows with a reason column).
+
+    Both frames are indexed by row position within the chunk. Rows without a
+    portfolio_id are assigned to portfolio_id. A chunk missing a required
+    column raises ValueError.
+    """
+    check_columns(chunk.columns)
+    chunk = chunk.reset_index(drop=True)
+    if 'portfolio_id' in chunk:
+        portfolio_ids = chunk['portfolio_id'].astype('string').str.strip().fillna(portfolio_id)
+    else:
+        portfolio_ids = pd.Series(portfolio_id, index=chunk.index, dtype='string')
+    clean = pd.DataFrame({
+        'symbol': chunk['symbol'].astype('string').str.strip().str.upper(),
+        'quantity': pd.to_numeric(chunk['quantity'], errors='coerce'),
+        'purchase_price': pd.to_numeric(chunk['purchase_price'], errors='coerce'),
+        'purchase_date': pd.to_datetime(chunk['purchase_date'], errors='coerce', format='mixed'),
+        'asset_class': chunk['asset_class'].astype('string').str.strip(),
+        'portfolio_id': portfolio_ids
+    })
+    reasons = pd.Series('', index=clean.index)
+    checks = [
+        (clean['symbol'].fillna('') == '', 'missing symbol'),
+        (~(clean['quantity'] > 0), 'quantity must be positive'),
+        (~(clean['purchase_price'] >= 0), 'purchase_price must be non-negative'),
+        (clean['purchase_date'].isna(), 'invalid purchase_date'),
+        (clean['asset_class'].fillna('') == '', 'missing asset_class'),
+        (clean['portfolio_id'] == '', 'empty portfolio_id')
+    ]
+    for mask, reason in checks:
+        reasons = reasons.mask(mask & (reasons == ''), reason)
+
+    bad = reasons != ''
+    invalid = chunk[bad.values].assign(reason=reasons[bad].values)
+    valid = clean[~bad].copy()
+    valid['purchase_date'] = dates_to_ints(valid['purchase_date'])
+    return valid, invalid
@@ -0,0 +1,146 @@
+import os
+import zlib
+import numpy as np
+import pandas as pd
+from price_store import period_start
+
+UNKNOWN_PROFILE = {'sector': 'Unknown', 'industry': 'Unknown', 'market_cap': 0}
+
+
+class MarketDataProvider:
+    """Source of daily closing prices and security profiles for the analyzer"""
+
+    def get_prices(self, symbols, start=None, period=None):
+        """Return a date x symbol frame of closes from start, or over period"""
+        raise NotImplementedError
+
+    def get_profile(self, symbol):
+        """Return {'sector', 'industry', 'market_cap'} for a symbol"""
+        return dict(UNKNOWN_PROFILE)
+
+    def as_of(self):
+        """Reference date for period windows; None means today"""
+        return None
+
+    def _window(self, prices, start=None, period=None):
+        if start is None and period is not None:
+            start = period_start(period, self.as_of())
+        if start is not None:
+            prices = prices[prices.index >= pd.Timestamp(start)]
+        return prices
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live prices and profiles from Yahoo Finance"""
+
+    def get_prices(self, symbols, start=None, period=None):
+        import yfinance as yf
+        if start is not None:
+            prices = yf.download(symbols, start=start, progress=False)['Close']
+        else:
+            prices = yf.download(symbols, period=period or '1y', progress=False)['Close']
+        if isinstance(prices, pd.Series):
+            prices = prices.to_frame(symbols[0])
+        return prices
+
+    def get_profile(self, symbol):
+        import yfinance as yf
+        try:
+            info = yf.Ticker(symbol).info
+        except Exception as e:
+            print(f"Error fetching profile for {symbol}: {e}")
+            return dict(UNKNOWN_PROFILE)
+        return {
+            'sector': info.get('sector') or ('ETF' if info.get('quoteType') == 'ETF' else 'Unknown'),
+            'industry': info.get('industry') or 'Unknown',
+            'market_cap': float(info.get('marketCap') or 0)
+        }
+
+
+class ReplayProvider(MarketDataProvider):
+    """Replays closes from a CSV or Parquet file for offline, repeatable runs.
+
+    The price file is either wide (a date column followed by one column per
+    symbol) or long (date, symbol, close columns). An optional profile file
+    has symbol, sector, industry and market_cap columns.
+    """
+
+    def __init__(self, prices_path, profiles_path=None):
+        self.prices = self._read_prices(prices_path)
+        self.profiles = {}
+        if profiles_path:
+            profiles = _read_table(profiles_path)
+            self.profiles = profiles.set_index('symbol')[['sector', 'industry', 'market_cap']].to_dict('index')
+
+    def _read_prices(self, path):
+        table = _read_table(path)
+        if {'symbol', 'close'} <= set(table.columns):
+            date_col = next(c for c in table.columns if str(c).lower() == 'date')
+            prices = table.pivot(index=date_col, columns='symbol', values='close')
+        else:
+            prices = table.set_index(table.columns[0])
+        prices.index = pd.to_datetime(prices.index)
+        prices.index.name = 'Date'
+        prices.columns.name = None
+        return prices.sort_index()
+
+    def as_of(self):
+        return self.prices.index.max()
+
+    def get_prices(self, symbols, start=None, period=None):
+        available = [s for s in symbols if s in self.prices.columns]
+        return self._window(self.prices[available], start, period)
+
+    def get_profile(self, symbol):
+        return dict(self.profiles.get(symbol, UNKNOWN_PROFILE))
+
+
+class SyntheticProvider(MarketDataProvider):
+    """Deterministic random-walk prices for any number of symbols and days.
+
+    Each symbol's path is seeded from its name, so a symbol gets the same
+    history regardless of which other symbols are requested with it.
+    """
+
+    SECTORS = ['Technology', 'Healthcare', 'Financials', 'Energy', 'Industrials',
+               'Consumer', 'Utilities', 'Materials', 'Real Estate', 'Communication']
+
+    def __init__(self, n_days=252, seed=0, end='2024-12-31', annual_vol=0.25):
+        self.n_days = n_days
+        self.seed = seed
+        self.end = pd.Timestamp(end)
+        self.daily_vol = annual_vol / np.sqrt(252)
+        self.dates = pd.bdate_range(end=self.end, periods=n_days)
+
+    @staticmethod
+    def symbols(n_symbols):
+        """Generate n_symbols ticker names"""
+        return [f'SYM{i:05d}' for i in range(n_symbols)]
+
+    def _rng(self, symbol):
+        return np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+
+    def as_of(self):
+        return self.end
+
+    def get_prices(self, symbols, start=None, period=None):
+        paths = np.empty((self.n_days, len(symbols)))
+        for i, symbol in enumerate(symbols):
+            rng = self._rng(symbol)
+            start_price = rng.uniform(10, 500)
+            drift = rng.normal(0.0003, 0.0002)
+            paths[:, i] = start_price * np.exp(np.cumsum(rng.normal(drift, self.daily_vol, self.n_days)))
+        prices = pd.DataFrame(paths, index=self.dates, columns=list(symbols))
+        return self._window(prices, start, period)
+
+    def get_profile(self, symbol):
+        rng = self._rng(symbol)
+        sector = self.SECTORS[zlib.crc32(symbol.encode()) % len(self.SECTORS)]
+        return {'sector': sector, 'industry': 'Synthetic', 'market_cap': float(rng.uniform(1e8, 1e12))}
+
+
+def _read_table(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.parquet', '.pq'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+HOLDINGS_HEADER = ['Symbol', 'Quantity', 'Current Price', 'Value', 'Weight', 'P&L', 'P&L %']
+COLUMN_WIDTHS = [70, 65, 80, 95, 55, 95, 55]
+ROW_HEIGHT = 16
+MARGIN = 72
+
+TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 9),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+
+def _money(values):
+    # '$1,234.56' / '$-1,234.56' like f"${x:,.2f}", one column at a time
+    return '$' + pd.Series(values).map('{:,.2f}'.format)
+
+
+def format_holdings(chunk):
+    """Holdings table cells for a chunk of portfolio_df, formatted column by column"""
+    columns = [
+        chunk['symbol'].astype(str).to_numpy(),
+        np.char.mod('%.0f', chunk['quantity'].to_numpy(dtype=float)),
+        np.char.add('$', np.char.mod('%.2f', chunk['current_price'].to_numpy(dtype=float))),
+        _money(chunk['current_value'].to_numpy(dtype=float)).to_numpy(),
+        np.char.add(np.char.mod('%.1f', chunk['weight'].to_numpy(dtype=float)), '%'),
+        _money(chunk['pnl'].to_numpy(dtype=float)).to_numpy(),
+        np.char.add(np.char.mod('%+.1f', chunk['pnl_pct'].to_numpy(dtype=float)), '%')
+    ]
+    return np.column_stack(columns).tolist()
+
+
+def iter_table_pages(portfolio_df, first_page_rows, rows_per_page, chunk_size=5000):
+    """Yield lists of formatted rows, one list per page, formatting chunk_size rows at a time"""
+    page, capacity = [], first_page_rows
+    for start in range(0, len(portfolio_df), chunk_size):
+        for row in format_holdings(portfolio_df.iloc[start:start + chunk_size]):
+            page.append(row)
+            if len(page) == capacity:
+                yield page
+                page, capacity = [], rows_per_page
+    if page:
+        yield page
+
+
+class PDFReportWriter:
+    """Writes the risk report page by page straight onto a ReportLab canvas.
+
+    Only one page of table rows exists as flowables at a time, and each page
+    is a fixed-size Table with the header repeated, so nothing is measured
+    or split across the whole holdings list. output is a path or a binary
+    file object such as BytesIO.
+    """
+
+    def __init__(self, output, pagesize=letter, chunk_size=5000):
+        self.canvas = canvas.Canvas(output, pagesize=pagesize)
+        self.width, self.height = pagesize
+        self.chunk_size = chunk_size
+        self.styles = getSampleStyleSheet()
+        self.y = self.height - MARGIN
+        self.pages = 0
+
+    def _flow(self, flowable, space_after=12):
+        # Draw a paragraph at the cursor, starting a new page when it does not fit
+        _, h = flowable.wrap(self.width - 2 * MARGIN, self.height)
+        if self.y - h < MARGIN:
+            self._new_page()
+        flowable.drawOn(self.canvas, MARGIN, self.y - h)
+        self.y -= h + space_after
+
+    def _new_page(self):
+        self.canvas.showPage()
+        self.pages += 1
+        self.y = self.height - MARGIN
+
+    def _rows_left(self):
+        return max(int((self.y - MARGIN) // ROW_HEIGHT) - 1, 0)
+
+    def write(self, metrics, alerts):
+        styles = self.styles
+        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'],
+                                     fontSize=18, spaceAfter=30, textColor=colors.darkblue)
+        self._flow(Paragraph("Portfolio Risk Analytics Report", title_style), 30)
+
+        # Executive Summary
+        self._flow(Paragraph("Executive Summary", styles['Heading2']), 6)
+        portfolio_df = metrics['portfolio_df']
+        total_pnl = portfolio_df['pnl'].sum()
+        cost_basis = portfolio_df['cost_basis'].sum()
+        total_pnl_pct = (total_pnl / cost_basis) * 100 if cost_basis > 0 else 0
+        summary_text = f"""
+        <b>Portfolio Value:</b> ${metrics['total_value']:,.2f}<br/>
+        <b>Total P&L:</b> ${total_pnl:,.2f} ({total_pnl_pct:+.2f}%)<br/>
+        <b>Portfolio Volatility:</b> {metrics['portfolio_volatility']:.2%}<br/>
+        <b>95% VaR:</b> {metrics['portfolio_var_95']:.2%}<br/>
+        <b>Sharpe Ratio:</b> {metrics['sharpe_ratio']:.2f}<br/>
+        <b>Max Drawdown:</b> {metrics['max_drawdown']:.2%}
+        """
+        self._flow(Paragraph(summary_text, styles['Normal']))
+
+        # Risk Alerts
+        if alerts:
+            self._flow(Paragraph("Risk Alerts", styles['Heading2']), 6)
+            for alert in alerts:
+                message = alert['message'] if isinstance(alert, dict) else str(alert)
+                self._flow(Paragraph(f"• {message}", styles['Normal']), 2)
+            self.y -= 10
+
+        # Holdings Table, one fixed-size table per page
+        self._flow(Paragraph("Current Holdings", styles['Heading2']), 6)
+        if self._rows_left() < 1:
+            self._new_page()
+        rows_per_page = int((self.height - 2 * MARGIN) // ROW_HEIGHT) - 1
+        for i, rows in enumerate(iter_table_pages(portfolio_df, self._rows_left(), rows_per_page, self.chunk_size)):
+            if i:
+                self._new_page()
+            table = Table([HOLDINGS_HEADER] + rows, colWidths=COLUMN_WIDTHS, rowHeights=ROW_HEIGHT)
+            table.setStyle(TABLE_STYLE)
+            _, h = table.wrapOn(self.canvas, self.width, self.height)
+            table.drawOn(self.canvas, (self.width - sum(COLUMN_WIDTHS)) / 2, self.y - h)
+            self.y -= h
+
+        self.canvas.showPage()
+        self.pages += 1
+        self.canvas.save()
+        return self.pages
+
+
+def write_pdf_report(output, metrics, alerts, chunk_size=5000):
+    """Write the risk report PDF to a path or file object; returns the page count"""
+    return PDFReportWriter(output, chunk_size=chunk_size).write(metrics, alerts)
@@ -1,166 +1,549 @@
+import hashlib
 import os
-import io
-import base64
-import sqlite3
-from datetime import datetime
+import time
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
 import warnings
 warnings.filterwarnings('ignore')
+from db import ConnectionManager
+from schema import migrate, bump_data_version, data_version, date_to_int, int_to_date, iso_date_sql
+from price_store import PriceStore, period_start, sync_prices
+from market_data import YFinanceProvider
+from holdings_io import DEFAULT_PORTFOLIO, iter_holding_chunks, validate_holdings
+from streaming_risk import PortfolioRiskState
+from var_engine import portfolio_var, var_cvar_report
+from batch_risk import batch_risk_metrics, weight_matrix
+from covariance import COV_METHODS, CovarianceEstimate
+from compliance import BREACH_COLUMNS, ComplianceRules, breach_alerts
+import charts
+from chart_cache import ChartCache
+from downsample import downsample
+
+# What the risk numbers of each metrics mode are computed over, reported with them under 'basis'
+FULL_BASIS = "today's weights over the trailing year of daily returns"
+INCREMENTAL_BASIS = "the recorded daily book value (today's quantities) since performance history began"
 
 class WebPortfolioRiskAnalyzer:
-    def __init__(self, db_name='portfolio.db'):
+    def __init__(self, db_name='portfolio.db', provider=None, price_store=None, refresh_interval=3600,
+                 chart_cache=None, price_dtype=np.float64):
         self.db_name = db_name
+        self.db = ConnectionManager(db_name)
+        self.provider = provider or YFinanceProvider()
+        # Prices are cached locally; only the tail since the last stored bar is downloaded
+        self.price_store = price_store or PriceStore(os.path.splitext(db_name)[0] + '_prices.db')
+        self.refresh_interval = refresh_interval
+        # Risk math reads closes from the store's memory-mapped matrix; float32 halves its size
+        self.price_dtype = price_dtype
+        # Rendered charts keyed by a hash of their inputs, so unchanged charts are not redrawn
+        self.chart_cache = chart_cache or ChartCache(os.path.splitext(db_name)[0] + '_charts')
+        # (data_version, ComplianceRules), recompiled only after the limits change
+        self._compliance = None
         self.setup_database()
 
     def setup_database(self):
-        """Create database tables for portfolio tracking"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS holdings (
-                id INTEGER PRIMARY KEY,
-                symbol TEXT NOT NULL,
-                quantity REAL NOT NULL,
-                purchase_price REAL NOT NULL,
-                purchase_date TEXT NOT NULL,
-                asset_class TEXT NOT NULL
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS risk_limits (
-                id INTEGER PRIMARY KEY,
-                metric TEXT NOT NULL,
-                limit_value REAL NOT NULL,
-                alert_threshold REAL NOT NULL
-            )
-        ''')
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS performance_history (
-                id INTEGER PRIMARY KEY,
-                date TEXT NOT NULL,
-                total_value REAL NOT NULL,
-                daily_return REAL NOT NULL
-            )
-        ''')
-        conn.commit()
-        conn.close()
-
-    def add_holding(self, symbol, quantity, purchase_price, purchase_date, asset_class):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO holdings (symbol, quantity, purchase_price, purchase_date, asset_class)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (symbol, quantity, purchase_price, purchase_date, asset_class))
-        conn.commit()
-        conn.close()
-
-    def set_risk_limits(self, max_portfolio_var=0.05, max_individual_weight=0.15, max_sector_concentration=0.30):
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM risk_limits')
-        limits = [
-            ('portfolio_var_95', max_portfolio_var, max_portfolio_var * 0.8),
-            ('individual_weight', max_individual_weight, max_individual_weight * 0.9),
-            ('sector_concentration', max_sector_concentration, max_sector_concentration * 0.9)
-        ]
-        cursor.executemany('INSERT INTO risk_limits VALUES (NULL, ?, ?, ?)', limits)
-        conn.commit()
-        conn.close()
+        """Create or upgrade the portfolio tables to the current schema version"""
+        with self.db.connection() as conn:
+            migrate(conn)
+
+    def add_holding(self, symbol, quantity, purchase_price, purchase_date, asset_class,
+                    portfolio_id=DEFAULT_PORTFOLIO):
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO holdings (symbol, quantity, purchase_price, purchase_date, asset_class, portfolio_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (symbol, quantity, purchase_price, date_to_int(purchase_date), asset_class, portfolio_id))
+            bump_data_version(conn)
+
+    def add_holdings_bulk(self, rows, chunk_size=10000, on_error='raise', portfolio_id=DEFAULT_PORTFOLIO):
+        """Insert many holdings in one transaction, chunk by chunk with executemany.
 
-    def get_current_portfolio(self):
-        conn = sqlite3.connect(self.db_name)
-        df = pd.read_sql_query('SELECT * FROM holdings', conn)
-        conn.close()
-        return df
+        rows may be an iterable of tuples/dicts, a DataFrame or a CSV/Parquet
+        path. Invalid rows raise ValueError and roll back the whole import, or
+        are skipped when on_error='skip'. A source missing a required column
+        or a tuple with the wrong number of fields always raises. Rows without
+        their own portfolio_id go to portfolio_id. Returns the row counts,
+        the (row number, reason) of every skipped row, elapsed seconds and
+        rows per second.
+        """
+        start = time.perf_counter()
+        inserted = rejected = 0
+        errors = []
+        with self.db.connection() as conn:
+            for chunk in iter_holding_chunks(rows, chunk_size):
+                offset = inserted + rejected + 1
+                valid, invalid = validate_holdings(chunk, portfolio_id)
+                if len(invalid) and on_error == 'raise':
+                    first = invalid.iloc[0]
+                    values = ', '.join(f'{k}={v}' for k, v in first.drop('reason').items())
+                    raise ValueError(f"Invalid holding at row {offset + invalid.index[0]}: {first['reason']} ({values})")
+                conn.executemany('''
+                    INSERT INTO holdings (symbol, quantity, purchase_price, purchase_date, asset_class, portfolio_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', valid.itertuples(index=False, name=None))
+                inserted += len(valid)
+                rejected += len(invalid)
+                errors.extend(zip((offset + invalid.index).tolist(), invalid['reason'].tolist()))
+            bump_data_version(conn)
+        if rejected:
+            print(f"Skipped {rejected} invalid holding(s), first at row {errors[0][0]}: {errors[0][1]}")
+        seconds = time.perf_counter() - start
+        return {
+            'inserted': inserted,
+            'rejected': rejected,
+            'errors': errors,
+            'seconds': seconds,
+            'rows_per_second': inserted / seconds if seconds > 0 else 0
+        }
+
+    def import_holdings(self, path_or_iterable, chunk_size=10000, replace=False, on_error='raise',
+                        portfolio_id=None):
+        """Load a broker export into holdings, optionally replacing the current book.
+
+        With portfolio_id, replace only clears that portfolio and it becomes the
+        default for rows that do not name one.
+        """
+        with self.db.connection() as conn:
+            if replace and portfolio_id is not None:
+                conn.execute('DELETE FROM holdings WHERE portfolio_id = ?', (portfolio_id,))
+            elif replace:
+                conn.execute('DELETE FROM holdings')
+            return self.add_holdings_bulk(path_or_iterable, chunk_size=chunk_size, on_error=on_error,
+                                          portfolio_id=portfolio_id or DEFAULT_PORTFOLIO)
+
+    def set_risk_limits(self, max_portfolio_var=0.05, max_individual_weight=0.15, max_sector_concentration=0.30,
+                        max_asset_class_concentration=None):
+        """Replace every risk limit, overrides included, with these defaults; alerts start at 80-90% of each"""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM risk_limits')
+            limits = [
+                ('portfolio_var_95', max_portfolio_var, max_portfolio_var * 0.8),
+                ('individual_weight', max_individual_weight, max_individual_weight * 0.9),
+                ('sector_concentration', max_sector_concentration, max_sector_concentration * 0.9)
+            ]
+            if max_asset_class_concentration is not None:
+                limits.append(('asset_class_concentration', max_asset_class_concentration,
+                               max_asset_class_concentration * 0.9))
+            cursor.executemany('INSERT INTO risk_limits VALUES (NULL, ?, ?, ?)', limits)
+            bump_data_version(conn)
+
+    def set_risk_limit(self, metric, limit_value, alert_threshold=None):
+        """Add or replace one limit, e.g. 'individual_weight:TSLA' to override the cap for one key.
+
+        See compliance.ComplianceRules for the metric names. The alert
+        threshold defaults to 90% of the limit.
+        """
+        if alert_threshold is None:
+            alert_threshold = limit_value * 0.9
+        with self.db.connection() as conn:
+            conn.execute('INSERT OR REPLACE INTO risk_limits (metric, limit_value, alert_threshold) VALUES (?, ?, ?)',
+                         (metric, limit_value, alert_threshold))
+            bump_data_version(conn)
+
+    def data_version(self):
+        """Counter that changes whenever holdings or risk limits are written through the analyzer"""
+        with self.db.connection() as conn:
+            return data_version(conn)
+
+    def get_current_portfolio(self, portfolio_id=None):
+        """Holdings of one portfolio, or of every portfolio when portfolio_id is None"""
+        # Dates are stored as YYYYMMDD integers; SQLite formats them, so callers keep seeing ISO strings
+        query = f'''
+            SELECT id, symbol, quantity, purchase_price, {iso_date_sql('purchase_date')} AS purchase_date,
+                   asset_class, portfolio_id
+            FROM holdings
+        '''
+        with self.db.connection() as conn:
+            if portfolio_id is None:
+                return pd.read_sql_query(query, conn)
+            return pd.read_sql_query(query + ' WHERE portfolio_id = ?', conn, params=(portfolio_id,))
 
     def fetch_market_data(self, symbols, period='1y'):
         data = {}
         try:
-            price_data = yf.download(symbols, period=period)['Close']
+            as_of = self.provider.as_of()
+            sync_prices(self.price_store, self.provider.get_prices, symbols, period=period,
+                        refresh_interval=self.refresh_interval, as_of=as_of)
+            price_data = self.load_prices(symbols, period, dropna='all')
+            available = set(price_data.columns[price_data.notna().any()])
+            profiles = self.get_profiles(symbols)
             for symbol in symbols:
-                hist = price_data[symbol] if symbol in price_data else pd.Series([0])
+                hist = price_data[symbol] if symbol in available else pd.Series([0])
                 data[symbol] = {
                     'current_price': hist.iloc[-1] if not hist.empty else 0,
                     'price_history': hist,
-                    'sector': 'Technology' if symbol in ['AAPL', 'MSFT', 'GOOGL', 'TSLA'] else 'ETF',
-                    'industry': 'Unknown',
-                    'market_cap': 0
+                    'sector': profiles[symbol]['sector'],
+                    'industry': profiles[symbol]['industry'],
+                    'market_cap': profiles[symbol]['market_cap']
                 }
         except Exception as e:
             print(f"Error fetching data: {e}")
         return data
 
-    def calculate_portfolio_metrics(self):
-        holdings = self.get_current_portfolio()
+    def load_prices(self, symbols, period='1y', dropna='any'):
+        """Stored closes for symbols over period as a date x symbol frame over the shared price matrix.
+
+        With the default dropna='any' only dates where every symbol has a bar
+        are kept. The frame is a view of the memory-mapped matrix when the
+        symbols sit in adjacent columns and no date is dropped; otherwise only
+        the selected columns are copied.
+        """
+        start = period_start(period, self.provider.as_of())
+        return self.price_store.matrix(self.price_dtype).frame(symbols, start=start, dropna=dropna)
+
+    def get_profiles(self, symbols):
+        """Sector/industry/market cap per symbol, cached in the price store"""
+        profiles = self.price_store.load_profiles(symbols)
+        missing = {s: self.provider.get_profile(s) for s in symbols if s not in profiles}
+        if missing:
+            self.price_store.save_profiles(missing)
+            profiles.update(missing)
+        return profiles
+
+    def calculate_portfolio_metrics(self, incremental=False, var_method='percentile', var_window=252,
+                                    risk_models=(), mc_options=None, portfolio_id=None, cov_method=None,
+                                    shrinkage=False):
+        """Value the book (or one portfolio of it) and compute its risk metrics.
+
+        risk_models selects extra VaR/CVaR models ('historical', 'parametric',
+        'monte_carlo') reported under 'var_cvar' at 95% and 99%; mc_options
+        is passed to the Monte Carlo engine. Not available in incremental mode,
+        which tracks the whole book.
+
+        incremental=True measures something different from the default mode:
+        see calculate_incremental_metrics. Each result names its definition
+        under 'basis'.
+
+        cov_method ('sample' or 'ewma') serves the correlation matrix and the
+        covariance-based models from the cached estimate instead of
+        recomputing them from the returns; shrinkage applies Ledoit-Wolf.
+        """
+        if incremental and portfolio_id is not None:
+            raise ValueError("Incremental metrics track the whole book; use portfolio_id=None")
+        holdings = self.get_current_portfolio(portfolio_id)
         if holdings.empty:
             return None
+        if incremental:
+            return self.calculate_incremental_metrics(holdings, var_method, var_window)
 
         symbols = holdings['symbol'].unique().tolist()
         market_data = self.fetch_market_data(symbols)
 
-        portfolio_data = []
-        total_value = 0
-        for _, holding in holdings.iterrows():
-            symbol = holding['symbol']
-            current_price = market_data[symbol]['current_price']
-            current_value = holding['quantity'] * current_price
-            cost_basis = holding['quantity'] * holding['purchase_price']
-            pnl = current_value - cost_basis
-            pnl_pct = (pnl / cost_basis) * 100 if cost_basis > 0 else 0
-
-            portfolio_data.append({
-                'symbol': symbol,
-                'quantity': holding['quantity'],
-                'purchase_price': holding['purchase_price'],
-                'current_price': current_price,
-                'cost_basis': cost_basis,
-                'current_value': current_value,
-                'pnl': pnl,
-                'pnl_pct': pnl_pct,
-                'asset_class': holding['asset_class'],
-                'sector': market_data[symbol]['sector'],
-                'weight': 0
-            })
-            total_value += current_value
-
-        for item in portfolio_data:
-            item['weight'] = (item['current_value'] / total_value) * 100 if total_value > 0 else 0
-
-        portfolio_df = pd.DataFrame(portfolio_data)
-
-        # Risk calculations
-        price_data_df = pd.DataFrame({s: market_data[s]['price_history'] for s in symbols}).dropna()
+        portfolio_df, total_value = self.value_holdings(holdings, market_data)
+        positions_df = self.aggregate_positions(portfolio_df)
+
+        # Risk calculations run on one weight per symbol, aligned with the price columns
+        price_data_df = self.load_prices(symbols)
+        weights = positions_df.set_index('symbol')['weight'].reindex(price_data_df.columns).fillna(0) / 100
         if len(price_data_df) > 1:
             returns = price_data_df.pct_change().dropna()
-            weights = np.array([item['weight']/100 for item in portfolio_data])
-            portfolio_returns = (returns * weights).sum(axis=1)
+            portfolio_returns = (returns * weights.values).sum(axis=1)
             portfolio_volatility = portfolio_returns.std() * np.sqrt(252)
-            portfolio_var_95 = np.percentile(portfolio_returns, 5)
-            max_drawdown = self.calculate_max_drawdown(price_data_df, weights)
+            portfolio_var_95 = portfolio_var(portfolio_returns, var_method, window=var_window)
+            max_drawdown = self.calculate_max_drawdown(price_data_df, weights.values)
             sharpe_ratio = self.calculate_sharpe_ratio(portfolio_returns)
-            correlation_matrix = returns.corr()
+            if cov_method:
+                estimate = self.covariance_estimate(returns, cov_method)
+                correlation_matrix = estimate.correlation(shrinkage)
+                cov = estimate.covariance(shrinkage)
+            else:
+                correlation_matrix = returns.corr()
+                cov = None
+            var_cvar = var_cvar_report(returns, weights.values, risk_models, cov=cov, **(mc_options or {}))
         else:
             portfolio_volatility = portfolio_var_95 = max_drawdown = sharpe_ratio = 0
             correlation_matrix = pd.DataFrame()
+            var_cvar = {}
 
         return {
             'portfolio_df': portfolio_df,
+            'positions_df': positions_df,
+            'weights': weights,
             'total_value': total_value,
             'portfolio_volatility': portfolio_volatility,
             'portfolio_var_95': portfolio_var_95,
             'max_drawdown': max_drawdown,
             'sharpe_ratio': sharpe_ratio,
             'correlation_matrix': correlation_matrix,
-            'price_data': price_data_df
+            'price_data': price_data_df,
+            'var_cvar': var_cvar,
+            'basis': FULL_BASIS
         }
 
+    def covariance_estimate(self, returns, method='sample', halflife=63):
+        """Cached covariance of returns' columns, updated with only the days it has not seen.
+
+        The estimate lives in the price store, one per symbol set: a wider
+        estimate covers only the dates all of its symbols share, so it cannot
+        stand in for a narrower set. It is rebuilt from returns when nothing
+        is stored, when it starts after returns does, or when its last day
+        falls before the start of returns. 'sample' covers exactly the dates
+        in returns, like returns.cov(): days before the window are removed
+        with a downdate (their returns are recomputed from the stored prices).
+        'ewma' weights every day since the rebuild, decayed with the given
+        halflife in days.
+        """
+        if method not in COV_METHODS:
+            raise ValueError(f"Unknown covariance method: {method} (expected one of {COV_METHODS})")
+        halflife = halflife if method == 'ewma' else None
+        symbols = list(returns.columns)
+        key = hashlib.sha256(','.join(sorted(symbols)).encode()).hexdigest()[:16]
+        name = f'{method}:{halflife}:{key}' if halflife else f'{method}:{key}'
+        window_start = date_to_int(returns.index[0])
+        estimate = self.price_store.load_covariance(name)
+        if (estimate is not None and set(symbols) == set(estimate.symbols) and estimate.first_date <= window_start
+                and int_to_date(estimate.last_date) >= returns.index[0]):
+            new_returns = returns[returns.index > int_to_date(estimate.last_date)]
+            expired = halflife is None and estimate.first_date < window_start
+            if new_returns.empty and not expired:
+                return estimate.subset(symbols)
+            if expired:
+                estimate.downdate(self._returns_before(symbols, estimate.first_date, returns.index[0]),
+                                  first_date=window_start)
+        else:
+            estimate = None
+        if estimate is None:
+            estimate, new_returns = CovarianceEstimate(symbols, halflife), returns
+        estimate.update(new_returns)
+        self.price_store.save_covariance(name, estimate)
+        return estimate.subset(symbols)
+
+    def _returns_before(self, symbols, first_date, end):
+        # Daily returns from first_date (a YYYYMMDD int) up to end, computed the way
+        # calculate_portfolio_metrics does; the extra month supplies the day before first_date
+        start = int_to_date(first_date) - pd.DateOffset(months=1)
+        prices = self.price_store.matrix(self.price_dtype).frame(symbols, start=start)
+        returns = prices[prices.index < end].pct_change().dropna()
+        return returns[returns.index >= int_to_date(first_date)]
+
+    def calculate_batch_metrics(self, portfolio_ids=None):
+        """Risk metrics for many portfolios at once, indexed by portfolio_id.
+
+        Holdings and prices are loaded once for the union of symbols; the
+        per-portfolio weights form a P x N matrix that batch_risk_metrics
+        applies to the shared returns in a single pass. Each row matches
+        calculate_portfolio_metrics(portfolio_id=...) for that portfolio.
+        """
+        _, metrics = self._batch_valuation(portfolio_ids)
+        return metrics
+
+    def _batch_valuation(self, portfolio_ids=None):
+        # (lots valued with a portfolio_id column, per-portfolio metrics); empty frames without holdings
+        holdings = self.get_current_portfolio()
+        if portfolio_ids is not None:
+            holdings = holdings[holdings['portfolio_id'].isin(portfolio_ids)]
+        if holdings.empty:
+            return pd.DataFrame(), pd.DataFrame()
+
+        symbols = holdings['symbol'].unique().tolist()
+        market_data = self.fetch_market_data(symbols)
+        portfolio_df, _ = self.value_holdings(holdings, market_data)
+        portfolio_df['portfolio_id'] = holdings['portfolio_id'].values
+
+        # Every date any symbol has a bar; batch_risk_metrics narrows the dates per portfolio, so a
+        # short history in one account does not shorten the others
+        price_data_df = self.load_prices(symbols, dropna='all')
+        values = portfolio_df.pivot_table(index='portfolio_id', columns='symbol', values='current_value',
+                                          aggfunc='sum', fill_value=0)
+        values = values.reindex(columns=price_data_df.columns, fill_value=0)
+        held = portfolio_df.groupby(['portfolio_id', 'symbol']).size().unstack(fill_value=0) > 0
+        metrics = batch_risk_metrics(weight_matrix(values), price_data_df, held=held)
+        metrics.insert(0, 'total_value', portfolio_df.groupby('portfolio_id')['current_value'].sum(min_count=1))
+        return portfolio_df, metrics
+
+    def calculate_incremental_metrics(self, holdings, var_method='percentile', var_window=252):
+        """Metrics from the stored running state plus only the days since the last refresh.
+
+        These are not the full mode's numbers. The full mode applies today's
+        weights to the trailing year of prices; this mode tracks the book's
+        daily value in performance_history (today's quantities at each day's
+        close) since the first snapshot, so volatility, Sharpe and drawdown
+        cover every recorded day and diverge as history grows past a year.
+        The result's 'basis' says so. VaR comes from the stored P2 sketch for
+        var_method='streaming', otherwise from the last var_window daily
+        returns, so no price history is reloaded. price_data holds only the
+        newly processed days and correlation_matrix is empty; use the full
+        mode for charts.
+        """
+        price_data_df, _ = self._append_performance(holdings)
+        state = self.load_risk_state()
+        symbols = holdings['symbol'].unique().tolist()
+        current_prices = self.price_store.latest_prices(symbols)
+        profiles = self.get_profiles(symbols)
+        market_data = {s: {'current_price': current_prices.get(s, 0), 'sector': profiles[s]['sector']}
+                       for s in symbols}
+
+        portfolio_df, total_value = self.value_holdings(holdings, market_data)
+        positions_df = self.aggregate_positions(portfolio_df)
+        weights = positions_df.set_index('symbol')['weight'] / 100
+
+        risk = (state or PortfolioRiskState()).metrics()
+        if var_method == 'streaming':
+            var_95 = risk['var_95']
+        else:
+            with self.db.connection() as conn:
+                recent_returns = [r for (r,) in conn.execute(
+                    'SELECT daily_return FROM performance_history ORDER BY date DESC LIMIT ?', (var_window,))]
+            var_95 = portfolio_var(recent_returns, var_method, window=var_window) if len(recent_returns) > 1 else 0
+
+        return {
+            'portfolio_df': portfolio_df,
+            'positions_df': positions_df,
+            'weights': weights,
+            'total_value': total_value,
+            'portfolio_volatility': risk['volatility'],
+            'portfolio_var_95': var_95,
+            'max_drawdown': risk['max_drawdown'],
+            'sharpe_ratio': risk['sharpe_ratio'],
+            'correlation_matrix': pd.DataFrame(),
+            'price_data': price_data_df,
+            'var_cvar': {},
+            'basis': INCREMENTAL_BASIS
+        }
+
+    def load_risk_state(self):
+        """Streaming estimators saved by the last performance update, or None"""
+        with self.db.connection() as conn:
+            row = conn.execute('''
+                SELECT last_date, last_value, count, mean, m2, wealth, peak, max_drawdown, var_sketch
+                FROM risk_state WHERE id = 1
+            ''').fetchone()
+            if row is None:
+                return None
+            state = PortfolioRiskState.from_row(row)
+            if row[-1] is None and state.count:
+                # State saved before the VaR sketch existed: seed it once from the stored
+                # returns, skipping the backfill baseline row which carries no return
+                for (daily_return,) in conn.execute(
+                        'SELECT daily_return FROM performance_history ORDER BY date LIMIT -1 OFFSET 1'):
+                    state.var.update(daily_return)
+        return state
+
+    def update_intraday(self, prices):
+        """Refresh the risk numbers from a live price tick without reloading history.
+
+        prices maps symbol to its latest price; symbols without a tick use the
+        last stored close. The tick's return against the last snapshot is
+        applied to a copy of the stored state, so end-of-day history is untouched.
+        """
+        state = self.load_risk_state()
+        holdings = self.get_current_portfolio()
+        if state is None or holdings.empty:
+            return None
+        quantities = holdings.groupby('symbol', sort=False)['quantity'].sum()
+        latest = self.price_store.latest_prices(quantities.index.tolist())
+        current = pd.Series(prices, dtype=float).reindex(quantities.index).fillna(latest)
+        total_value = float((current * quantities).sum())
+        intraday_return = total_value / state.last_value - 1
+        provisional = state.copy()
+        provisional.update(intraday_return)
+        return {'total_value': total_value, 'intraday_return': intraday_return, **provisional.metrics()}
+
+    def update_performance_history(self, period='1y'):
+        """Daily snapshot job: append one performance_history row per new trading day.
+
+        The first run backfills the period; later runs value only the days
+        after the last snapshot. Returns the number of rows appended.
+        """
+        holdings = self.get_current_portfolio()
+        if holdings.empty:
+            return 0
+        _, appended = self._append_performance(holdings, period)
+        return appended
+
+    def _append_performance(self, holdings, period='1y'):
+        # Every day, including the last stored one, is valued with today's positions,
+        # so buying or selling does not show up as a return
+        quantities = holdings.groupby('symbol', sort=False)['quantity'].sum()
+        symbols = quantities.index.tolist()
+        as_of = self.provider.as_of()
+        sync_prices(self.price_store, self.provider.get_prices, symbols, period=period,
+                    refresh_interval=self.refresh_interval, as_of=as_of)
+        state = self.load_risk_state()
+        start = int_to_date(state.last_date) if state else period_start(period, as_of)
+        prices = self.price_store.matrix(self.price_dtype).frame(symbols, start=start)
+        values = pd.Series(prices.values @ quantities.values, index=prices.index)
+
+        rows = []
+        if state is None:
+            if values.empty:
+                return prices, 0
+            state = PortfolioRiskState()
+            rows.append((date_to_int(values.index[0]), float(values.iloc[0]), 0.0))
+            previous_value = values.iloc[0]
+            values = values.iloc[1:]
+        else:
+            last_date = int_to_date(state.last_date)
+            known = values[values.index <= last_date]
+            previous_value = known.iloc[-1] if len(known) else state.last_value
+            values = values[values.index > last_date]
+            prices = prices[prices.index > last_date]
+
+        for date, value in values.items():
+            daily_return = value / previous_value - 1
+            state.update(daily_return)
+            rows.append((date_to_int(date), float(value), float(daily_return)))
+            previous_value = value
+
+        if rows:
+            state.last_date, state.last_value = rows[-1][0], rows[-1][1]
+            with self.db.connection() as conn:
+                conn.executemany('INSERT OR REPLACE INTO performance_history (date, total_value, daily_return) '
+                                 'VALUES (?, ?, ?)', rows)
+                conn.execute('''
+                    INSERT OR REPLACE INTO risk_state
+                        (id, last_date, last_value, count, mean, m2, wealth, peak, max_drawdown, var_sketch)
+                    VALUES (1, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', state.to_row())
+        return prices, len(rows)
+
+    def value_holdings(self, holdings, market_data):
+        """Value every lot with whole-column operations; returns (portfolio_df, total_value)"""
+        symbols = holdings['symbol']
+        current_price = symbols.map({s: d['current_price'] for s, d in market_data.items()})
+        sector = symbols.map({s: d['sector'] for s, d in market_data.items()})
+        quantity = holdings['quantity']
+        cost_basis = quantity * holdings['purchase_price']
+        current_value = quantity * current_price
+        pnl = current_value - cost_basis
+
+        portfolio_df = pd.DataFrame({
+            'symbol': symbols,
+            'quantity': quantity,
+            'purchase_price': holdings['purchase_price'],
+            'current_price': current_price,
+            'cost_basis': cost_basis,
+            'current_value': current_value,
+            'pnl': pnl,
+            'pnl_pct': (pnl / cost_basis * 100).where(cost_basis > 0, 0),
+            'asset_class': holdings['asset_class'],
+            'sector': sector
+        }).reset_index(drop=True)
+
+        total_value = portfolio_df['current_value'].sum(skipna=False)
+        portfolio_df['weight'] = portfolio_df['current_value'] / total_value * 100 if total_value > 0 else 0
+        return portfolio_df, total_value
+
+    def aggregate_positions(self, portfolio_df):
+        """Collapse purchase lots into one position per symbol with quantity-weighted cost"""
+        positions_df = portfolio_df.groupby('symbol', sort=False).agg(
+            quantity=('quantity', 'sum'),
+            cost_basis=('cost_basis', 'sum'),
+            current_price=('current_price', 'first'),
+            current_value=('current_value', 'sum'),
+            asset_class=('asset_class', 'first'),
+            sector=('sector', 'first'),
+            weight=('weight', 'sum'),
+            lots=('symbol', 'size')
+        ).reset_index()
+        positions_df['purchase_price'] = positions_df['cost_basis'] / positions_df['quantity']
+        positions_df['pnl'] = positions_df['current_value'] - positions_df['cost_basis']
+        positions_df['pnl_pct'] = (positions_df['pnl'] / positions_df['cost_basis'] * 100).where(
+            positions_df['cost_basis'] > 0, 0)
+        return positions_df[['symbol', 'quantity', 'purchase_price', 'current_price', 'cost_basis',
+                             'current_value', 'pnl', 'pnl_pct', 'asset_class', 'sector', 'weight', 'lots']]
+
     def calculate_max_drawdown(self, price_data, weights):
         portfolio_values = (price_data * weights).sum(axis=1)
         running_max = portfolio_values.expanding().max()
@@ -172,239 +555,132 @@ class WebPortfolioRiskAnalyzer:
         volatility = returns.std() * np.sqrt(252)
         return excess_returns / volatility if volatility > 0 else 0
 
-    def check_risk_compliance(self, metrics):
-        conn = sqlite3.connect(self.db_name)
-        limits_df = pd.read_sql_query('SELECT * FROM risk_limits', conn)
-        conn.close()
-        alerts = []
-
-        for _, limit in limits_df.iterrows():
-            metric_name = limit['metric']
-            limit_value = limit['limit_value']
-            alert_threshold = limit['alert_threshold']
-
-            if metric_name == 'portfolio_var_95':
-                current_value = abs(metrics['portfolio_var_95'])
-                if current_value > limit_value:
-                    alerts.append({'type': 'danger', 'message': f"Portfolio VaR ({current_value:.2%}) exceeds limit ({limit_value:.2%})"})
-                elif current_value > alert_threshold:
-                    alerts.append({'type': 'warning', 'message': f"Portfolio VaR ({current_value:.2%}) approaching limit ({limit_value:.2%})"})
-            elif metric_name == 'individual_weight':
-                max_weight = metrics['portfolio_df']['weight'].max() / 100
-                if max_weight > limit_value:
-                    symbol = metrics['portfolio_df'].loc[metrics['portfolio_df']['weight'].idxmax(), 'symbol']
-                    alerts.append({'type': 'danger', 'message': f"{symbol} weight ({max_weight:.2%}) exceeds limit ({limit_value:.2%})"})
-                elif max_weight > alert_threshold:
-                    symbol = metrics['portfolio_df'].loc[metrics['portfolio_df']['weight'].idxmax(), 'symbol']
-                    alerts.append({'type': 'warning', 'message': f"{symbol} weight ({max_weight:.2%}) approaching limit ({limit_value:.2%})"})
-
-        return alerts
-
-    def create_web_visualizations(self, metrics):
-        """Create visualizations and save them to static folder"""
-        charts = {}
-        
-        # Ensure static directory exists
-        os.makedirs('static', exist_ok=True)
-        
-        # Set style for better web display
-        try:
-            plt.style.use('seaborn-v0_8-darkgrid')
-        except:
-            plt.style.use('default')
-        
-        # 1. Portfolio Allocation Pie Chart
-        fig, ax = plt.subplots(figsize=(10, 8))
-        portfolio_df = metrics['portfolio_df']
-        colors_palette = plt.cm.Set3(np.linspace(0, 1, len(portfolio_df)))
-        wedges, texts, autotexts = ax.pie(portfolio_df['current_value'], 
-                                         labels=portfolio_df['symbol'], 
-                                         autopct='%1.1f%%',
-                                         colors=colors_palette,
-                                         explode=[0.05]*len(portfolio_df))
-        ax.set_title('Portfolio Allocation by Holdings', fontsize=16, fontweight='bold', pad=20)
-        
-        # Make text more readable
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        plt.tight_layout()
-        plt.savefig('static/portfolio_allocation.png', dpi=300, bbox_inches='tight')
-        charts['allocation'] = 'static/portfolio_allocation.png'
-        plt.close()
-
-        # 2. Sector Allocation
-        fig, ax = plt.subplots(figsize=(10, 8))
+    def compliance_rules(self):
+        """The stored risk limits compiled for the compliance engine"""
+        version = self.data_version()
+        if self._compliance is None or self._compliance[0] != version:
+            with self.db.connection() as conn:
+                limits_df = pd.read_sql_query('SELECT metric, limit_value, alert_threshold FROM risk_limits', conn)
+            self._compliance = (version, ComplianceRules(limits_df))
+        return self._compliance[1]
+
+    def check_risk_compliance(self, metrics, portfolio_id=None):
+        """Every limit breach or near-breach in a metrics dict, as {'type', 'message', ...} alerts.
+
+        portfolio_id selects portfolio-specific VaR overrides, if any.
+        """
+        positions_df = metrics['positions_df']
+        exposures = pd.DataFrame({
+            'portfolio_id': portfolio_id,
+            'symbol': positions_df['symbol'],
+            'sector': positions_df['sector'],
+            'asset_class': positions_df['asset_class'],
+            'weight': positions_df['weight'] / 100
+        })
+        portfolio_values = pd.DataFrame({'portfolio_var_95': [metrics['portfolio_var_95']]},
+                                        index=pd.Index([portfolio_id], dtype=object))
+        return breach_alerts(self.compliance_rules().evaluate(exposures, portfolio_values))
+
+    def check_batch_compliance(self, portfolio_ids=None):
+        """Every breach across many portfolios as one DataFrame (see ComplianceRules.evaluate).
+
+        Weights are taken within each portfolio and VaR comes from
+        calculate_batch_metrics, so thousands of accounts are checked in a
+        single grouped pass per rule.
+        """
+        portfolio_df, metrics = self._batch_valuation(portfolio_ids)
+        if portfolio_df.empty:
+            return pd.DataFrame(columns=BREACH_COLUMNS)
+        exposures = portfolio_df[['portfolio_id', 'symbol', 'sector', 'asset_class']].assign(
+            weight=portfolio_df['current_value'] / portfolio_df.groupby('portfolio_id')['current_value'].transform('sum'))
+        return self.compliance_rules().evaluate(exposures, metrics)
+
+    def performance_series(self, metrics, max_points=2000, method='minmax'):
+        """Cumulative portfolio return in percent over the loaded price history.
+
+        Longer histories are downsampled to about max_points points (None keeps
+        them all); the default min/max per bucket keeps every peak and trough.
+        """
+        portfolio_performance = (metrics['price_data'] * metrics['weights'].values).sum(axis=1)
+        portfolio_performance = (portfolio_performance / portfolio_performance.iloc[0] - 1) * 100
+        return downsample(portfolio_performance, max_points, method) if max_points else portfolio_performance
+
+    def chart_tasks(self, metrics, figsizes=None, dpi=300, style='seaborn-v0_8-darkgrid'):
+        """The dashboard charts as independent (name, renderer, kwargs) tasks over plain arrays"""
+        figsizes = {'allocation': (10, 8), 'sector': (10, 8), 'performance': (12, 6), 'risk_metrics': (10, 6),
+                    'correlation': (10, 8), **(figsizes or {})}
+        common = {'dpi': dpi, 'style': style}
+        portfolio_df = metrics['positions_df']
         sector_allocation = portfolio_df.groupby('sector')['current_value'].sum()
-        colors_palette = plt.cm.Pastel1(np.linspace(0, 1, len(sector_allocation)))
-        wedges, texts, autotexts = ax.pie(sector_allocation.values, 
-                                         labels=sector_allocation.index, 
-                                         autopct='%1.1f%%',
-                                         colors=colors_palette)
-        ax.set_title('Sector Allocation', fontsize=16, fontweight='bold', pad=20)
-        
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        plt.tight_layout()
-        plt.savefig('static/sector_allocation.png', dpi=300, bbox_inches='tight')
-        charts['sector'] = 'static/sector_allocation.png'
-        plt.close()
-
-        # 3. Performance Chart  
+        tasks = [
+            ('allocation', charts.pie_chart, dict(
+                labels=portfolio_df['symbol'].tolist(), values=portfolio_df['current_value'].to_numpy(),
+                title='Portfolio Allocation by Holdings', figsize=figsizes['allocation'], explode=0.05, **common)),
+            ('sector', charts.pie_chart, dict(
+                labels=sector_allocation.index.tolist(), values=sector_allocation.to_numpy(),
+                title='Sector Allocation', figsize=figsizes['sector'], cmap='Pastel1', **common))
+        ]
         if not metrics['price_data'].empty:
-            fig, ax = plt.subplots(figsize=(12, 6))
-            price_data = metrics['price_data']
-            weights = portfolio_df['weight'].values / 100
-            portfolio_performance = (price_data * weights).sum(axis=1)
-            portfolio_performance = (portfolio_performance / portfolio_performance.iloc[0] - 1) * 100
-            
-            ax.plot(portfolio_performance.index, portfolio_performance.values, 
-                   linewidth=3, color='#2E86C1', alpha=0.8)
-            ax.fill_between(portfolio_performance.index, portfolio_performance.values, 
-                           alpha=0.3, color='#2E86C1')
-            ax.set_title('Portfolio Performance (%)', fontsize=16, fontweight='bold')
-            ax.set_ylabel('Performance (%)', fontsize=12)
-            ax.grid(True, alpha=0.3)
-            plt.xticks(rotation=45)
-            plt.tight_layout()
-            plt.savefig('static/portfolio_performance.png', dpi=300, bbox_inches='tight')
-            charts['performance'] = 'static/portfolio_performance.png'
-            plt.close()
-
-        # 4. Risk Metrics Bar Chart
-        fig, ax = plt.subplots(figsize=(10, 6))
+            performance = self.performance_series(metrics)
+            tasks.append(('performance', charts.line_chart, dict(
+                dates=performance.index.to_numpy(), values=performance.to_numpy(),
+                title='Portfolio Performance (%)', ylabel='Performance (%)', figsize=figsizes['performance'],
+                **common)))
         risk_metrics = {
             'Volatility (%)': metrics['portfolio_volatility'] * 100,
             'VaR 95% (%)': abs(metrics['portfolio_var_95']) * 100,
             'Max Drawdown (%)': abs(metrics['max_drawdown']) * 100,
             'Sharpe Ratio': metrics['sharpe_ratio']
         }
-        
-        bars = ax.bar(risk_metrics.keys(), risk_metrics.values(), 
-                     color=['#E74C3C', '#F39C12', '#8E44AD', '#27AE60'])
-        ax.set_title('Risk Metrics Dashboard', fontsize=16, fontweight='bold')
-        ax.set_ylabel('Value', fontsize=12)
-        
-        # Add value labels on bars
-        for bar in bars:
-            height = bar.get_height()
-            ax.annotate(f'{height:.2f}',
-                       xy=(bar.get_x() + bar.get_width() / 2, height),
-                       xytext=(0, 3),
-                       textcoords="offset points",
-                       ha='center', va='bottom', fontweight='bold')
-        
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-        plt.savefig('static/risk_metrics.png', dpi=300, bbox_inches='tight')
-        charts['risk_metrics'] = 'static/risk_metrics.png'
-        plt.close()
-
-        # 5. Correlation Heatmap
+        tasks.append(('risk_metrics', charts.bar_chart, dict(
+            labels=list(risk_metrics), values=[float(v) for v in risk_metrics.values()],
+            title='Risk Metrics Dashboard', ylabel='Value', figsize=figsizes['risk_metrics'],
+            colors=['#E74C3C', '#F39C12', '#8E44AD', '#27AE60'], **common)))
         if not metrics['correlation_matrix'].empty:
-            fig, ax = plt.subplots(figsize=(10, 8))
-            sns.heatmap(metrics['correlation_matrix'], 
-                       annot=True, 
-                       cmap='RdYlBu_r', 
-                       center=0,
-                       square=True,
-                       fmt='.2f',
-                       cbar_kws={"shrink": .8})
-            ax.set_title('Asset Correlation Matrix', fontsize=16, fontweight='bold', pad=20)
-            plt.tight_layout()
-            plt.savefig('static/correlation_matrix.png', dpi=300, bbox_inches='tight')
-            charts['correlation'] = 'static/correlation_matrix.png'
-            plt.close()
-
-        return charts
-
-    def generate_pdf_report(self, metrics, alerts):
-        """Generate PDF report and save to static folder"""
-        from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-
-        # Ensure static directory exists
+            tasks.append(('correlation', charts.heatmap_chart, dict(
+                matrix=metrics['correlation_matrix'].to_numpy(), labels=metrics['correlation_matrix'].columns.tolist(),
+                title='Asset Correlation Matrix', figsize=figsizes['correlation'], **common)))
+        return tasks
+
+    def create_web_visualizations(self, metrics, in_process=False):
+        """Render the dashboard charts in parallel (in_process=True: serially here) into the static folder"""
         os.makedirs('static', exist_ok=True)
-        
-        doc = SimpleDocTemplate("static/portfolio_risk_report.pdf", pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Title
-        title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], 
-                                   fontSize=18, spaceAfter=30, textColor=colors.darkblue)
-        story.append(Paragraph("Portfolio Risk Analytics Report", title_style))
-        story.append(Spacer(1, 12))
-        
-        # Executive Summary
-        story.append(Paragraph("Executive Summary", styles['Heading2']))
-        
-        portfolio_df = metrics['portfolio_df']
-        total_pnl = portfolio_df['pnl'].sum()
-        total_pnl_pct = (total_pnl / portfolio_df['cost_basis'].sum()) * 100 if portfolio_df['cost_basis'].sum() > 0 else 0
-        
-        summary_text = f"""
-        <b>Portfolio Value:</b> ${metrics['total_value']:,.2f}<br/>
-        <b>Total P&L:</b> ${total_pnl:,.2f} ({total_pnl_pct:+.2f}%)<br/>
-        <b>Portfolio Volatility:</b> {metrics['portfolio_volatility']:.2%}<br/>
-        <b>95% VaR:</b> {metrics['portfolio_var_95']:.2%}<br/>
-        <b>Sharpe Ratio:</b> {metrics['sharpe_ratio']:.2f}<br/>
-        <b>Max Drawdown:</b> {metrics['max_drawdown']:.2%}
-        """
-        story.append(Paragraph(summary_text, styles['Normal']))
-        story.append(Spacer(1, 12))
-        
-        # Risk Alerts
-        if alerts:
-            story.append(Paragraph("Risk Alerts", styles['Heading2']))
-            for alert in alerts:
-                message = alert['message'] if isinstance(alert, dict) else str(alert)
-                story.append(Paragraph(f"• {message}", styles['Normal']))
-            story.append(Spacer(1, 12))
-        
-        # Holdings Table
-        story.append(Paragraph("Current Holdings", styles['Heading2']))
-        
-        table_data = [['Symbol', 'Quantity', 'Current Price', 'Value', 'Weight', 'P&L', 'P&L %']]
-        for _, row in portfolio_df.iterrows():
-            table_data.append([
-                row['symbol'],
-                f"{row['quantity']:.0f}",
-                f"${row['current_price']:.2f}",
-                f"${row['current_value']:,.2f}",
-                f"{row['weight']:.1f}%",
-                f"${row['pnl']:,.2f}",
-                f"{row['pnl_pct']:+.1f}%"
-            ])
-        
-        table = Table(table_data)
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        story.append(table)
-        
-        doc.build(story)
+        filenames = {
+            'allocation': 'static/portfolio_allocation.png',
+            'sector': 'static/sector_allocation.png',
+            'performance': 'static/portfolio_performance.png',
+            'risk_metrics': 'static/risk_metrics.png',
+            'correlation': 'static/correlation_matrix.png'
+        }
+        charts_out = {}
+        for name, png in charts.render_charts(self.chart_tasks(metrics), in_process, self.chart_cache).items():
+            with open(filenames[name], 'wb') as f:
+                f.write(png)
+            charts_out[name] = filenames[name]
+        return charts_out
+
+    def generate_pdf_report(self, metrics, alerts, path='static/portfolio_risk_report.pdf'):
+        """Generate PDF report and save it to path (the static folder by default) or a file object"""
+        from pdf_report import write_pdf_report
+
+        if isinstance(path, str):
+            # Ensure the output directory exists
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        write_pdf_report(path, metrics, alerts)
         return True
 
+    def export_metrics(self, metrics, alerts=(), directory=None, formats=('parquet', 'arrow'), keep=5):
+        """Write the metrics frames as Parquet and Arrow IPC files; returns the export's manifest.
+
+        Exports go to <db name>_exports/<export id>/ by default; see
+        arrow_export.write_export. Needs pyarrow.
+        """
+        from arrow_export import write_export
+        directory = directory or os.path.splitext(self.db_name)[0] + '_exports'
+        return write_export(metrics, directory, alerts=alerts, formats=formats, keep=keep)
+
 # Initialize sample data function
 def initialize_sample_data(analyzer):
-    conn = sqlite3.connect('portfolio.db')
-    conn.execute('DELETE FROM holdings')
-    conn.commit()
-    conn.close()
-    
     sample_holdings = [
         ('AAPL', 10, 150.00, '2024-01-15', 'Equity'),
         ('MSFT', 8, 300.00, '2024-02-01', 'Equity'),
@@ -415,9 +691,18 @@ def initialize_sample_data(analyzer):
         ('GLD', 5, 180.00, '2024-03-15', 'Commodity ETF')
     ]
     
-    for holding in sample_holdings:
-        analyzer.add_holding(*holding)
+    analyzer.import_holdings(sample_holdings, replace=True)
     
     analyzer.set_risk_limits(max_portfolio_var=0.03,
                            max_individual_weight=0.20,
-                           max_sector_concentration=0.40)
\ No newline at end of file
+                           max_sector_concentration=0.40)
+
+
+def run_daily_snapshot(analyzer):
+    rows = analyzer.update_performance_history()
+    print(f"📈 Recorded {rows} performance snapshot(s)")
+    return rows
+
+
+if __name__ == '__main__':
+    run_daily_snapshot(WebPortfolioRiskAnalyzer())
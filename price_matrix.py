@@ -0,0 +1,187 @@
+import os
+import uuid
+import numpy as np
+import pandas as pd
+from schema import date_to_int, dates_to_ints, ints_to_dates
+
+
+class PriceMatrix:
+    """Dense date x symbol closes backed by a memory-mapped .npy file.
+
+    values is a read-only (dates x symbols) array with NaN where a symbol has
+    no bar; dates are sorted and symbol_index maps each symbol to its column.
+    Every process that opens the same file shares its pages through the OS
+    page cache, and row windows or contiguous column ranges are views of it.
+    """
+
+    def __init__(self, values, dates, symbols, version=None):
+        self.values = values
+        self.dates = dates
+        self.symbols = list(symbols)
+        self.symbol_index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.version = version
+
+    @classmethod
+    def open(cls, path, version=None):
+        """Map a matrix written by build(); path is the .npy file"""
+        values = np.load(path, mmap_mode='r')
+        with np.load(_index_path(path)) as index:
+            dates = ints_to_dates(pd.Series(index['dates'])).to_numpy()
+            symbols = index['symbols'].tolist()
+        return cls(values, pd.DatetimeIndex(dates), symbols, version)
+
+    @classmethod
+    def build(cls, conn, path, dtype=np.float64, version=None):
+        """Write every close in the prices table to path as a dense matrix and map it.
+
+        The table is read in one pass in primary-key (symbol, date) order,
+        straight into a NumPy record array, with per-symbol row counts giving
+        the columns. The file is written under a temporary name and renamed
+        into place, so concurrent readers only ever see a complete matrix.
+        """
+        if not conn.in_transaction:
+            # One read snapshot for the counts and the scan
+            conn.execute('BEGIN')
+        counts = conn.execute('SELECT symbol, COUNT(*) FROM prices GROUP BY symbol ORDER BY symbol').fetchall()
+        symbols = [symbol for symbol, _ in counts]
+        lengths = np.array([n for _, n in counts], dtype=np.int64)
+        rows = np.fromiter(conn.execute('SELECT date, close FROM prices ORDER BY symbol, date'),
+                           dtype=[('date', np.int64), ('close', np.float64)], count=int(lengths.sum()))
+        dates, date_rows = np.unique(rows['date'], return_inverse=True)
+
+        tmp, values = _create(path, dtype, (len(dates), len(symbols)))
+        values[:] = np.nan
+        values[date_rows, np.repeat(np.arange(len(symbols)), lengths)] = rows['close']
+        values.flush()
+        del values, rows
+        _publish(tmp, path, dates, symbols)
+        return cls.open(path, version)
+
+    @classmethod
+    def extend(cls, conn, base, path, symbols, version=None):
+        """Write base plus the closes of symbols dated after its last date to path and map it.
+
+        For a tail refresh that only adds later bars to symbols base already
+        holds: base's rows are copied across from its mapped file and only the
+        new rows are read, by primary key, instead of the full scan build()
+        does. The result is the matrix build() would write.
+        """
+        last = date_to_int(base.dates[-1])
+        placeholders = ','.join('?' * len(symbols))
+        rows = conn.execute(f'SELECT symbol, date, close FROM prices WHERE symbol IN ({placeholders}) AND date > ?',
+                            [*symbols, last]).fetchall()
+        new_dates, date_rows = np.unique(np.array([date for _, date, _ in rows], dtype=np.int64),
+                                         return_inverse=True)
+        dates = np.concatenate([dates_to_ints(pd.Series(base.dates)).to_numpy(), new_dates])
+
+        old = len(base.dates)
+        tmp, values = _create(path, base.values.dtype, (len(dates), len(base.symbols)))
+        values[:old] = base.values
+        values[old:] = np.nan
+        values[old + date_rows, base.columns([symbol for symbol, _, _ in rows])] = [close for _, _, close in rows]
+        values.flush()
+        del values
+        _publish(tmp, path, dates, base.symbols)
+        return cls.open(path, version)
+
+    def columns(self, symbols):
+        """Column positions of symbols, -1 for symbols the matrix does not hold"""
+        return np.array([self.symbol_index.get(s, -1) for s in symbols], dtype=np.intp)
+
+    def block(self, symbols, start=None):
+        """(values, dates) for symbols from start, as a view whenever the columns are contiguous.
+
+        Symbols the matrix does not hold come back as all-NaN columns.
+        """
+        first = 0 if start is None else int(self.dates.searchsorted(pd.Timestamp(start)))
+        rows = self.values[first:]
+        columns = self.columns(symbols)
+        if len(columns) and (columns >= 0).all() and (np.diff(columns) == 1).all():
+            block = rows[:, columns[0]:columns[-1] + 1]
+        else:
+            block = np.take(rows, np.maximum(columns, 0), axis=1)
+            block[:, columns < 0] = np.nan
+        return block, self.dates[first:]
+
+    def frame(self, symbols, start=None, dropna='any'):
+        """Closes for symbols as a date x symbol DataFrame over the matrix, without copying where possible.
+
+        dropna='any' keeps dates where every symbol has a bar, 'all' dates
+        where at least one does, and None keeps every date.
+        """
+        block, dates = self.block(symbols, start)
+        if dropna:
+            missing = np.isnan(block)
+            drop = missing.any(axis=1) if dropna == 'any' else missing.all(axis=1)
+            if drop.any():
+                block, dates = block[~drop], dates[~drop]
+        frame = pd.DataFrame(block, index=dates, columns=list(symbols), copy=False)
+        frame.index.name = 'Date'
+        return frame
+
+
+def _index_path(path):
+    return os.path.splitext(path)[0] + '.index.npz'
+
+
+def matrix_path(directory, version, dtype):
+    return os.path.join(directory, f'prices_v{version}_{np.dtype(dtype).name}.npy')
+
+
+def _create(path, dtype, shape):
+    tmp = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+    return tmp, np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+
+
+def _publish(tmp, path, dates, symbols):
+    # The index goes first, so a matrix file is never visible without one
+    index_tmp = f'{_index_path(path)}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(index_tmp, 'wb') as f:
+        np.savez(f, dates=dates, symbols=np.array(symbols, dtype=str))
+    os.replace(index_tmp, _index_path(path))
+    os.replace(tmp, path)
+
+
+def _latest_path(directory, dtype):
+    return os.path.join(directory, f'LATEST_{np.dtype(dtype).name}')
+
+
+def latest_version(directory, dtype):
+    """Version of the newest matrix of dtype published in directory, or None"""
+    try:
+        with open(_latest_path(directory, dtype)) as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def publish_latest(directory, version, dtype):
+    """Point LATEST at version, unless a newer matrix is already published"""
+    latest = latest_version(directory, dtype)
+    if latest is not None and latest >= version:
+        return
+    tmp = f'{_latest_path(directory, dtype)}.{uuid.uuid4().hex[:8]}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(str(version))
+    os.replace(tmp, _latest_path(directory, dtype))
+
+
+def prune_matrices(directory, keep_path, dtype):
+    """Remove older matrices of dtype except the one LATEST points to.
+
+    Processes that still map a removed file keep their pages. Sparing the
+    LATEST matrix stops a process that finished building a stale version
+    from deleting the newer file other processes are about to open.
+    """
+    keep = {keep_path}
+    latest = latest_version(directory, dtype)
+    if latest is not None:
+        keep.add(matrix_path(directory, latest, dtype))
+    keep = {os.path.basename(name) for path in keep for name in (path, _index_path(path))}
+    suffixes = (f'_{np.dtype(dtype).name}.npy', f'_{np.dtype(dtype).name}.index.npz')
+    for name in os.listdir(directory):
+        if name.startswith('prices_v') and name.endswith(suffixes) and name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
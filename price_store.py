@@ -0,0 +1,344 @@
+import json
+import os
+import re
+import time
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from db import ConnectionManager
+from schema import date_to_int, int_to_date, dates_to_ints, ints_to_dates
+from covariance import CovarianceEstimate
+from price_matrix import PriceMatrix, matrix_path, prune_matrices, latest_version, publish_latest
+
+# Versions of price changes kept in the change log; a matrix older than this is rebuilt in full
+CHANGE_LOG_VERSIONS = 1000
+
+
+def period_start(period, now=None):
+    """Translate a yfinance style period ('5d', '6mo', '1y', 'ytd', 'max') into a start date"""
+    now = pd.Timestamp(now or datetime.now()).normalize()
+    if period == 'max':
+        return None
+    if period == 'ytd':
+        return pd.Timestamp(year=now.year, month=1, day=1)
+    match = re.fullmatch(r'(\d+)(d|wk|mo|y)', period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    count, unit = int(match.group(1)), match.group(2)
+    offsets = {
+        'd': pd.DateOffset(days=count),
+        'wk': pd.DateOffset(weeks=count),
+        'mo': pd.DateOffset(months=count),
+        'y': pd.DateOffset(years=count)
+    }
+    return now - offsets[unit]
+
+
+class PriceStore:
+    """Local SQLite store of daily closing prices keyed by (symbol, date)"""
+
+    def __init__(self, db_name='portfolio_prices.db', matrix_dir=None):
+        self.db_name = db_name
+        self.db = ConnectionManager(db_name)
+        # Dense memory-mapped copies of the prices table, one per dtype, rebuilt when prices change
+        self.matrix_dir = matrix_dir or os.path.splitext(db_name)[0] + '_matrix'
+        self._matrices = {}
+        self._matrix_lock = threading.Lock()
+        self.setup_database()
+
+    def setup_database(self):
+        """Create the price, profile, fetch-log and covariance tables"""
+        with self.db.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS prices (
+                    symbol TEXT NOT NULL,
+                    date INTEGER NOT NULL,
+                    close REAL NOT NULL,
+                    PRIMARY KEY (symbol, date)
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS profiles (
+                    symbol TEXT PRIMARY KEY,
+                    sector TEXT NOT NULL,
+                    industry TEXT NOT NULL,
+                    market_cap REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fetch_log (
+                    symbol TEXT PRIMARY KEY,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS covariance (
+                    name TEXT PRIMARY KEY,
+                    symbols TEXT NOT NULL,
+                    halflife REAL,
+                    first_date INTEGER,
+                    last_date INTEGER,
+                    count INTEGER NOT NULL,
+                    weight_sq REAL NOT NULL,
+                    fourth REAL NOT NULL,
+                    mean BLOB NOT NULL,
+                    cov BLOB NOT NULL
+                )
+            ''')
+            # Bumped by every save() that writes prices, so the price matrix knows when to rebuild
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS data_version (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            cursor.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+            # What each version changed: its earliest date and the symbols it touched
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS price_changes (
+                    version INTEGER PRIMARY KEY,
+                    first_date INTEGER NOT NULL,
+                    symbols TEXT NOT NULL
+                )
+            ''')
+
+    def date_ranges(self, symbols):
+        """Return {symbol: (first_date, last_date)} for symbols with stored bars"""
+        if not symbols:
+            return {}
+        placeholders = ','.join('?' * len(symbols))
+        with self.db.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT symbol, MIN(date), MAX(date) FROM prices
+                WHERE symbol IN ({placeholders}) GROUP BY symbol
+            ''', list(symbols)).fetchall()
+        return {symbol: (int_to_date(first), int_to_date(last)) for symbol, first, last in rows}
+
+    def last_fetched(self, symbols):
+        """Return {symbol: unix time of the last download attempt}"""
+        if not symbols:
+            return {}
+        placeholders = ','.join('?' * len(symbols))
+        with self.db.connection() as conn:
+            rows = conn.execute(f'SELECT symbol, fetched_at FROM fetch_log WHERE symbol IN ({placeholders})',
+                                list(symbols)).fetchall()
+        return dict(rows)
+
+    def save(self, prices, fetched_symbols=None):
+        """Upsert a date x symbol frame of closes and record the fetch time.
+
+        Only closes that differ from the stored ones are written, so refetching
+        unchanged bars leaves the version, and the price matrix, alone. Returns
+        the number of closes written.
+        """
+        rows = []
+        if prices is not None and not prices.empty:
+            long = prices.rename_axis('date').reset_index().melt(id_vars='date', var_name='symbol', value_name='close')
+            long = long.dropna(subset=['close'])
+            long['date'] = dates_to_ints(long['date'])
+            rows = list(zip(long['symbol'], long['date'].astype(int), long['close'].astype(float)))
+        now = time.time()
+        with self.db.connection() as conn:
+            if rows:
+                rows = self._changed_rows(conn, rows)
+            conn.executemany('INSERT OR REPLACE INTO prices (symbol, date, close) VALUES (?, ?, ?)', rows)
+            if rows:
+                conn.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+                version = conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+                conn.execute('INSERT INTO price_changes (version, first_date, symbols) VALUES (?, ?, ?)',
+                             (version, min(date for _, date, _ in rows), json.dumps(sorted({s for s, _, _ in rows}))))
+                conn.execute('DELETE FROM price_changes WHERE version <= ?', (version - CHANGE_LOG_VERSIONS,))
+            conn.executemany('INSERT OR REPLACE INTO fetch_log (symbol, fetched_at) VALUES (?, ?)',
+                             [(symbol, now) for symbol in (fetched_symbols or [])])
+        return len(rows)
+
+    def _changed_rows(self, conn, rows):
+        """The (symbol, date, close) rows whose close is not already stored"""
+        symbols = sorted({symbol for symbol, _, _ in rows})
+        placeholders = ','.join('?' * len(symbols))
+        stored = {(symbol, date): close for symbol, date, close in conn.execute(
+            f'SELECT symbol, date, close FROM prices WHERE symbol IN ({placeholders}) AND date >= ?',
+            [*symbols, min(date for _, date, _ in rows)])}
+        if not stored:
+            return rows
+        return [row for row in rows if stored.get(row[:2]) != row[2]]
+
+    def load_profiles(self, symbols):
+        """Return {symbol: profile dict} for symbols with a cached profile"""
+        if not symbols:
+            return {}
+        placeholders = ','.join('?' * len(symbols))
+        with self.db.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT symbol, sector, industry, market_cap FROM profiles WHERE symbol IN ({placeholders})
+            ''', list(symbols)).fetchall()
+        return {symbol: {'sector': sector, 'industry': industry, 'market_cap': market_cap}
+                for symbol, sector, industry, market_cap in rows}
+
+    def save_profiles(self, profiles):
+        """Upsert {symbol: profile dict}"""
+        with self.db.connection() as conn:
+            conn.executemany('INSERT OR REPLACE INTO profiles (symbol, sector, industry, market_cap) VALUES (?, ?, ?, ?)',
+                             [(symbol, p['sector'], p['industry'], p['market_cap']) for symbol, p in profiles.items()])
+
+    def load_covariance(self, name):
+        """Stored CovarianceEstimate under name, or None"""
+        with self.db.connection() as conn:
+            row = conn.execute('''
+                SELECT symbols, halflife, first_date, last_date, count, weight_sq, fourth, mean, cov
+                FROM covariance WHERE name = ?
+            ''', (name,)).fetchone()
+        return CovarianceEstimate.from_row(row) if row else None
+
+    def save_covariance(self, name, estimate):
+        with self.db.connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO covariance
+                    (name, symbols, halflife, first_date, last_date, count, weight_sq, fourth, mean, cov)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, *estimate.to_row()))
+
+    def latest_prices(self, symbols):
+        """Most recent stored close per symbol as a Series"""
+        if not symbols:
+            return pd.Series(dtype=float)
+        placeholders = ','.join('?' * len(symbols))
+        with self.db.connection() as conn:
+            rows = conn.execute(f'''
+                SELECT p.symbol, p.close FROM prices p
+                JOIN (SELECT symbol, MAX(date) AS date FROM prices WHERE symbol IN ({placeholders}) GROUP BY symbol) m
+                ON p.symbol = m.symbol AND p.date = m.date
+            ''', list(symbols)).fetchall()
+        return pd.Series(dict(rows), dtype=float)
+
+    def version(self):
+        """Counter bumped by every save() that writes prices"""
+        with self.db.connection() as conn:
+            return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+
+    def matrix(self, dtype=np.float64):
+        """The whole prices table as a memory-mapped PriceMatrix of dtype.
+
+        The matrix file is named after the store's version, so processes on
+        the same store share one file and its page cache. When save() has only
+        added later bars to symbols the previous matrix holds (the hourly tail
+        refresh), the new version is that matrix plus the new rows; any other
+        change rebuilds it from the whole table.
+        """
+        version = self.version()
+        matrix = self._matrices.get(np.dtype(dtype).name)
+        if matrix is not None and matrix.version == version:
+            return matrix
+        with self._matrix_lock:
+            matrix = self._matrices.get(np.dtype(dtype).name)
+            if matrix is None or matrix.version != self.version():
+                matrix = self._update_matrix(matrix, dtype)
+                self._matrices[np.dtype(dtype).name] = matrix
+            return matrix
+
+    def _update_matrix(self, base, dtype):
+        os.makedirs(self.matrix_dir, exist_ok=True)
+        with self.db.connection() as conn:
+            # One read snapshot for the version, its change log and the rows read from it
+            conn.execute('BEGIN')
+            version = conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+            path = matrix_path(self.matrix_dir, version, dtype)
+            matrix = _open_matrix(path, version)
+            if matrix is not None:
+                return matrix
+            if base is None:
+                latest = latest_version(self.matrix_dir, dtype)
+                if latest is not None and latest < version:
+                    base = _open_matrix(matrix_path(self.matrix_dir, latest, dtype), latest)
+            symbols = self._tail_symbols(conn, base, version)
+            if symbols is None:
+                matrix = PriceMatrix.build(conn, path, dtype, version=version)
+            else:
+                matrix = PriceMatrix.extend(conn, base, path, symbols, version=version)
+        publish_latest(self.matrix_dir, version, dtype)
+        prune_matrices(self.matrix_dir, path, dtype)
+        return matrix
+
+    def _tail_symbols(self, conn, base, version):
+        """Symbols changed between base and version if every change is a later bar for a symbol base holds.
+
+        None means base cannot be extended and the matrix must be rebuilt.
+        """
+        if base is None or base.version is None or base.version > version or not len(base.dates):
+            return None
+        changes = conn.execute('SELECT first_date, symbols FROM price_changes WHERE version > ? AND version <= ?',
+                               (base.version, version)).fetchall()
+        if len(changes) != version - base.version:
+            return None
+        last = date_to_int(base.dates[-1])
+        symbols = set()
+        for first_date, changed in changes:
+            if first_date <= last:
+                return None
+            symbols.update(json.loads(changed))
+        if not symbols.issubset(base.symbol_index):
+            return None
+        return sorted(symbols)
+
+    def load(self, symbols, start=None):
+        """Load stored closes as a date x symbol frame, optionally from a start date"""
+        if not symbols:
+            return pd.DataFrame()
+        placeholders = ','.join('?' * len(symbols))
+        query = f'SELECT symbol, date, close FROM prices WHERE symbol IN ({placeholders})'
+        params = list(symbols)
+        if start is not None:
+            query += ' AND date >= ?'
+            params.append(date_to_int(start))
+        with self.db.connection() as conn:
+            long = pd.read_sql_query(query, conn, params=params)
+        if long.empty:
+            return pd.DataFrame()
+        long['date'] = ints_to_dates(long['date'])
+        prices = long.pivot(index='date', columns='symbol', values='close')
+        prices.columns.name = None
+        prices.index.name = 'Date'
+        return prices
+
+
+def _open_matrix(path, version):
+    # A missing file (never built, or pruned after a newer version was published) is rebuilt by the caller
+    try:
+        return PriceMatrix.open(path, version)
+    except FileNotFoundError:
+        return None
+
+
+def sync_prices(store, downloader, symbols, period='1y', refresh_interval=3600, now=None, as_of=None):
+    """Bring the store up to date for symbols, downloading only what is missing.
+
+    Symbols with no stored history (or history that starts after the requested
+    period) are downloaded in full; symbols already stored only fetch the tail
+    after their last bar. Symbols fetched within refresh_interval seconds are
+    served from the store without touching the downloader. as_of pins the
+    reference date for providers that replay a fixed history.
+    """
+    now_ts = time.time() if now is None else now
+    today = pd.Timestamp(as_of or datetime.fromtimestamp(now_ts)).normalize()
+    wanted_start = period_start(period, today)
+    fetched = store.last_fetched(symbols)
+    ranges = store.date_ranges(symbols)
+
+    stale = [s for s in symbols if now_ts - fetched.get(s, 0) >= refresh_interval]
+    missing, tail = [], []
+    for symbol in stale:
+        first, last = ranges.get(symbol, (None, None))
+        # Allow a week of slack for weekends and holidays at the start of the window
+        if first is None or (wanted_start is not None and first > wanted_start + timedelta(days=7)):
+            missing.append(symbol)
+        elif last < today:
+            tail.append(symbol)
+
+    if missing:
+        store.save(downloader(missing, period=period), fetched_symbols=missing)
+    if tail:
+        tail_start = min(ranges[s][1] for s in tail) + timedelta(days=1)
+        store.save(downloader(tail, start=tail_start.strftime('%Y-%m-%d')), fetched_symbols=tail)
+    return {'missing': missing, 'tail': tail}
@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReportQueue:
+    """Builds PDF reports on a background thread and tracks them by job id.
+
+    build(metrics, alerts, path) is called on a worker thread and must write
+    the PDF to path. Each job writes its own file in directory; only the
+    newest keep reports stay on disk. A job still waiting to start when a
+    newer one is submitted is superseded, so bursts of page views build
+    one report rather than a backlog.
+    """
+
+    def __init__(self, build, directory=os.path.join('static', 'reports'), max_workers=1, keep=5):
+        self.build = build
+        self.directory = directory
+        self.keep = keep
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='report')
+
+    def submit(self, metrics, alerts):
+        """Queue a report; returns its job id"""
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            for job in self.jobs.values():
+                if job['status'] == 'queued':
+                    job['status'] = 'superseded'
+                    job['superseded_by'] = job_id
+            self.jobs[job_id] = {
+                'id': job_id,
+                'status': 'queued',
+                'submitted_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'path': None,
+                'error': None
+            }
+        self.executor.submit(self._run, job_id, metrics, alerts)
+        return job_id
+
+    def _run(self, job_id, metrics, alerts):
+        with self.lock:
+            job = self.jobs[job_id]
+            if job['status'] != 'queued':
+                return
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+        path = os.path.abspath(os.path.join(self.directory, f'portfolio_risk_report_{job_id}.pdf'))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Build under a temporary name so a download never sees a half-written file
+            tmp = path + '.tmp'
+            self.build(metrics, alerts, tmp)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"Error building report {job_id}: {e}")
+            with self.lock:
+                job.update(status='failed', error=str(e), finished_at=time.time())
+            return
+        with self.lock:
+            job.update(status='done', path=path, finished_at=time.time())
+        self._prune()
+
+    def _prune(self):
+        with self.lock:
+            done = sorted((j for j in self.jobs.values() if j['status'] == 'done'), key=lambda j: j['finished_at'])
+            stale = done[:-self.keep] if self.keep else []
+            for job in stale:
+                job['status'] = 'expired'
+            # Forget finished jobs beyond a generous history so the dict stays bounded
+            finished = [j for j in self.jobs.values() if j['status'] not in ('queued', 'running')]
+            for job in sorted(finished, key=lambda j: j['submitted_at'])[:-100]:
+                del self.jobs[job['id']]
+        for job in stale:
+            try:
+                os.remove(job['path'])
+            except OSError:
+                pass
+
+    def status(self, job_id):
+        """Copy of a job's record, or None for an unknown id"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def latest(self):
+        """Record of the most recently completed report, or None"""
+        with self.lock:
+            done = [j for j in self.jobs.values() if j['status'] == 'done']
+            return dict(max(done, key=lambda j: j['finished_at'])) if done else None
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job leaves the queue; returns its record"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            job = self.status(job_id)
+            if job is None or job['status'] not in ('queued', 'running'):
+                return job
+            if deadline is not None and time.time() >= deadline:
+                return job
+            time.sleep(0.05)
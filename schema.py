@@ -0,0 +1,195 @@
+import pandas as pd
+
+
+def date_to_int(value):
+    """Convert a date-like value to a sortable YYYYMMDD integer"""
+    ts = pd.Timestamp(value)
+    return ts.year * 10000 + ts.month * 100 + ts.day
+
+
+def int_to_date(value):
+    """Convert a YYYYMMDD integer back to a Timestamp"""
+    value = int(value)
+    return pd.Timestamp(year=value // 10000, month=value // 100 % 100, day=value % 100)
+
+
+def dates_to_ints(dates):
+    """Vectorised date_to_int for a Series of datetimes"""
+    dates = pd.to_datetime(dates)
+    return (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).astype('int64')
+
+
+def ints_to_dates(values):
+    """Vectorised int_to_date for a Series of YYYYMMDD integers"""
+    return pd.to_datetime(values.astype('int64').astype(str), format='%Y%m%d')
+
+
+def iso_date_sql(column):
+    """SQL expression formatting a YYYYMMDD integer column as 'YYYY-MM-DD' text"""
+    return f"printf('%04d-%02d-%02d', {column} / 10000, {column} / 100 % 100, {column} % 100)"
+
+
+def _create_base_tables(conn):
+    # The original layout; a no-op for databases created before migrations existed
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS holdings (
+            id INTEGER PRIMARY KEY,
+            symbol TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            purchase_price REAL NOT NULL,
+            purchase_date TEXT NOT NULL,
+            asset_class TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_limits (
+            id INTEGER PRIMARY KEY,
+            metric TEXT NOT NULL,
+            limit_value REAL NOT NULL,
+            alert_threshold REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS performance_history (
+            id INTEGER PRIMARY KEY,
+            date TEXT NOT NULL,
+            total_value REAL NOT NULL,
+            daily_return REAL NOT NULL
+        )
+    ''')
+
+
+def _integer_dates_and_indexes(conn):
+    # Rebuild the date columns as YYYYMMDD integers, converting 'YYYY-MM-DD...' text in place
+    conn.execute('''
+        CREATE TABLE holdings_new (
+            id INTEGER PRIMARY KEY,
+            symbol TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            purchase_price REAL NOT NULL,
+            purchase_date INTEGER NOT NULL,
+            asset_class TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO holdings_new (id, symbol, quantity, purchase_price, purchase_date, asset_class)
+        SELECT id, symbol, quantity, purchase_price,
+               CAST(REPLACE(SUBSTR(purchase_date, 1, 10), '-', '') AS INTEGER), asset_class
+        FROM holdings
+    ''')
+    conn.execute('DROP TABLE holdings')
+    conn.execute('ALTER TABLE holdings_new RENAME TO holdings')
+
+    conn.execute('''
+        CREATE TABLE performance_history_new (
+            id INTEGER PRIMARY KEY,
+            date INTEGER NOT NULL,
+            total_value REAL NOT NULL,
+            daily_return REAL NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO performance_history_new (id, date, total_value, daily_return)
+        SELECT id, CAST(REPLACE(SUBSTR(date, 1, 10), '-', '') AS INTEGER), total_value, daily_return
+        FROM performance_history
+    ''')
+    conn.execute('DROP TABLE performance_history')
+    conn.execute('ALTER TABLE performance_history_new RENAME TO performance_history')
+
+    # Keep the newest row per metric so the metric can be unique
+    conn.execute('DELETE FROM risk_limits WHERE id NOT IN (SELECT MAX(id) FROM risk_limits GROUP BY metric)')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_holdings_symbol ON holdings (symbol)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_holdings_asset_class ON holdings (asset_class)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_performance_history_date ON performance_history (date)')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_risk_limits_metric ON risk_limits (metric)')
+
+
+def _performance_state(conn):
+    # One history row per day, plus the running estimators that incremental refreshes resume from
+    conn.execute('DELETE FROM performance_history WHERE id NOT IN (SELECT MAX(id) FROM performance_history GROUP BY date)')
+    conn.execute('DROP INDEX IF EXISTS idx_performance_history_date')
+    conn.execute('CREATE UNIQUE INDEX idx_performance_history_date ON performance_history (date)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS risk_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            last_date INTEGER NOT NULL,
+            last_value REAL NOT NULL,
+            count INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            wealth REAL NOT NULL,
+            peak REAL NOT NULL,
+            max_drawdown REAL NOT NULL
+        )
+    ''')
+
+
+def _var_sketch(conn):
+    # Serialised P2Quantile markers for streaming VaR; empty until the next snapshot
+    conn.execute('ALTER TABLE risk_state ADD COLUMN var_sketch TEXT')
+
+
+def _portfolio_ids(conn):
+    # Existing lots all belong to the single implicit portfolio
+    conn.execute("ALTER TABLE holdings ADD COLUMN portfolio_id TEXT NOT NULL DEFAULT 'default'")
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_holdings_portfolio_symbol ON holdings (portfolio_id, symbol)')
+
+
+def _change_counter(conn):
+    # Bumped once per write transaction on holdings or risk_limits, so readers can poll for changes cheaply
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+
+
+# (version, upgrade) pairs applied in order; the schema version lives in PRAGMA user_version
+MIGRATIONS = [
+    (1, _create_base_tables),
+    (2, _integer_dates_and_indexes),
+    (3, _performance_state),
+    (4, _var_sketch),
+    (5, _portfolio_ids),
+    (6, _change_counter)
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def bump_data_version(conn):
+    """Record a change to holdings or risk limits in the current transaction"""
+    conn.execute('UPDATE data_version SET version = version + 1 WHERE id = 1')
+
+
+def data_version(conn):
+    return conn.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+
+
+def migrate(conn):
+    """Upgrade the portfolio database in place to SCHEMA_VERSION; returns the versions applied"""
+    applied = []
+    for version, upgrade in MIGRATIONS:
+        if schema_version(conn) >= version:
+            continue
+        if conn.in_transaction:
+            conn.commit()
+        # Take the write lock first so concurrent workers cannot run the same step twice
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if schema_version(conn) < version:
+                upgrade(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+                applied.append(version)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return applied
@@ -0,0 +1,158 @@
+import threading
+import time
+from types import MappingProxyType
+
+
+class Snapshot:
+    """The result of one analysis run. It is read-only; a newer run replaces it rather than changing it."""
+
+    __slots__ = ('data', 'version', 'data_version', 'computed_at', 'seconds')
+
+    def __init__(self, data, version, data_version, computed_at, seconds):
+        for name, value in zip(self.__slots__, (MappingProxyType(dict(data)), version, data_version,
+                                                computed_at, seconds)):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Snapshot is read-only')
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def age(self, now=None):
+        """Seconds since the snapshot was computed"""
+        return (time.time() if now is None else now) - self.computed_at
+
+
+class SnapshotScheduler:
+    """Recomputes a Snapshot on a background thread and always serves the latest one.
+
+    compute() returns the snapshot's data as a dict. It runs every interval
+    seconds, as soon as data_version() (polled every poll seconds) reports
+    a change, or when refresh() is called. Readers never wait on it: get()
+    returns the last good snapshot, stale or not (stale-while-revalidate),
+    and a failed run keeps that snapshot and records the error.
+    """
+
+    def __init__(self, compute, interval=300, data_version=None, poll=5):
+        self.compute = compute
+        self.interval = interval
+        self.data_version = data_version
+        self.poll = poll
+        self.snapshot = None
+        self.running = False
+        self.last_error = None
+        self.last_attempt = None
+        self._version = 0
+        self._compute_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background thread; computes the first snapshot straight away"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='snapshot', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def refresh(self):
+        """Ask for a new snapshot without waiting for it; a no-op while one is being computed.
+
+        The run starts no sooner than poll seconds after the last attempt, so
+        requests that keep asking while compute() fails do not rerun it each time.
+        """
+        if not self.running:
+            self._wake.set()
+
+    def get(self):
+        """Latest snapshot, or None before the first run finishes"""
+        return self.snapshot
+
+    def wait(self, timeout=None):
+        """Block until a snapshot exists; returns it, or None on timeout"""
+        with self._ready:
+            self._ready.wait_for(lambda: self.snapshot is not None, timeout)
+            return self.snapshot
+
+    def is_stale(self, now=None):
+        snapshot = self.snapshot
+        return snapshot is None or snapshot.age(now) >= self.interval
+
+    def status(self, now=None):
+        """Age and freshness of the current snapshot, for display"""
+        now = time.time() if now is None else now
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version if snapshot else None,
+            'computed_at': snapshot.computed_at if snapshot else None,
+            'age': snapshot.age(now) if snapshot else None,
+            'seconds': snapshot.seconds if snapshot else None,
+            'stale': self.is_stale(now),
+            'refreshing': self.running,
+            'last_error': self.last_error
+        }
+
+    def _current_data_version(self):
+        if self.data_version is None:
+            return None
+        try:
+            return self.data_version()
+        except Exception as e:
+            print(f"Error reading data version: {e}")
+            return None
+
+    def _polled(self):
+        return self.last_attempt is None or time.time() - self.last_attempt >= self.poll
+
+    def _due(self):
+        if self.snapshot is None:
+            # Retry a failed first run at the poll rate rather than waiting a full interval
+            return self._polled()
+        if time.time() - max(self.snapshot.computed_at, self.last_attempt or 0) >= self.interval:
+            return True
+        version = self._current_data_version()
+        return version is not None and version != self.snapshot.data_version
+
+    def _loop(self):
+        forced = False
+        while not self._stop.is_set():
+            # A refresh() inside the poll throttle stays pending until the throttle allows it
+            forced = forced or self._wake.is_set()
+            self._wake.clear()
+            if (forced and self._polled()) or self._due():
+                forced = False
+                self.run_once()
+            self._wake.wait(self.poll)
+
+    def run_once(self):
+        """Compute a snapshot now on the calling thread; returns it, or None if compute failed"""
+        with self._compute_lock:
+            self.running = True
+            self.last_attempt = time.time()
+            # Read the version first, so a change made while computing triggers another run
+            data_version = self._current_data_version()
+            start = time.perf_counter()
+            try:
+                data = self.compute()
+            except Exception as e:
+                print(f"Error computing snapshot: {e}")
+                self.last_error = str(e)
+                return None
+            finally:
+                self.running = False
+            self._version += 1
+            snapshot = Snapshot(data, self._version, data_version, time.time(), time.perf_counter() - start)
+            with self._ready:
+                self.snapshot = snapshot
+                self.last_error = None
+                self._ready.notify_all()
+            return snapshot
@@ -0,0 +1,138 @@
+// Draws the dashboard charts on <canvas data-chart="..."> elements from the JSON
+// emitted by WebAnalyzer.chart_data (the /dashboard?charts=json mode).
+(function () {
+    const PALETTE = ['#8dd3c7', '#fdb462', '#bebada', '#fb8072', '#80b1d3', '#b3de69',
+                     '#fccde5', '#bc80bd', '#ccebc5', '#ffed6f', '#66c2a5', '#fc8d62'];
+
+    function setup(canvas, title) {
+        const ctx = canvas.getContext('2d');
+        ctx.clearRect(0, 0, canvas.width, canvas.height);
+        ctx.font = 'bold 16px sans-serif';
+        ctx.fillStyle = '#222';
+        ctx.textAlign = 'center';
+        ctx.fillText(title, canvas.width / 2, 22);
+        ctx.font = '12px sans-serif';
+        return ctx;
+    }
+
+    function pie(canvas, data, title) {
+        const ctx = setup(canvas, title);
+        const total = data.values.reduce((a, b) => a + b, 0) || 1;
+        const r = Math.min(canvas.width * 0.3, (canvas.height - 50) / 2);
+        const cx = canvas.width * 0.35, cy = 35 + r;
+        let angle = -Math.PI / 2;
+        data.values.forEach((value, i) => {
+            const slice = value / total * 2 * Math.PI;
+            ctx.beginPath();
+            ctx.moveTo(cx, cy);
+            ctx.arc(cx, cy, r, angle, angle + slice);
+            ctx.fillStyle = PALETTE[i % PALETTE.length];
+            ctx.fill();
+            angle += slice;
+        });
+        // Legend instead of per-slice labels so hundreds of holdings stay legible
+        const rows = Math.max(1, Math.floor((canvas.height - 40) / 16));
+        ctx.textAlign = 'left';
+        data.labels.slice(0, rows).forEach((label, i) => {
+            const y = 40 + i * 16;
+            ctx.fillStyle = PALETTE[i % PALETTE.length];
+            ctx.fillRect(canvas.width * 0.7, y - 10, 10, 10);
+            ctx.fillStyle = '#222';
+            ctx.fillText(`${label} ${(data.values[i] / total * 100).toFixed(1)}%`, canvas.width * 0.7 + 14, y);
+        });
+    }
+
+    function line(canvas, data, title) {
+        const ctx = setup(canvas, title);
+        const values = data.values;
+        if (!values.length) return;
+        const left = 50, right = canvas.width - 10, top = 35, bottom = canvas.height - 30;
+        const lo = Math.min(...values), hi = Math.max(...values), span = (hi - lo) || 1;
+        const x = i => left + (right - left) * i / Math.max(values.length - 1, 1);
+        const y = v => bottom - (bottom - top) * (v - lo) / span;
+        ctx.beginPath();
+        values.forEach((v, i) => (i ? ctx.lineTo(x(i), y(v)) : ctx.moveTo(x(i), y(v))));
+        ctx.strokeStyle = '#2E86C1';
+        ctx.lineWidth = 2;
+        ctx.stroke();
+        ctx.lineTo(x(values.length - 1), bottom);
+        ctx.lineTo(x(0), bottom);
+        ctx.fillStyle = 'rgba(46, 134, 193, 0.3)';
+        ctx.fill();
+        ctx.fillStyle = '#222';
+        ctx.textAlign = 'right';
+        ctx.fillText(`${hi.toFixed(1)}%`, left - 4, top + 4);
+        ctx.fillText(`${lo.toFixed(1)}%`, left - 4, bottom);
+        ctx.textAlign = 'left';
+        ctx.fillText(data.dates[0], left, canvas.height - 10);
+        ctx.textAlign = 'right';
+        ctx.fillText(data.dates[data.dates.length - 1], right, canvas.height - 10);
+    }
+
+    function bar(canvas, data, title) {
+        const ctx = setup(canvas, title);
+        const colors = ['#E74C3C', '#F39C12', '#8E44AD', '#27AE60'];
+        const top = 50, bottom = canvas.height - 30;
+        const hi = Math.max(...data.values.map(Math.abs), 1e-9);
+        const width = canvas.width / data.values.length;
+        data.values.forEach((v, i) => {
+            const h = (bottom - top) * Math.abs(v) / hi;
+            ctx.fillStyle = colors[i % colors.length];
+            ctx.fillRect(i * width + width * 0.15, bottom - h, width * 0.7, h);
+            ctx.fillStyle = '#222';
+            ctx.textAlign = 'center';
+            ctx.fillText(v.toFixed(2), (i + 0.5) * width, bottom - h - 4);
+            ctx.fillText(data.labels[i], (i + 0.5) * width, canvas.height - 10);
+        });
+    }
+
+    function heatmap(canvas, data, title) {
+        const ctx = setup(canvas, title);
+        const n = data.labels.length;
+        const cells = Uint8Array.from(atob(data.int8), c => c.charCodeAt(0));
+        const labelled = n <= 30;
+        const margin = labelled ? 60 : 10;
+        const size = Math.min(canvas.width - margin - 10, canvas.height - margin - 30);
+        const cell = size / n;
+        const image = ctx.createImageData(Math.max(1, Math.round(size)), Math.max(1, Math.round(size)));
+        for (let py = 0; py < image.height; py++) {
+            for (let px = 0; px < image.width; px++) {
+                const raw = cells[Math.floor(py / cell) * n + Math.floor(px / cell)];
+                const v = (raw > 127 ? raw - 256 : raw) / data.scale;
+                // Blue (-1) through white (0) to red (+1)
+                const k = (py * image.width + px) * 4;
+                image.data[k] = v < 0 ? 255 * (1 + v) : 255;
+                image.data[k + 1] = 255 * (1 - Math.abs(v));
+                image.data[k + 2] = v > 0 ? 255 * (1 - v) : 255;
+                image.data[k + 3] = 255;
+            }
+        }
+        ctx.putImageData(image, margin, 30);
+        if (labelled) {
+            ctx.fillStyle = '#222';
+            ctx.textAlign = 'right';
+            data.labels.forEach((label, i) => ctx.fillText(label, margin - 4, 30 + (i + 0.7) * cell));
+        }
+    }
+
+    const RENDERERS = {
+        allocation: [pie, 'Portfolio Allocation by Holdings'],
+        sector: [pie, 'Sector Distribution'],
+        performance: [line, 'Portfolio Performance Over Time'],
+        risk: [bar, 'Risk Metrics Overview'],
+        correlation: [heatmap, 'Asset Correlation Matrix']
+    };
+
+    document.addEventListener('DOMContentLoaded', () => {
+        const source = document.getElementById('chart-data');
+        if (!source) return;
+        const charts = JSON.parse(source.textContent);
+        document.querySelectorAll('canvas[data-chart]').forEach(canvas => {
+            const name = canvas.dataset.chart;
+            if (charts[name] && RENDERERS[name]) {
+                const [draw, title] = RENDERERS[name];
+                draw(canvas, charts[name], title);
+            }
+        });
+    });
+})();
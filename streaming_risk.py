@@ -0,0 +1,195 @@
+import json
+import math
+
+TRADING_DAYS = 252
+
+
+class RunningMoments:
+    """Mean and variance of a stream using Welford's algorithm, in O(1) memory"""
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        """Sample variance (ddof=1), matching pandas' std()"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+
+class RunningSharpe:
+    """Annualised volatility and Sharpe ratio of a stream of daily returns"""
+
+    def __init__(self, moments=None, risk_free_rate=0.02):
+        self.moments = moments or RunningMoments()
+        self.risk_free_rate = risk_free_rate
+
+    def update(self, daily_return):
+        self.moments.update(daily_return)
+
+    @property
+    def volatility(self):
+        return self.moments.std * math.sqrt(TRADING_DAYS)
+
+    @property
+    def value(self):
+        volatility = self.volatility
+        if self.moments.count < 2 or volatility <= 0:
+            return 0.0
+        return (self.moments.mean * TRADING_DAYS - self.risk_free_rate) / volatility
+
+
+class RunningDrawdown:
+    """Running peak and maximum drawdown of a wealth index built from returns"""
+
+    def __init__(self, wealth=1.0, peak=1.0, max_drawdown=0.0):
+        self.wealth = wealth
+        self.peak = peak
+        self.max_drawdown = max_drawdown
+
+    def update(self, daily_return):
+        self.wealth *= 1 + daily_return
+        self.peak = max(self.peak, self.wealth)
+        self.max_drawdown = min(self.max_drawdown, self.current_drawdown)
+
+    @property
+    def current_drawdown(self):
+        return self.wealth / self.peak - 1
+
+
+class PortfolioRiskState:
+    """The streaming estimators the analyzer persists in risk_state.
+
+    update() folds in one daily return in O(1); copy() lets an intraday tick
+    be applied provisionally without touching the stored end-of-day state.
+    The 5% return quantile (95% VaR) is tracked with a P2Quantile sketch.
+    """
+
+    def __init__(self, last_date=None, last_value=None, count=0, mean=0.0, m2=0.0,
+                 wealth=1.0, peak=1.0, max_drawdown=0.0, var_sketch=None, risk_free_rate=0.02):
+        self.last_date = last_date
+        self.last_value = last_value
+        self.sharpe = RunningSharpe(RunningMoments(count, mean, m2), risk_free_rate)
+        self.drawdown = RunningDrawdown(wealth, peak, max_drawdown)
+        self.var = P2Quantile.from_dict(json.loads(var_sketch)) if var_sketch else P2Quantile(0.05)
+
+    @classmethod
+    def from_row(cls, row, risk_free_rate=0.02):
+        return cls(*row, risk_free_rate=risk_free_rate)
+
+    def to_row(self):
+        """Values in risk_state column order"""
+        moments = self.sharpe.moments
+        return (self.last_date, self.last_value, moments.count, moments.mean, moments.m2,
+                self.drawdown.wealth, self.drawdown.peak, self.drawdown.max_drawdown,
+                json.dumps(self.var.to_dict()))
+
+    def copy(self):
+        return PortfolioRiskState.from_row(self.to_row(), self.sharpe.risk_free_rate)
+
+    def update(self, daily_return, date=None, value=None):
+        self.sharpe.update(daily_return)
+        self.drawdown.update(daily_return)
+        self.var.update(daily_return)
+        if date is not None:
+            self.last_date = date
+        if value is not None:
+            self.last_value = value
+
+    @property
+    def count(self):
+        return self.sharpe.moments.count
+
+    def metrics(self):
+        return {
+            'volatility': self.sharpe.volatility,
+            'sharpe_ratio': self.sharpe.value,
+            'max_drawdown': self.drawdown.max_drawdown,
+            'current_drawdown': self.drawdown.current_drawdown,
+            'var_95': self.var.value
+        }
+
+
+class P2Quantile:
+    """Streaming quantile estimate with the P-squared algorithm (Jain & Chlamtac, 1985).
+
+    Keeps five markers regardless of how many observations it has seen, so a
+    new return is absorbed in O(1) time and memory.
+    """
+
+    def __init__(self, p=0.05, heights=None, positions=None, desired=None, count=0):
+        self.p = p
+        self.heights = list(heights or [])
+        self.positions = list(positions or [1, 2, 3, 4, 5])
+        self.desired = list(desired or [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5])
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+        self.count = count
+
+    def update(self, x):
+        self.count += 1
+        q = self.heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        n = self.positions
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                candidate = self._parabolic(i, d)
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = candidate
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.positions
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self):
+        if not self.heights:
+            return 0.0
+        if len(self.heights) < 5:
+            # Too few points for the markers; interpolate like np.percentile
+            ordered = sorted(self.heights)
+            h = (len(ordered) - 1) * self.p
+            low = int(h)
+            high = min(low + 1, len(ordered) - 1)
+            return ordered[low] + (h - low) * (ordered[high] - ordered[low])
+        return self.heights[2]
+
+    def to_dict(self):
+        return {'p': self.p, 'heights': self.heights, 'positions': self.positions,
+                'desired': self.desired, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
@@ -0,0 +1,178 @@
+from statistics import NormalDist
+import numpy as np
+from streaming_risk import P2Quantile
+from worker_pool import pool_map
+
+VAR_METHODS = ('percentile', 'exact', 'streaming')
+RISK_MODELS = ('historical', 'parametric', 'monte_carlo')
+
+
+def historical_var(returns, confidence=0.95, window=None):
+    """Historical VaR as the (1 - confidence) return quantile, via np.partition.
+
+    Selects only the two order statistics the quantile needs instead of
+    sorting, and interpolates between them exactly like np.percentile's
+    default linear method. window keeps only the most recent observations.
+    """
+    values = np.asarray(returns, dtype=float)
+    if window is not None:
+        values = values[-window:]
+    if values.size == 0:
+        return 0.0
+    h = (values.size - 1) * (1 - confidence)
+    low = int(np.floor(h))
+    high = min(low + 1, values.size - 1)
+    part = np.partition(values, [low, high])
+    return part[low] + (h - low) * (part[high] - part[low])
+
+
+class StreamingVaR:
+    """Bounded-memory VaR from a P-squared quantile sketch"""
+
+    def __init__(self, confidence=0.95, sketch=None):
+        self.confidence = confidence
+        self.sketch = sketch or P2Quantile(1 - confidence)
+
+    def update(self, daily_return):
+        self.sketch.update(daily_return)
+
+    def update_many(self, returns):
+        for r in returns:
+            self.sketch.update(float(r))
+
+    @property
+    def value(self):
+        return self.sketch.value
+
+
+def portfolio_var(returns, method='percentile', confidence=0.95, window=252):
+    """Dispatch VaR on a return series to one of VAR_METHODS.
+
+    'streaming' pays off only when a P2 sketch is kept and fed one day at a
+    time, as calculate_incremental_metrics does with the stored risk state.
+    Building a sketch over a whole series is hundreds of times slower than
+    np.percentile, so a one-shot call with 'streaming' gets the exact quantile.
+    """
+    if method == 'percentile':
+        return np.percentile(returns, (1 - confidence) * 100)
+    if method in ('exact', 'streaming'):
+        return historical_var(returns, confidence, window)
+    raise ValueError(f"Unknown VaR method: {method} (expected one of {VAR_METHODS})")
+
+
+def _tail_stats(portfolio_returns, confidence_levels):
+    # VaR is the (1 - c) quantile of the return distribution; CVaR the mean return at or below it
+    results = {}
+    for confidence in confidence_levels:
+        var = historical_var(portfolio_returns, confidence)
+        tail = portfolio_returns[portfolio_returns <= var]
+        results[confidence] = {'var': float(var), 'cvar': float(tail.mean()) if tail.size else float(var)}
+    return results
+
+
+def historical_var_cvar(portfolio_returns, confidence_levels=(0.95, 0.99)):
+    """Historical VaR and CVaR (expected shortfall) of a return series"""
+    return _tail_stats(np.asarray(portfolio_returns, dtype=float), confidence_levels)
+
+
+def parametric_var_cvar(weights, cov, mean=None, confidence_levels=(0.95, 0.99)):
+    """Variance-covariance (normal) VaR and CVaR of a weighted portfolio"""
+    weights = np.asarray(weights, dtype=float)
+    mu = float(weights @ mean) if mean is not None else 0.0
+    sigma = float(np.sqrt(weights @ cov @ weights))
+    normal = NormalDist()
+    results = {}
+    for confidence in confidence_levels:
+        z = normal.inv_cdf(1 - confidence)
+        results[confidence] = {
+            'var': mu + z * sigma,
+            'cvar': mu - sigma * normal.pdf(z) / (1 - confidence)
+        }
+    return results
+
+
+def cholesky_factor(cov):
+    """Lower Cholesky factor, adding diagonal jitter if cov is only semi-definite"""
+    cov = np.asarray(cov, dtype=float)
+    jitter = 0.0
+    scale = np.mean(np.diag(cov)) or 1.0
+    for _ in range(8):
+        try:
+            return np.linalg.cholesky(cov + jitter * np.eye(len(cov)))
+        except np.linalg.LinAlgError:
+            jitter = max(jitter * 10, scale * 1e-10)
+    raise np.linalg.LinAlgError("Covariance matrix is not positive semi-definite")
+
+
+def _simulate_block(args):
+    # Draw n scenarios in chunks; only the (n, P) portfolio returns are kept
+    factor, weight_matrix, mean, n, chunk_size, seed, dtype = args
+    rng = np.random.default_rng(seed)
+    n_assets = factor.shape[0]
+    out = np.empty((n, weight_matrix.shape[0]), dtype=dtype)
+    factor_t = factor.T.astype(dtype)
+    weights_t = weight_matrix.T.astype(dtype)
+    for start in range(0, n, chunk_size):
+        rows = min(chunk_size, n - start)
+        shocks = rng.standard_normal((rows, n_assets), dtype=dtype)
+        asset_returns = shocks @ factor_t
+        if mean is not None:
+            asset_returns += mean.astype(dtype)
+        out[start:start + rows] = asset_returns @ weights_t
+    return out
+
+
+def monte_carlo_var_cvar(weights, cov, mean=None, confidence_levels=(0.95, 0.99), n_scenarios=100_000,
+                         memory_budget_mb=256, seed=0, n_jobs=1, dtype=np.float64):
+    """Monte Carlo VaR and CVaR from correlated normal scenarios.
+
+    Scenarios are generated as batched GEMMs (shocks @ L.T, then @ W.T) with
+    L the Cholesky factor of cov. Chunks are sized so the shock and asset
+    return blocks stay within memory_budget_mb, so 1M scenarios x 500 assets
+    never materialises the full scenario matrix. weights may be a vector or a
+    P x N matrix to price several portfolios on the same scenarios; n_jobs > 1
+    splits the scenarios into n_jobs blocks with independent random streams
+    and runs them on the shared worker_pool.
+    Returns one {confidence: {'var', 'cvar'}} dict, or a list of P of them.
+    """
+    weights = np.asarray(weights, dtype=float)
+    weight_matrix = np.atleast_2d(weights)
+    factor = cholesky_factor(cov)
+    mean = None if mean is None else np.asarray(mean, dtype=float)
+    n_assets = factor.shape[0]
+    bytes_per_row = 2 * n_assets * np.dtype(dtype).itemsize
+    chunk_size = max(1, min(n_scenarios, int(memory_budget_mb * 2**20 // (bytes_per_row * max(n_jobs, 1)))))
+
+    n_blocks = max(1, n_jobs)
+    block_sizes = [n_scenarios // n_blocks + (1 if i < n_scenarios % n_blocks else 0) for i in range(n_blocks)]
+    seeds = np.random.SeedSequence(seed).spawn(n_blocks)
+    jobs = [(factor, weight_matrix, mean, size, chunk_size, s, dtype) for size, s in zip(block_sizes, seeds) if size]
+    if n_jobs > 1:
+        blocks = pool_map(_simulate_block, jobs)
+    else:
+        blocks = [_simulate_block(job) for job in jobs]
+    portfolio_returns = np.concatenate(blocks).astype(float)
+
+    results = [_tail_stats(portfolio_returns[:, p], confidence_levels) for p in range(weight_matrix.shape[0])]
+    return results[0] if weights.ndim == 1 else results
+
+
+def var_cvar_report(returns, weights, models=RISK_MODELS, confidence_levels=(0.95, 0.99), cov=None, **mc_options):
+    """VaR/CVaR per model from an asset returns frame and a weight vector aligned to its columns.
+
+    cov overrides the sample covariance of returns, e.g. a cached or shrunk estimate.
+    """
+    asset_returns = np.asarray(returns, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    report = {}
+    if 'historical' in models:
+        report['historical'] = historical_var_cvar(asset_returns @ weights, confidence_levels)
+    if 'parametric' in models or 'monte_carlo' in models:
+        mean = asset_returns.mean(axis=0)
+        if cov is None:
+            cov = np.cov(asset_returns, rowvar=False).reshape(len(weights), len(weights))
+        if 'parametric' in models:
+            report['parametric'] = parametric_var_cvar(weights, cov, mean, confidence_levels)
+        if 'monte_carlo' in models:
+            report['monte_carlo'] = monte_carlo_var_cvar(weights, cov, mean, confidence_levels, **mc_options)
+    return report
@@ -1,12 +1,14 @@
-from flask import Flask, render_template_string, send_file, redirect, url_for
+from flask import Flask, render_template_string, send_file, redirect, url_for, jsonify, request
 import os
-import base64
+import re
+import json
 import io
+import threading
+from collections import OrderedDict
 import sqlite3
 import pandas as pd
 import numpy as np
 import yfinance as yf
-import matplotlib.pyplot as plt
 import seaborn as sns
 import matplotlib
 matplotlib.use('Agg')
@@ -15,6 +17,12 @@ warnings.filterwarnings('ignore')
 
 # Import your existing analyzer
 from portfolio_analyzer import WebPortfolioRiskAnalyzer
+import charts
+from chart_cache import chart_key
+from report_queue import ReportQueue
+from snapshot import SnapshotScheduler
+import api_payloads
+import arrow_export
 
 app = Flask(__name__)
 
@@ -413,6 +421,9 @@ DASHBOARD_TEMPLATE = """
                 <i class="fas fa-chart-line me-2"></i>Portfolio Risk Analyzer
             </a>
             <div class="d-flex gap-2">
+                <span id="report-status" class="text-muted small align-self-center" data-job="{{ report_job }}">
+                    <i class="fas fa-spinner fa-spin me-1"></i>Building report...
+                </span>
                 <a href="/view-pdf" target="_blank" class="btn btn-outline-info btn-sm">
                     <i class="fas fa-eye me-1"></i>View PDF
                 </a>
@@ -434,9 +445,10 @@ DASHBOARD_TEMPLATE = """
                     <i class="fas fa-dashboard me-2"></i>Portfolio Risk Dashboard
                 </h1>
                 <p class="lead text-muted">Real-time analysis with professional risk metrics</p>
-                <p class="text-success">
-                    <i class="fas fa-sync-alt me-1"></i>
-                    Last updated: {{ last_updated }}
+                <p class="{{ 'text-warning' if stale else 'text-success' }}">
+                    <i class="fas fa-sync-alt me-1{{ ' fa-spin' if refreshing else '' }}"></i>
+                    Last updated: {{ last_updated }} ({{ data_age }} ago){% if refreshing %} - refreshing in the background{% endif %}
+                    <a id="snapshot-newer" href="" class="ms-2 d-none" data-version="{{ snapshot_version }}">Newer data available - reload</a>
                 </p>
             </div>
         </div>
@@ -565,7 +577,7 @@ DASHBOARD_TEMPLATE = """
                         <i class="fas fa-pie-chart me-2 text-primary"></i>Portfolio Allocation
                     </h5>
                     <div class="text-center">
-                        <img src="{{ allocation_chart }}" class="img-fluid" alt="Portfolio Allocation" style="max-height: 400px;">
+                        {% if chart_mode == 'json' %}<canvas data-chart="allocation" width="800" height="400" style="max-width: 100%;"></canvas>{% else %}<img src="{{ allocation_chart }}" class="img-fluid" alt="Portfolio Allocation" style="max-height: 400px;">{% endif %}
                     </div>
                 </div>
             </div>
@@ -576,7 +588,7 @@ DASHBOARD_TEMPLATE = """
                         <i class="fas fa-building me-2 text-success"></i>Sector Distribution
                     </h5>
                     <div class="text-center">
-                        <img src="{{ sector_chart }}" class="img-fluid" alt="Sector Allocation" style="max-height: 400px;">
+                        {% if chart_mode == 'json' %}<canvas data-chart="sector" width="800" height="400" style="max-width: 100%;"></canvas>{% else %}<img src="{{ sector_chart }}" class="img-fluid" alt="Sector Allocation" style="max-height: 400px;">{% endif %}
                     </div>
                 </div>
             </div>
@@ -588,7 +600,7 @@ DASHBOARD_TEMPLATE = """
                         <i class="fas fa-line-chart me-2 text-info"></i>Performance Trend
                     </h5>
                     <div class="text-center">
-                        <img src="{{ performance_chart }}" class="img-fluid" alt="Performance" style="max-height: 400px;">
+                        {% if chart_mode == 'json' %}<canvas data-chart="performance" width="800" height="400" style="max-width: 100%;"></canvas>{% else %}<img src="{{ performance_chart }}" class="img-fluid" alt="Performance" style="max-height: 400px;">{% endif %}
                     </div>
                 </div>
             </div>
@@ -600,7 +612,7 @@ DASHBOARD_TEMPLATE = """
                         <i class="fas fa-shield-alt me-2 text-warning"></i>Risk Metrics
                     </h5>
                     <div class="text-center">
-                        <img src="{{ risk_chart }}" class="img-fluid" alt="Risk Metrics" style="max-height: 400px;">
+                        {% if chart_mode == 'json' %}<canvas data-chart="risk" width="800" height="400" style="max-width: 100%;"></canvas>{% else %}<img src="{{ risk_chart }}" class="img-fluid" alt="Risk Metrics" style="max-height: 400px;">{% endif %}
                     </div>
                 </div>
             </div>
@@ -612,7 +624,7 @@ DASHBOARD_TEMPLATE = """
                         <i class="fas fa-network-wired me-2 text-danger"></i>Asset Correlation Matrix
                     </h5>
                     <div class="text-center">
-                        <img src="{{ correlation_chart }}" class="img-fluid" alt="Correlation Matrix" style="max-height: 500px;">
+                        {% if chart_mode == 'json' %}<canvas data-chart="correlation" width="1000" height="500" style="max-width: 100%;"></canvas>{% else %}<img src="{{ correlation_chart }}" class="img-fluid" alt="Correlation Matrix" style="max-height: 500px;">{% endif %}
                     </div>
                     <p class="text-muted text-center mt-3">
                         <small>
@@ -710,128 +722,223 @@ DASHBOARD_TEMPLATE = """
             </div>
         </div>
     </div>
+    <script>
+        // Poll the background report job so the PDF buttons reflect when it is ready
+        (function pollReport() {
+            const status = document.getElementById('report-status');
+            fetch('/reports/' + status.dataset.job).then(r => r.json()).then(job => {
+                if (job.status === 'superseded') {
+                    // A newer page view replaced this job; follow the one that will run
+                    status.dataset.job = job.superseded_by;
+                    pollReport();
+                } else if (job.status === 'queued' || job.status === 'running') {
+                    setTimeout(pollReport, 1000);
+                } else {
+                    status.textContent = job.status === 'done' ? 'Report ready' : 'Report ' + job.status;
+                }
+            });
+        })();
+
+        // Offer a reload once the background analysis has produced a newer snapshot
+        (function pollSnapshot() {
+            const link = document.getElementById('snapshot-newer');
+            fetch('/snapshot').then(r => r.json()).then(snapshot => {
+                if (snapshot.version > Number(link.dataset.version)) {
+                    link.classList.remove('d-none');
+                } else {
+                    setTimeout(pollSnapshot, snapshot.refreshing ? 2000 : 30000);
+                }
+            });
+        })();
+    </script>
+    {% if chart_mode == 'json' %}
+    <script id="chart-data" type="application/json">{{ chart_json|safe }}</script>
+    <script src="/chart_renderer.js"></script>
+    {% endif %}
 </body>
 </html>
 """
 
 # Extended Web Analyzer Class
 class WebAnalyzer(WebPortfolioRiskAnalyzer):
-    def create_embedded_charts(self, metrics):
-        """Create charts as base64 embedded images"""
-        charts = {}
-        plt.style.use('default')
-        
-        # 1. Portfolio Allocation
-        fig, ax = plt.subplots(figsize=(8, 6))
-        portfolio_df = metrics['portfolio_df']
-        colors = plt.cm.Set3(np.linspace(0, 1, len(portfolio_df)))
-        
-        wedges, texts, autotexts = ax.pie(
-            portfolio_df['current_value'], 
-            labels=portfolio_df['symbol'], 
-            autopct='%1.1f%%',
-            colors=colors,
-            explode=[0.05]*len(portfolio_df)
-        )
-        
-        ax.set_title('Portfolio Allocation by Holdings', fontsize=14, fontweight='bold', pad=20)
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        charts['allocation'] = self.fig_to_data_url(fig)
-        plt.close()
-
-        # 2. Sector Allocation
-        fig, ax = plt.subplots(figsize=(8, 6))
+    def chart_inputs(self, metrics):
+        """Plain arrays behind each dashboard chart, shared by the PNG and JSON modes"""
+        portfolio_df = metrics['positions_df']
         # Create better sector mapping
-        portfolio_df['sector_mapped'] = portfolio_df['symbol'].map({
+        sector_mapped = portfolio_df['symbol'].map({
             'AAPL': 'Technology', 'MSFT': 'Technology', 'GOOGL': 'Technology', 'TSLA': 'Technology',
             'SPY': 'Broad Market ETF', 'BND': 'Fixed Income', 'GLD': 'Commodities'
-        })
-        
-        sector_data = portfolio_df.groupby('sector_mapped')['current_value'].sum()
-        colors = plt.cm.Set2(np.linspace(0, 1, len(sector_data)))
-        
-        wedges, texts, autotexts = ax.pie(sector_data.values, labels=sector_data.index, 
-                                         autopct='%1.1f%%', colors=colors)
-        ax.set_title('Sector Distribution', fontsize=14, fontweight='bold', pad=20)
-        
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
-        
-        charts['sector'] = self.fig_to_data_url(fig)
-        plt.close()
-
-        # 3. Performance Chart
-        if not metrics['price_data'].empty:
-            fig, ax = plt.subplots(figsize=(10, 5))
-            price_data = metrics['price_data']
-            weights = portfolio_df['weight'].values / 100
-            portfolio_performance = (price_data * weights).sum(axis=1)
-            portfolio_performance = (portfolio_performance / portfolio_performance.iloc[0] - 1) * 100
-            
-            ax.plot(portfolio_performance.index, portfolio_performance.values, 
-                   linewidth=2, color='#2E86C1')
-            ax.fill_between(portfolio_performance.index, portfolio_performance.values, 
-                           alpha=0.3, color='#2E86C1')
-            ax.set_title('Portfolio Performance Over Time', fontsize=14, fontweight='bold')
-            ax.set_ylabel('Return (%)')
-            ax.grid(True, alpha=0.3)
-            plt.xticks(rotation=45)
-            
-            charts['performance'] = self.fig_to_data_url(fig)
-            plt.close()
-
-        # 4. Risk Metrics Bar Chart
-        fig, ax = plt.subplots(figsize=(8, 5))
+        }).fillna(portfolio_df['sector'])
+        sector_data = portfolio_df.groupby(sector_mapped)['current_value'].sum()
         risk_data = {
             'Volatility': metrics['portfolio_volatility'] * 100,
             'VaR 95%': abs(metrics['portfolio_var_95']) * 100,
             'Max Drawdown': abs(metrics['max_drawdown']) * 100,
             'Sharpe Ratio': metrics['sharpe_ratio']
         }
-        
-        colors = ['#E74C3C', '#F39C12', '#8E44AD', '#27AE60']
-        bars = ax.bar(risk_data.keys(), risk_data.values(), color=colors)
-        ax.set_title('Risk Metrics Overview', fontsize=14, fontweight='bold')
-        
-        for bar in bars:
-            height = bar.get_height()
-            ax.annotate(f'{height:.2f}',
-                       xy=(bar.get_x() + bar.get_width() / 2, height),
-                       xytext=(0, 3), textcoords="offset points",
-                       ha='center', va='bottom', fontweight='bold')
-        
-        plt.xticks(rotation=45)
-        charts['risk'] = self.fig_to_data_url(fig)
-        plt.close()
-
-        # 5. Correlation Heatmap
+        inputs = {
+            'allocation': {'labels': portfolio_df['symbol'].tolist(), 'values': portfolio_df['current_value'].to_numpy()},
+            'sector': {'labels': sector_data.index.tolist(), 'values': sector_data.to_numpy()},
+            'risk': {'labels': list(risk_data), 'values': np.array([float(v) for v in risk_data.values()])}
+        }
+        if not metrics['price_data'].empty:
+            performance = self.performance_series(metrics)
+            inputs['performance'] = {'dates': performance.index.to_numpy(), 'values': performance.to_numpy()}
         if not metrics['correlation_matrix'].empty:
-            fig, ax = plt.subplots(figsize=(8, 6))
-            sns.heatmap(metrics['correlation_matrix'], 
-                       annot=True, cmap='RdYlBu_r', center=0,
-                       square=True, fmt='.2f')
-            ax.set_title('Asset Correlation Matrix', fontsize=14, fontweight='bold')
-            
-            charts['correlation'] = self.fig_to_data_url(fig)
-            plt.close()
+            inputs['correlation'] = {'labels': metrics['correlation_matrix'].columns.tolist(),
+                                     'matrix': metrics['correlation_matrix'].to_numpy()}
+        return inputs
 
-        return charts
-    
-    def fig_to_data_url(self, fig):
-        """Convert matplotlib figure to data URL"""
-        img_buffer = io.BytesIO()
-        fig.savefig(img_buffer, format='png', dpi=150, bbox_inches='tight')
-        img_buffer.seek(0)
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
-        return f"data:image/png;base64,{img_str}"
+    def dashboard_chart_tasks(self, metrics):
+        """The dashboard's PNG charts as (name, renderer, kwargs) tasks, without rendering them"""
+        common = {'dpi': 150, 'title_size': 14}
+        inputs = self.chart_inputs(metrics)
+        tasks = [
+            ('allocation', charts.pie_chart, dict(
+                **inputs['allocation'], title='Portfolio Allocation by Holdings', figsize=(8, 6), explode=0.05,
+                **common)),
+            ('sector', charts.pie_chart, dict(
+                **inputs['sector'], title='Sector Distribution', figsize=(8, 6), cmap='Set2', **common))
+        ]
+        if 'performance' in inputs:
+            tasks.append(('performance', charts.line_chart, dict(
+                **inputs['performance'], title='Portfolio Performance Over Time', ylabel='Return (%)',
+                figsize=(10, 5), linewidth=2, alpha=1.0, **common)))
+        tasks.append(('risk', charts.bar_chart, dict(
+            **inputs['risk'], title='Risk Metrics Overview', figsize=(8, 5),
+            colors=['#E74C3C', '#F39C12', '#8E44AD', '#27AE60'], **common)))
+        if 'correlation' in inputs:
+            tasks.append(('correlation', charts.heatmap_chart, dict(
+                **inputs['correlation'], title='Asset Correlation Matrix', figsize=(8, 6), cbar_shrink=1.0,
+                **common)))
+        return tasks
+
+    def chart_data(self, metrics):
+        """Compact JSON-ready chart series for the client-side renderer (static/chart_renderer.js).
+
+        Values are rounded to what the charts can show and the correlation
+        matrix is quantized to int8, so nothing is rasterized on the server.
+        """
+        inputs = self.chart_inputs(metrics)
+        data = {name: {'labels': inputs[name]['labels'], 'values': np.round(inputs[name]['values'], 2).tolist()}
+                for name in ('allocation', 'sector', 'risk')}
+        if 'performance' in inputs:
+            data['performance'] = {
+                'dates': pd.DatetimeIndex(inputs['performance']['dates']).strftime('%Y-%m-%d').tolist(),
+                'values': np.round(inputs['performance']['values'], 3).tolist()
+            }
+        if 'correlation' in inputs:
+            data['correlation'] = {'labels': inputs['correlation']['labels'],
+                                   **charts.quantize_correlation(inputs['correlation']['matrix'])}
+        return data
 
 # Initialize the analyzer
 analyzer = WebAnalyzer()
 
+# Chart tasks of recent snapshots by cache key, so /charts/<key>.png can draw a PNG on first request;
+# pages from a replaced snapshot keep working for a while
+PENDING_CHARTS = 50
+pending_charts = OrderedDict()
+pending_charts_lock = threading.Lock()
+chart_render_locks = {}
+
+def remember_chart_tasks(tasks):
+    """Record tasks for on-demand rendering; returns {name: cache key}"""
+    keys = {}
+    with pending_charts_lock:
+        for task in tasks:
+            key = keys[task[0]] = chart_key(task[1], task[2])
+            pending_charts[key] = task
+            pending_charts.move_to_end(key)
+        while len(pending_charts) > PENDING_CHARTS:
+            pending_charts.popitem(last=False)
+    return keys
+
+def render_pending_chart(key):
+    """PNG for a remembered chart task, rendered once however many requests ask for it; None if unknown"""
+    with pending_charts_lock:
+        task = pending_charts.get(key)
+        if task is None:
+            return None
+        lock = chart_render_locks.setdefault(key, threading.Lock())
+    with lock:
+        # Counted, so /chart-cache shows one miss per chart actually drawn
+        png = analyzer.chart_cache.get(key)
+        if png is None:
+            png = charts.render_chart(task, analyzer.chart_cache)
+    with pending_charts_lock:
+        chart_render_locks.pop(key, None)
+    return png
+report_queue = ReportQueue(lambda metrics, alerts, path: analyzer.generate_pdf_report(metrics, alerts, path))
+
+def build_snapshot():
+    """One full analysis pass for the dashboard, run by the snapshot scheduler off the request path"""
+    print("🔄 Running portfolio analysis...")
+    metrics = analyzer.calculate_portfolio_metrics()
+    if not metrics:
+        return {'metrics': None}
+
+    # Check compliance
+    alerts = analyzer.check_risk_compliance(metrics)
+    alert_messages = []
+    for alert in alerts:
+        if isinstance(alert, dict):
+            alert_messages.append(alert.get('message', str(alert)))
+        else:
+            alert_messages.append(str(alert))
+
+    # Check if static images exist (from your original run)
+    static_images_exist = (
+        os.path.exists('portfolio_dashboard.png') or
+        os.path.exists('correlation_matrix.png')
+    )
+    if static_images_exist:
+        # Move images to static folder if they exist
+        if not os.path.exists('static'):
+            os.makedirs('static')
+        for img_file in ['portfolio_dashboard.png', 'correlation_matrix.png']:
+            if os.path.exists(img_file):
+                import shutil
+                shutil.copy(img_file, f'static/{img_file}')
+
+    # Parquet/Arrow copies of the exact frames behind this snapshot, for notebooks and the warehouse
+    try:
+        export = analyzer.export_metrics(metrics, alert_messages, directory=EXPORT_DIR)
+    except ImportError:
+        export = None
+
+    # Both chart modes are prepared here so a page view only fills in the template. PNGs
+    # are only hashed here; each is drawn the first time a browser asks for it
+    chart_data = analyzer.chart_data(metrics)
+    chart_keys = remember_chart_tasks(analyzer.dashboard_chart_tasks(metrics))
+    snapshot = {
+        'metrics': metrics,
+        'alerts': alert_messages,
+        'static_images_exist': static_images_exist,
+        'holdings': metrics['portfolio_df'].to_dict('records'),
+        'chart_keys': chart_keys,
+        'chart_json': json.dumps(chart_data, separators=(',', ':')).replace('</', '<\\/'),
+        'json_charts': list(chart_data),
+        'export_id': export['id'] if export else None,
+        # One PDF per snapshot; /download-pdf serves the latest finished one
+        'report_job': report_queue.submit(metrics, alerts)
+    }
+    print("✅ Analysis complete!")
+    return snapshot
+
+EXPORT_DIR = os.environ.get('EXPORT_DIR', os.path.splitext(analyzer.db_name)[0] + '_exports')
+
+# Recomputed every SNAPSHOT_INTERVAL seconds or as soon as holdings or risk limits change
+SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', 300))
+snapshots = SnapshotScheduler(build_snapshot, interval=SNAPSHOT_INTERVAL, data_version=analyzer.data_version)
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f} min"
+    return f"{seconds / 3600:.1f} h"
+
 @app.route('/')
 def home():
     return render_template_string(HOME_TEMPLATE)
@@ -839,65 +946,54 @@ def home():
 @app.route('/dashboard')
 def dashboard():
     try:
-        print("🔄 Running portfolio analysis...")
-        
-        # Run the full analysis
-        metrics = analyzer.calculate_portfolio_metrics()
-        if not metrics:
+        # Serve the latest snapshot at once; only the very first view waits for an analysis
+        snapshot = snapshots.start().get() or snapshots.wait(timeout=120)
+        if snapshot is None:
+            return ("⏳ The first portfolio analysis is still running. This page will reload shortly.",
+                    503, {'Retry-After': '10', 'Refresh': '10'})
+        if snapshot['metrics'] is None:
             return "❌ No portfolio data found! Please check if portfolio.db exists.", 404
-        
-        # Check compliance
-        alerts = analyzer.check_risk_compliance(metrics)
-        alert_messages = []
-        for alert in alerts:
-            if isinstance(alert, dict):
-                alert_messages.append(alert.get('message', str(alert)))
-            else:
-                alert_messages.append(str(alert))
-        
-        # Generate PDF report
-        analyzer.generate_pdf_report(metrics, alerts)
-        
-        # Check if static images exist (from your original run)
-        static_images_exist = (
-            os.path.exists('portfolio_dashboard.png') or 
-            os.path.exists('correlation_matrix.png')
-        )
-        
-        if static_images_exist:
-            # Move images to static folder if they exist
-            if not os.path.exists('static'):
-                os.makedirs('static')
-            
-            for img_file in ['portfolio_dashboard.png', 'correlation_matrix.png']:
-                if os.path.exists(img_file):
-                    import shutil
-                    shutil.copy(img_file, f'static/{img_file}')
-        
-        # Create embedded charts as backup
-        charts = analyzer.create_embedded_charts(metrics)
-        
+        # Stale-while-revalidate: show what we have and recompute in the background
+        if snapshots.is_stale():
+            snapshots.refresh()
+        metrics = snapshot['metrics']
+
+        # Charts are served from /charts/ so the browser can cache them, or with
+        # ?charts=json sent as compact series that the browser draws itself
+        chart_mode = request.args.get('charts', 'png')
+        if chart_mode == 'json':
+            chart_urls = {name: name for name in snapshot['json_charts']}
+        else:
+            chart_urls = {name: url_for('chart_image', key=key) for name, key in snapshot['chart_keys'].items()}
+
         # Prepare template data
         from datetime import datetime
+        status = snapshots.status()
         template_data = {
-            'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'last_updated': datetime.fromtimestamp(snapshot.computed_at).strftime('%Y-%m-%d %H:%M:%S'),
+            'data_age': format_age(snapshot.age()),
+            'stale': status['stale'],
+            'refreshing': status['refreshing'] or status['stale'],
+            'snapshot_version': snapshot.version,
             'total_value': metrics['total_value'],
             'volatility': metrics['portfolio_volatility'], 
             'var_95': metrics['portfolio_var_95'],
             'sharpe_ratio': metrics['sharpe_ratio'],
             'max_drawdown': metrics['max_drawdown'],
             'holdings_count': len(metrics['portfolio_df']),
-            'holdings': metrics['portfolio_df'].to_dict('records'),
-            'alerts': alert_messages,
-            'use_static_images': static_images_exist,
-            'allocation_chart': charts.get('allocation', ''),
-            'sector_chart': charts.get('sector', ''),
-            'performance_chart': charts.get('performance', ''),
-            'risk_chart': charts.get('risk', ''),
-            'correlation_chart': charts.get('correlation', '')
+            'holdings': snapshot['holdings'],
+            'alerts': snapshot['alerts'],
+            'use_static_images': snapshot['static_images_exist'] and chart_mode != 'json',
+            'chart_mode': chart_mode,
+            'report_job': snapshot['report_job'],
+            'chart_json': snapshot['chart_json'] if chart_mode == 'json' else '',
+            'allocation_chart': chart_urls.get('allocation', ''),
+            'sector_chart': chart_urls.get('sector', ''),
+            'performance_chart': chart_urls.get('performance', ''),
+            'risk_chart': chart_urls.get('risk', ''),
+            'correlation_chart': chart_urls.get('correlation', '')
         }
         
-        print("✅ Analysis complete! Rendering dashboard...")
         return render_template_string(DASHBOARD_TEMPLATE, **template_data)
         
     except Exception as e:
@@ -919,22 +1015,190 @@ def static_files(filename):
     except:
         return "File not found", 404
 
+@app.route('/charts/<key>.png')
+def chart_image(key):
+    """Serve a chart, drawing it on first request; the key is a hash of its inputs, so the image never changes"""
+    # Serving an already cached image is not counted in the /chart-cache hit rate
+    if not re.fullmatch('[0-9a-f]{64}', key):
+        return "Chart not found", 404
+    png = analyzer.chart_cache.get(key, record=False) or render_pending_chart(key)
+    if png is None:
+        return "Chart not found", 404
+    response = send_file(io.BytesIO(png), mimetype='image/png', etag=key, max_age=31536000, conditional=True)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/chart_renderer.js')
+def chart_renderer():
+    """Client-side renderer for the JSON chart mode"""
+    return send_file(os.path.join(app.root_path, 'static', 'chart_renderer.js'), mimetype='text/javascript',
+                     max_age=3600)
+
+@app.route('/snapshot')
+def snapshot_status():
+    """Age and freshness of the dashboard snapshot"""
+    return jsonify(snapshots.status())
+
+# Serialized API bodies of the current snapshot, built on first request
+api_bodies = {}
+
+def api_response(name, build):
+    """Serve build(snapshot)'s EncodedPayload with an ETag, If-None-Match and gzip.
+
+    Like /dashboard this never waits for an analysis: it answers from the
+    latest snapshot, so a poller whose data has not changed gets a 304.
+    """
+    snapshot = snapshots.start().get()
+    if snapshot is None:
+        return jsonify({'error': 'The first portfolio analysis is still running'}), 503, {'Retry-After': '10'}
+    if snapshot['metrics'] is None:
+        return jsonify({'error': 'No portfolio data found'}), 404
+    if snapshots.is_stale():
+        snapshots.refresh()
+
+    key = (snapshot.version, name)
+    payload = api_bodies.get(key)
+    if payload is None:
+        try:
+            payload = build(snapshot)
+        except ImportError:
+            return jsonify({'error': 'Arrow output needs pyarrow installed'}), 406
+        # Bodies of older snapshots are never served again
+        for old in [k for k in list(api_bodies) if k[0] != snapshot.version]:
+            api_bodies.pop(old, None)
+        api_bodies[key] = payload
+
+    body, encoding, etag = payload.encoded(request.accept_encodings['gzip'] > 0)
+    headers = {'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache', 'X-Snapshot-Age': f'{snapshot.age():.0f}'}
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304, headers=headers)
+    else:
+        response = app.response_class(body, mimetype=payload.mimetype, headers=headers)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    return response
+
+def frame_payload(df):
+    """Columnar JSON, or an Arrow IPC stream with ?format=arrow"""
+    fmt = request.args.get('format', 'json')
+    if fmt == 'arrow':
+        return api_payloads.EncodedPayload(api_payloads.frame_to_arrow_bytes(df), api_payloads.ARROW_MIMETYPE)
+    return api_payloads.EncodedPayload(api_payloads.frame_to_json_bytes(df))
+
+def check_format():
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'arrow'):
+        return jsonify({'error': f"Unknown format: {fmt} (expected json or arrow)"}), 400
+    return None
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Headline risk metrics, VaR/CVaR by model and alerts as JSON"""
+    return api_response('metrics', lambda snapshot: api_payloads.EncodedPayload(api_payloads.to_json_bytes(
+        api_payloads.metrics_payload(snapshot['metrics'], snapshot['alerts']))))
+
+@app.route('/api/holdings')
+def api_holdings():
+    """Holdings, one row per lot or with ?view=positions one per symbol"""
+    view = request.args.get('view', 'lots')
+    if view not in ('lots', 'positions'):
+        return jsonify({'error': f"Unknown view: {view} (expected lots or positions)"}), 400
+    error = check_format()
+    if error:
+        return error
+    column = 'portfolio_df' if view == 'lots' else 'positions_df'
+    return api_response(f"holdings:{view}:{request.args.get('format', 'json')}",
+                        lambda snapshot: frame_payload(snapshot['metrics'][column]))
+
+@app.route('/api/correlation')
+def api_correlation():
+    """Asset correlation matrix with a leading symbol column"""
+    error = check_format()
+    if error:
+        return error
+    return api_response(f"correlation:{request.args.get('format', 'json')}", lambda snapshot: frame_payload(
+        api_payloads.correlation_frame(snapshot['metrics']['correlation_matrix'])))
+
+EXPORT_ID = re.compile(r'\d{8}T\d{6}\.\d{6}Z-[0-9a-f]{6}')
+
+@app.route('/exports')
+def exports_manifest():
+    """Manifest of the current snapshot's Parquet/Arrow export, with a URL per file"""
+    snapshot = snapshots.start().get()
+    export_id = snapshot.data.get('export_id') if snapshot is not None else None
+    manifest = arrow_export.load_manifest(EXPORT_DIR, export_id) if export_id else None
+    if manifest is None:
+        return jsonify({'error': 'No export available yet'}), 404
+    for table in manifest['tables'].values():
+        for entry in table['files'].values():
+            entry['url'] = url_for('export_file', export_id=manifest['id'], filename=entry['file'])
+    return jsonify(manifest)
+
+@app.route('/exports/<export_id>/<filename>')
+def export_file(export_id, filename):
+    """One exported file; exports never change once written, so it is cached as immutable.
+
+    send_file hands the open file to the WSGI server, which can stream it with
+    sendfile() instead of copying it through Python.
+    """
+    if not EXPORT_ID.fullmatch(export_id) or not re.fullmatch(r'[a-z_]+\.(parquet|arrow)', filename):
+        return "Export not found", 404
+    path = os.path.abspath(os.path.join(EXPORT_DIR, export_id, filename))
+    if not os.path.isfile(path):
+        return "Export not found", 404
+    mimetype = api_payloads.ARROW_MIMETYPE if filename.endswith('.arrow') else 'application/vnd.apache.parquet'
+    response = send_file(path, mimetype=mimetype, as_attachment=True, max_age=31536000, conditional=True)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/exports/latest/<filename>')
+def latest_export_file(filename):
+    """Redirect to the file in the current snapshot's export"""
+    snapshot = snapshots.start().get()
+    export_id = snapshot.data.get('export_id') if snapshot is not None else None
+    if export_id is None:
+        return "Export not found", 404
+    return redirect(url_for('export_file', export_id=export_id, filename=filename))
+
+@app.route('/chart-cache')
+def chart_cache_stats():
+    """Chart cache hit/miss counters"""
+    return jsonify(analyzer.chart_cache.stats())
+
+def latest_report_path():
+    """Newest finished background report, else a report left by an earlier run"""
+    latest = report_queue.latest()
+    if latest:
+        return latest['path']
+    if os.path.exists('portfolio_risk_report.pdf'):
+        return 'portfolio_risk_report.pdf'
+    return None
+
+@app.route('/reports/<job_id>')
+def report_status(job_id):
+    """Status of a background report job"""
+    job = report_queue.status(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job'}), 404
+    return jsonify(job)
+
 @app.route('/download-pdf')
 def download_pdf():
     """Download the PDF report"""
-    try:
-        return send_file('portfolio_risk_report.pdf', as_attachment=True, 
-                        download_name=f'portfolio_report_{pd.Timestamp.now().strftime("%Y%m%d")}.pdf')
-    except Exception as e:
-        return f"PDF not found: {str(e)}. Please run analysis first.", 404
+    path = latest_report_path()
+    if path is None:
+        return "PDF not found. The report is still being generated; try again shortly.", 404
+    return send_file(path, as_attachment=True,
+                     download_name=f'portfolio_report_{pd.Timestamp.now().strftime("%Y%m%d")}.pdf')
 
 @app.route('/view-pdf')
 def view_pdf():
     """View the PDF report in browser"""
-    try:
-        return send_file('portfolio_risk_report.pdf')
-    except Exception as e:
-        return f"PDF not found: {str(e)}. Please run analysis first.", 404
+    path = latest_report_path()
+    if path is None:
+        return "PDF not found. The report is still being generated; try again shortly.", 404
+    return send_file(path, mimetype='application/pdf')
 
 if __name__ == '__main__':
     print("🚀 Portfolio Risk Analyzer - Web Interface")
@@ -0,0 +1,35 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def shared_pool(broken=None):
+    """The process pool every caller shares, one worker per CPU, started on first use.
+
+    Workers are spawned rather than forked, so work submitted from a threaded
+    web server never copies another thread's held locks into a child. Passing
+    the pool that just broke replaces it.
+    """
+    global _pool
+    with _pool_lock:
+        if broken is not None and _pool is broken:
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def pool_map(func, items):
+    """list(map(func, items)) over the shared pool; func must be a module-level function"""
+    pool = shared_pool()
+    try:
+        return list(pool.map(func, items))
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool and retry once
+        return list(shared_pool(broken=pool).map(func, items))